@@ -0,0 +1,56 @@
+"""Compare loading formulas from a compile cache with parsing them
+
+For each generated corpus, times lexing and parsing every formula, unpickling
+their ASTs, and decoding them from a memory-mapped `diskcache.DiskCache`, and
+compares the serialized sizes.
+
+Usage: python3 benchmarks/bench_cache.py [formulas per corpus]
+"""
+import os
+import pickle
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from corpus import generate, generators
+from diskcache import DiskCache, build_cache
+from lexer import lex_spans
+from parse import Parser
+from serialize import encode
+
+
+def main() -> None:
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    parser = Parser()
+    print(f"{'corpus':>14} {'parse':>9} {'unpickle':>9} {'cache':>9} {'pickle KiB':>11} {'encoded KiB':>12}")
+    with tempfile.TemporaryDirectory() as directory:
+        for name in generators:
+            codes = generate(name, count, seed=1)
+            path = os.path.join(directory, f"{name}.cache")
+            build_cache(path, codes, parser)
+
+            start = time.perf_counter()
+            trees = [parser.parse(lex_spans(code)) for code in codes]
+            parsed = time.perf_counter() - start
+
+            pickles = [pickle.dumps(tree) for tree in trees]
+            start = time.perf_counter()
+            for data in pickles:
+                pickle.loads(data)
+            unpickled = time.perf_counter() - start
+
+            with DiskCache(path) as cache:
+                start = time.perf_counter()
+                loaded = [cache.get(code) for code in codes]
+                cached = time.perf_counter() - start
+            assert loaded == trees
+
+            pickled_size = sum(map(len, pickles)) / 1024
+            encoded_size = sum(len(encode(tree)) for tree in trees) / 1024
+            print(f"{name:>14} {parsed * 1e3:7.1f}ms {unpickled * 1e3:7.1f}ms {cached * 1e3:7.1f}ms "
+                  f"{pickled_size:11.0f} {encoded_size:12.0f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,47 @@
+"""Parse and transpile pathologically deep formulas
+
+Times lexing, parsing and transpiling at growing nesting depths; each step
+should cost about the same per level, well past the interpreter's recursion
+limit.
+
+Usage: python3 benchmarks/bench_deep.py [max depth]
+"""
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from lexer import lex_spans
+from parse import Parser
+from transpiler import Transpiler
+
+SHAPES = {
+    "parens": lambda depth: "(" * depth + "{a}" + ")" * depth,
+    "nested IF": lambda depth: "IF({a} > 1, 1, " * depth + "0" + ")" * depth,
+    "nested calls": lambda depth: "CONCATENATE({a}, " * depth + '"x"' + ")" * depth,
+    "right operands": lambda depth: "{a}" + "".join(f" * ({{b}} + {i}" for i in range(depth)) + ")" * depth,
+    "unary minus": lambda depth: "-" * depth + "{a}",
+}
+
+
+def main() -> None:
+    max_depth = int(sys.argv[1]) if len(sys.argv) > 1 else 20_000
+    depths = [max_depth // 4, max_depth // 2, max_depth]
+    parser, transpiler = Parser(), Transpiler()
+    print(f"recursion limit: {sys.getrecursionlimit()}")
+    for label, make in SHAPES.items():
+        print(f"{label}:")
+        for depth in depths:
+            code = make(depth)
+            start = time.perf_counter()
+            ast = parser.parse(lex_spans(code))
+            parsed = time.perf_counter() - start
+            start = time.perf_counter()
+            transpiler.transpile(ast, "table", "result")
+            transpiled = time.perf_counter() - start
+            print(f"  depth {depth:>7,}: parse {parsed * 1e6 / depth:6.2f} us/level,"
+                  f" transpile {transpiled * 1e6 / depth:6.2f} us/level")
+
+if __name__ == "__main__":
+    main()
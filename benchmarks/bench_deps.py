@@ -0,0 +1,49 @@
+"""Compare the lexer-only dependency scan with parsing and walking the tree
+
+Also times building a `deps.FieldIndex` over every corpus, and a field lookup.
+
+Usage: python3 benchmarks/bench_deps.py [formulas per corpus]
+"""
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from corpus import generate, generators
+from deps import FieldIndex, scan_dependencies, tree_dependencies
+from lexer import lex_spans
+from parse import Parser
+
+
+def main() -> None:
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    parser = Parser()
+    formulas = []
+    print(f"{'corpus':>14} {'scan':>9} {'parse+walk':>11}")
+    for name in generators:
+        codes = generate(name, count, seed=1)
+        formulas += [(f"{name}-{i}", code) for i, code in enumerate(codes)]
+
+        start = time.perf_counter()
+        scanned = [scan_dependencies(code) for code in codes]
+        scan = time.perf_counter() - start
+
+        start = time.perf_counter()
+        walked = [tree_dependencies(parser.parse(lex_spans(code))) for code in codes]
+        parse = time.perf_counter() - start
+
+        assert scanned == walked
+        print(f"{name:>14} {scan * 1e3:7.1f}ms {parse * 1e3:9.1f}ms")
+
+    start = time.perf_counter()
+    index = FieldIndex.build(formulas)
+    built = time.perf_counter() - start
+    start = time.perf_counter()
+    users = index.using_field("Score")
+    lookup = time.perf_counter() - start
+    print(f"index of {len(index)} formulas built in {built * 1e3:.1f}ms; "
+          f"{len(users)} use {{Score}}, found in {lookup * 1e6:.1f}us")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+"""Run the SQLite dialect's SQL with the stdlib sqlite3 module
+
+Loads generated records into an in-memory SQLite table, transpiles a set of
+formulas covering the function library with `dialect="sqlite"`, executes
+each query and checks every row against the compiled Python evaluator.
+Reports the query time per formula next to the evaluator's.
+
+Usage: python3 benchmarks/bench_dialects.py [records]
+"""
+import os
+import random
+import sqlite3
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from evaluator import compile_formula
+from formula import Formula
+from transpiler import Transpiler
+
+SCHEMA = {"Score": "number", "Bonus": "number", "Name": "string", "Priority": "string",
+          "Due": "date", "Start": "date", "Active": "boolean"}
+FORMULAS = [
+    'IF({Score} > 50, {Score} * 1.5 - {Bonus}, ({Score} + {Bonus}) / 2)',
+    '{Score} / {Bonus}',
+    '{Name} & " (" & {Priority} & ")"',
+    'CONCATENATE(UPPER({Name}), "-", LOWER({Priority}))',
+    'IF(AND(LEN({Name}) > 10, {Priority} = "High"), "Important", IF(IS_BLANK({Priority}), "Unset", {Priority}))',
+    'FIND("a", {Name}, 2)',
+    'SUBSTITUTE(TRIM({Name}), "a", "A")',
+    'SUM({Score}, {Bonus}, 1) + AVERAGE({Score}, {Bonus})',
+    'MAX({Score}, {Bonus}) - MIN({Score}, {Bonus})',
+    'ROUND({Score} / 3, 2) + ABS({Bonus} - 5)',
+    'XOR({Score} > 50, {Active}, {Bonus} > 5)',
+    'IF(NOT({Active}), BLANK(), TRUE())',
+    'DATETIME_DIFF({Due}, {Start}, "days")',
+    'DATETIME_DIFF({Due}, {Start}, "hours")',
+    'IF(IS_BEFORE({Start}, {Due}), "on time", "late")',
+]
+
+
+def make_rows(count: int, seed: int = 0) -> list:
+    rng = random.Random(seed)
+    return [(
+        rng.choice([rng.uniform(0, 100), 0, None]),
+        float(rng.randint(0, 10)),
+        "".join(rng.choice("abcdefghij ") for _ in range(rng.randint(0, 20))),
+        rng.choice(["High", "Low", None]),
+        f"2024-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d} {rng.randint(0, 23):02d}:00:00",
+        f"2024-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d} 00:00:00",
+        rng.choice([0, 1, None]),
+    ) for _ in range(count)]
+
+
+def same(expected: object, found: object) -> bool:
+    if isinstance(expected, (bool, int, float)) and isinstance(found, (int, float)):
+        return abs(float(expected) - float(found)) < 1e-9
+    return expected == found
+
+
+def main() -> None:
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 20_000
+    rows = make_rows(count)
+    names = list(SCHEMA)
+    db = sqlite3.connect(":memory:")
+    db.execute(f"CREATE TABLE records ({', '.join(names)})")
+    db.executemany(f"INSERT INTO records VALUES ({', '.join('?' * len(names))})", rows)
+    records = [dict(zip(names, row)) for row in rows]
+    transpiler = Transpiler(schema=SCHEMA, dialect="sqlite")
+
+    print(f"records: {count}")
+    for code in FORMULAS:
+        ast = Formula(code).ast
+        sql = transpiler.transpile(ast, "records", "result")
+        start = time.perf_counter()
+        found = [row[0] for row in db.execute(sql)]
+        queried = time.perf_counter() - start
+
+        evaluate = compile_formula(ast)
+        start = time.perf_counter()
+        expected = [evaluate(record) for record in records]
+        evaluated = time.perf_counter() - start
+
+        wrong = sum(not same(e, f) for e, f in zip(expected, found))
+        print(f"  sqlite {queried * 1e3:7.1f} ms  python {evaluated * 1e3:7.1f} ms  "
+              f"{'ok' if not wrong else f'{wrong} rows differ'}  {code}")
+
+
+if __name__ == "__main__":
+    main()
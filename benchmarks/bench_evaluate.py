@@ -0,0 +1,83 @@
+"""Compare compiled and vectorized evaluation against the tree-walking interpreter
+
+Usage: python3 benchmarks/bench_evaluate.py [records]
+"""
+import os
+import random
+import sys
+import time
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from evaluator import compile_formula, interpret
+from formula import Formula
+
+VECTORIZABLE = {
+    "text": 'IF(AND(LEN({Name}) > 10, {Priority} = "High"), "Important: " & {Name}, '
+            'IF(IS_BLANK({Assigned}), "Unassigned", {Assigned}))',
+    "numeric": "IF({Score} > 50, {Score} * 1.5 - {Bonus}, ({Score} + {Bonus}) / 2)",
+}
+EXAMPLE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "examples", "example.formula")
+
+
+def make_records(count: int, seed: int = 0) -> list:
+    rng = random.Random(seed)
+    today = date.today()
+    return [{
+        "Name": "".join(rng.choice("abcdefghij ") for _ in range(rng.randint(3, 20))),
+        "Tags": rng.choice(["VIP", "new", None, "VIP, partner"]),
+        "Priority": rng.choice(["High", "Low", None]),
+        "Due Date": today + timedelta(days=rng.randint(-30, 30)),
+        "Assigned": rng.choice(["ann", "bob", None]),
+        "Score": rng.choice([rng.uniform(0, 100), None]),
+        "Bonus": float(rng.randint(0, 10)),
+    } for _ in range(count)]
+
+
+def main() -> None:
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    ast = Formula(open(EXAMPLE).read()).ast
+    records = make_records(count)
+
+    start = time.perf_counter()
+    expected = [interpret(ast, record) for record in records]
+    interpreted = time.perf_counter() - start
+
+    start = time.perf_counter()
+    compiled_formula = compile_formula(ast)
+    results = [compiled_formula(record) for record in records]
+    compiled = time.perf_counter() - start
+
+    assert results == expected
+    print(f"records:     {count}")
+    print(f"interpreted: {count / interpreted:12,.0f} records/s")
+    print(f"compiled:    {count / compiled:12,.0f} records/s ({interpreted / compiled:.1f}x)")
+
+    try:
+        import numpy as np
+        from vectorized import evaluate_columns, to_column
+    except ImportError:
+        return
+    # Columnar batches are typed arrays with a blank mask; convert outside the timings
+    columns = {}
+    for name in records[0]:
+        values, null = to_column(np.array([record[name] for record in records], dtype=object))
+        columns[name] = np.ma.MaskedArray(values, mask=null)
+    for label, source in VECTORIZABLE.items():
+        ast = Formula(source).ast
+        expected = [interpret(ast, record) for record in records]
+        compiled_formula = compile_formula(ast)
+        start = time.perf_counter()
+        results = [compiled_formula(record) for record in records]
+        compiled = time.perf_counter() - start
+        start = time.perf_counter()
+        vector_results = evaluate_columns(ast, columns)
+        vectorized = time.perf_counter() - start
+        assert results == expected and vector_results.tolist() == expected
+        print(f"{label} formula:")
+        print(f"  compiled:   {count / compiled:12,.0f} records/s")
+        print(f"  vectorized: {count / vectorized:12,.0f} records/s ({compiled / vectorized:.1f}x)")
+
+if __name__ == "__main__":
+    main()
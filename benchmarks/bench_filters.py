@@ -0,0 +1,84 @@
+"""Filter records with formulas in SQLite: filter mode against computing each formula
+
+Loads generated records into an in-memory SQLite table with indexes on the
+fields the filters test. Each filter formula is run two ways: as the
+projected `SELECT <formula> AS result` that `Transpiler.transpile` writes,
+keeping the truthy rows, and as the WHERE clause `transpile_filter`
+writes. Both must return the records the compiled evaluator keeps. Prints
+SQLite's EXPLAIN QUERY PLAN for the filter query and the time of each.
+
+Usage: python3 benchmarks/bench_filters.py [records]
+"""
+import os
+import random
+import sqlite3
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from evaluator import compile_formula, truthy
+from formula import Formula
+from transpiler import Transpiler
+
+SCHEMA = {"Id": "number", "Score": "number", "Status": "string", "Due": "date", "Done": "boolean"}
+INDEXED = ["Score", "Status", "Due"]
+FILTERS = [
+    'IS_BEFORE({Due}, "2024-01-15")',
+    'AND({Status} = "blocked", {Score} > 90)',
+    'IF({Score} >= 99, TRUE(), FALSE())',
+    'NOT(IS_BLANK({Status}))',
+    'AND(IS_AFTER({Due}, "2024-12-20"), NOT({Done}))',
+    'OR({Status} = "open", {Status} = "blocked")',
+    'NOT({Score} < 99.5)',
+]
+
+
+def make_rows(count: int, seed: int = 0) -> list:
+    rng = random.Random(seed)
+    return [(
+        i,
+        rng.choice([rng.uniform(0, 100), None]),
+        rng.choice(["open", "done", "blocked", "review", None]),
+        f"2024-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d} {rng.randint(0, 23):02d}:00:00",
+        rng.choice([0, 1]),
+    ) for i in range(count)]
+
+
+def main() -> None:
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 200_000
+    rows = make_rows(count)
+    names = list(SCHEMA)
+    db = sqlite3.connect(":memory:")
+    db.execute(f"CREATE TABLE records ({', '.join(names)})")
+    db.executemany(f"INSERT INTO records VALUES ({', '.join('?' * len(names))})", rows)
+    for name in INDEXED:
+        db.execute(f'CREATE INDEX records_{name} ON records ("{name}")')
+    db.execute("ANALYZE")
+    records = [dict(zip(names, row)) for row in rows]
+    transpiler = Transpiler(schema=SCHEMA, dialect="sqlite")
+
+    print(f"records: {count}")
+    for code in FILTERS:
+        ast = Formula(code).ast
+        evaluate = compile_formula(ast)
+        expected = sorted(record["Id"] for record in records if truthy(evaluate(record)))
+
+        projection = transpiler.transpile_many({"Id": Formula("{Id}").ast, "result": ast}, "records").sql
+        start = time.perf_counter()
+        projected = sorted(i for i, value in db.execute(projection) if truthy(value))
+        scanned = time.perf_counter() - start
+
+        where = transpiler.transpile_filter(ast, "records", columns=["Id"])
+        start = time.perf_counter()
+        filtered = sorted(row[0] for row in db.execute(where))
+        searched = time.perf_counter() - start
+
+        plan = "; ".join(row[-1] for row in db.execute("EXPLAIN QUERY PLAN " + where))
+        status = "ok" if projected == expected and filtered == expected else "MISMATCH"
+        print(f"{code}\n  {len(expected)} rows {status}  projection {scanned * 1e3:7.1f} ms  "
+              f"filter {searched * 1e3:7.1f} ms ({scanned / searched:.1f}x)\n  plan: {plan}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,44 @@
+"""Compare a full re-parse with an incremental one after one-character edits
+
+Usage: python3 benchmarks/bench_incremental.py [max arguments]
+"""
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from incremental import edit, parse_full
+from lexer import lex_spans
+from parse import Parser
+
+
+def make_formula(width: int) -> str:
+    """A formula of `width` independent IF arguments, as large editors see them"""
+    args = [f'IF({{Score {i}}} > {i}, LEN({{Name {i}}}) * 2, CONCATENATE({{Tag {i}}}, "x"))' for i in range(width)]
+    return "SUM(" + ", ".join(args) + ")"
+
+def main() -> None:
+    max_width = int(sys.argv[1]) if len(sys.argv) > 1 else 4000
+    parser = Parser()
+    for width in (max_width // 16, max_width // 4, max_width):
+        code = make_formula(width)
+        # Edit a number in the middle of the formula, as keystrokes would:
+        # replacing a digit keeps every offset, inserting one shifts the rest
+        offset = code.index(f"> {width // 2},") + 2
+        result = parse_full(code)
+        for label, deleted in (("replace", 1), ("insert", 0)):
+            start = time.perf_counter()
+            updated = edit(result, offset, deleted, "7")
+            incremental = time.perf_counter() - start
+
+            start = time.perf_counter()
+            expected = parser.parse(lex_spans(updated.source))
+            full = time.perf_counter() - start
+
+            assert updated.ast == expected
+            print(f"{len(code):>9,} chars, {label:>7}: full {full * 1e3:8.2f} ms, "
+                  f"incremental {incremental * 1e3:6.2f} ms ({updated.relexed} tokens re-lexed)")
+
+if __name__ == "__main__":
+    main()
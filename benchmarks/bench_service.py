@@ -0,0 +1,80 @@
+"""Latency of the resident formula service, against spawning main.py per formula
+
+Starts `main.py --serve` on a temporary Unix socket, then sends transpile
+requests from several concurrent clients: first distinct formulas (cold),
+then the same formulas again (answered from the result cache). Reports
+per-request latency percentiles and throughput for each round.
+
+Usage: python3 benchmarks/bench_service.py [requests] [clients]
+"""
+import asyncio
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from typing import List
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+MAIN = os.path.join(BENCH_DIR, "..", "src", "main.py")
+sys.path.insert(0, BENCH_DIR)
+
+from corpus import generate
+
+
+def percentile(samples: List[float], fraction: float) -> float:
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+async def client(path: str, formulas: List[str], latencies: List[float]) -> None:
+    # Each client waits for its answer before sending the next request, as
+    # a caller that used to spawn main.py would
+    reader, writer = await asyncio.open_unix_connection(path, limit=2 ** 26)
+    for i, formula in enumerate(formulas):
+        request = {"jsonrpc": "2.0", "id": i, "method": "transpile", "params": {"formula": formula}}
+        start = time.perf_counter()
+        writer.write((json.dumps(request) + "\n").encode("utf-8"))
+        response = json.loads(await reader.readline())
+        latencies.append(time.perf_counter() - start)
+        assert response["id"] == i and ("result" in response or response["error"]["code"] == -32000), response
+    writer.close()
+
+async def run_round(path: str, formulas: List[str], clients: int) -> None:
+    latencies: List[float] = []
+    start = time.perf_counter()
+    await asyncio.gather(*(client(path, formulas[i::clients], latencies) for i in range(clients)))
+    seconds = time.perf_counter() - start
+    print(f"  p50 {percentile(latencies, 0.5) * 1e3:7.2f} ms  p99 {percentile(latencies, 0.99) * 1e3:7.2f} ms  "
+          f"mean {statistics.fmean(latencies) * 1e3:7.2f} ms  {len(latencies) / seconds:8.0f} requests/s")
+
+def spawn_latency(formulas: List[str]) -> float:
+    """Mean seconds per formula when each one starts its own interpreter"""
+    start = time.perf_counter()
+    for formula in formulas:
+        subprocess.run([sys.executable, MAIN, "-t"], input=formula + "\n", capture_output=True, text=True)
+    return (time.perf_counter() - start) / len(formulas)
+
+def main() -> None:
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    clients = int(sys.argv[2]) if len(sys.argv) > 2 else 8
+    formulas = generate("mixed", count, seed=1)
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "formula.sock")
+        server = subprocess.Popen([sys.executable, MAIN, "--serve", "--socket", path])
+        try:
+            while not os.path.exists(path):
+                time.sleep(0.05)
+            print(f"{count} transpile requests from {clients} clients")
+            print("cold:")
+            asyncio.run(run_round(path, formulas, clients))
+            print("warm:")
+            asyncio.run(run_round(path, formulas, clients))
+        finally:
+            server.terminate()
+            server.wait()
+    print(f"spawning main.py per formula: {spawn_latency(formulas[:5]) * 1e3:.0f} ms per formula")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+"""Reproducible synthetic formula corpora for the benchmarks
+
+Every corpus is generated from a seed, so two runs with the same seed and
+size benchmark exactly the same formulas.
+
+Usage: python3 benchmarks/corpus.py <corpus> [count] [seed]
+"""
+import random
+import sys
+from typing import Callable, Dict, List
+
+FIELDS = ["Name", "Status", "Priority", "Due Date", "Assigned", "Score", "Bonus", "Tags",
+          "Region", "Owner", "Created", "Notes", "Budget", "Spent", "Stage", "Email"]
+WORDS = ["alpha", "beta", "gamma", "delta", "urgent", "done", "open", "blocked", "north", "south"]
+
+
+def field(rng: random.Random) -> str:
+    return "{" + rng.choice(FIELDS) + "}"
+
+def text(rng: random.Random, length: int = 2) -> str:
+    return '"' + " ".join(rng.choice(WORDS) for _ in range(length)) + '"'
+
+def comparison(rng: random.Random) -> str:
+    if rng.random() < 0.5:
+        return f"{field(rng)} {rng.choice(['>', '<', '>=', '<=', '=', '!='])} {rng.randint(0, 100)}"
+    return f"{field(rng)} = {text(rng, 1)}"
+
+def value(rng: random.Random) -> str:
+    choice = rng.random()
+    if choice < 0.3:
+        return field(rng)
+    if choice < 0.5:
+        return text(rng)
+    if choice < 0.7:
+        return f"{field(rng)} * {rng.randint(1, 9)} + {rng.randint(0, 99)}"
+    if choice < 0.85:
+        return f"LEN({field(rng)})"
+    return f"CONCATENATE({field(rng)}, {text(rng, 1)})"
+
+
+def deep_if(rng: random.Random, depth: int = 50) -> str:
+    """IF chains nested through the else branch"""
+    return "".join(f"IF({comparison(rng)}, {value(rng)}, " for _ in range(depth)) + value(rng) + ")" * depth
+
+def wide_logic(rng: random.Random, width: int = 100) -> str:
+    """AND/OR calls with long argument lists"""
+    groups = [f"{rng.choice(['AND', 'OR'])}(" + ", ".join(comparison(rng) for _ in range(width // 4)) + ")"
+              for _ in range(4)]
+    return f"IF({rng.choice(['AND', 'OR'])}({', '.join(groups)}), {text(rng)}, {text(rng)})"
+
+def concat_chain(rng: random.Random, length: int = 200) -> str:
+    """Long `&` chains of fields and literals"""
+    return " & ".join(field(rng) if i % 2 else text(rng, 1) for i in range(length))
+
+def many_fields(rng: random.Random, count: int = 200) -> str:
+    """Arithmetic over many field references"""
+    return " + ".join(f"{field(rng)} * {rng.randint(1, 9)}" for _ in range(count))
+
+def large_strings(rng: random.Random, length: int = 2000) -> str:
+    """Few nodes, but long string literals"""
+    return f"IF({comparison(rng)}, {text(rng, length // 6)}, SUBSTITUTE({field(rng)}, {text(rng, length // 12)}, {text(rng, 1)}))"
+
+def mixed(rng: random.Random) -> str:
+    """Small formulas in the shape of everyday ones"""
+    shape = rng.random()
+    if shape < 0.4:
+        return f"IF({comparison(rng)}, {value(rng)}, {value(rng)})"
+    if shape < 0.7:
+        return f"IF(AND({comparison(rng)}, {comparison(rng)}), {value(rng)}, IF({comparison(rng)}, {value(rng)}, {text(rng)}))"
+    if shape < 0.9:
+        return f"{field(rng)} & {text(rng, 1)} & {field(rng)}"
+    return f"ROUND(({field(rng)} - {field(rng)}) / {rng.randint(1, 9)}, 2)"
+
+
+generators: Dict[str, Callable[[random.Random], str]] = {
+    "deep_if": deep_if,
+    "wide_logic": wide_logic,
+    "concat_chain": concat_chain,
+    "many_fields": many_fields,
+    "large_strings": large_strings,
+    "mixed": mixed,
+}
+
+def generate(name: str, count: int, seed: int = 0) -> List[str]:
+    """Generate `count` formulas of corpus `name`"""
+    rng = random.Random(f"{name}:{seed}")
+    return [generators[name](rng) for _ in range(count)]
+
+if __name__ == "__main__":
+    name = sys.argv[1]
+    count = int(sys.argv[2]) if len(sys.argv) > 2 else 10
+    seed = int(sys.argv[3]) if len(sys.argv) > 3 else 0
+    for formula in generate(name, count, seed):
+        print(formula)
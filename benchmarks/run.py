@@ -0,0 +1,156 @@
+"""Benchmark each pipeline phase over the synthetic corpora
+
+Times `lexer.lex`, `Parser.parse`, the `simplify` functions and
+`Transpiler.transpile` separately, reporting throughput, p50/p99 latency per
+formula and peak traced memory. Results can be saved as JSON and compared
+against an earlier run; the exit status is 1 if any phase regressed by more
+than the threshold.
+
+Usage:
+    python3 benchmarks/run.py [--count N] [--seed S] [--corpus NAME ...]
+                              [--save results.json] [--compare baseline.json] [--threshold 0.1]
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import sys
+import time
+import tracemalloc
+from typing import Any, Callable, Dict, List, Sequence
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from corpus import generate, generators
+from lexer import lex
+from parse import BinOp, Parser, UnOp, walk
+from simplify import simplify_binop, simplify_unop
+from transpiler import Transpiler
+
+PHASES = ("lex", "parse", "simplify", "transpile")
+# Peak memory differences smaller than this are allocator noise, not regressions
+MEMORY_NOISE_KIB = 64
+
+
+def percentile(samples: Sequence[float], fraction: float) -> float:
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+def measure(call: Callable[[Any], Any], inputs: Sequence[Any], repeat: int) -> Dict[str, float]:
+    """Time `call` on every input, `repeat` times over, then once more for memory"""
+    clock = time.perf_counter_ns
+    latencies: List[int] = []
+    best = None
+    for _ in range(repeat):
+        start = clock()
+        for item in inputs:
+            before = clock()
+            call(item)
+            latencies.append(clock() - before)
+        total = clock() - start
+        best = total if best is None else min(best, total)
+
+    tracemalloc.start()
+    tracemalloc.reset_peak()
+    for item in inputs:
+        call(item)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {
+        "ops_per_sec": len(inputs) / (best / 1e9),
+        "p50_us": percentile(latencies, 0.50) / 1e3,
+        "p99_us": percentile(latencies, 0.99) / 1e3,
+        "mean_us": statistics.fmean(latencies) / 1e3,
+        "peak_kib": peak / 1024,
+    }
+
+def simplify_all(nodes: Sequence[Any]) -> None:
+    for node in nodes:
+        if isinstance(node, BinOp):
+            simplify_binop(node)
+        else:
+            simplify_unop(node)
+
+def bench_corpus(formulas: List[str], repeat: int) -> Dict[str, Dict[str, float]]:
+    parser, transpiler = Parser(), Transpiler()
+    # Each phase gets the previous phase's output, prepared outside the timings
+    tokens = [lex(formula) for formula in formulas]
+    asts = [parser.parse(list(stream)) for stream in tokens]
+    operators = [[node for node in walk(ast) if isinstance(node, (BinOp, UnOp))] for ast in asts]
+    return {
+        "lex": measure(lex, formulas, repeat),
+        "parse": measure(parser.parse, tokens, repeat),
+        "simplify": measure(simplify_all, operators, repeat),
+        "transpile": measure(lambda ast: transpiler.transpile(ast, "my_table", "result"), asts, repeat),
+    }
+
+
+def compare(results: Dict[str, Any], baseline: Dict[str, Any], threshold: float) -> List[str]:
+    """Describe every phase that is slower, or uses more memory, than
+    `baseline` by more than `threshold` (a fraction)"""
+    regressions = []
+    for corpus, phases in results["results"].items():
+        for phase, current in phases.items():
+            before = baseline.get("results", {}).get(corpus, {}).get(phase)
+            if before is None:
+                continue
+            speed = current["ops_per_sec"] / before["ops_per_sec"]
+            memory = current["peak_kib"] / before["peak_kib"] if before["peak_kib"] else 1.0
+            print(f"  {corpus:>14} {phase:>10}: {speed:6.2f}x throughput, {memory:6.2f}x peak memory")
+            if speed < 1 - threshold:
+                regressions.append(f"{corpus}/{phase}: throughput {speed:.2f}x of baseline")
+            if memory > 1 + threshold and current["peak_kib"] - before["peak_kib"] > MEMORY_NOISE_KIB:
+                regressions.append(f"{corpus}/{phase}: peak memory {memory:.2f}x of baseline")
+    return regressions
+
+def main() -> None:
+    arguments = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    arguments.add_argument("--count", type=int, default=200, help="formulas per corpus")
+    arguments.add_argument("--seed", type=int, default=0)
+    arguments.add_argument("--repeat", type=int, default=3, help="timed passes per phase; the fastest counts")
+    arguments.add_argument("--corpus", nargs="+", choices=sorted(generators), default=list(generators))
+    arguments.add_argument("--save", help="write the results to this JSON file")
+    arguments.add_argument("--compare", help="compare against results saved by an earlier run")
+    arguments.add_argument("--threshold", type=float, default=0.10,
+                           help="allowed slowdown or memory growth, as a fraction (default 0.10)")
+    options = arguments.parse_args()
+
+    results: Dict[str, Any] = {
+        "meta": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "count": options.count,
+            "seed": options.seed,
+            "repeat": options.repeat,
+            "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        },
+        "results": {},
+    }
+    print(f"{'corpus':>14} {'phase':>10} {'ops/s':>12} {'p50 us':>10} {'p99 us':>10} {'peak KiB':>10}")
+    for name in options.corpus:
+        formulas = generate(name, options.count, options.seed)
+        phases = bench_corpus(formulas, options.repeat)
+        results["results"][name] = phases
+        for phase in PHASES:
+            stats = phases[phase]
+            print(f"{name:>14} {phase:>10} {stats['ops_per_sec']:12,.0f} {stats['p50_us']:10.1f}"
+                  f" {stats['p99_us']:10.1f} {stats['peak_kib']:10.1f}")
+
+    if options.save:
+        with open(options.save, "w") as file:
+            json.dump(results, file, indent=2)
+    if options.compare:
+        with open(options.compare) as file:
+            baseline = json.load(file)
+        print(f"compared with {options.compare} (threshold {options.threshold:.0%}):")
+        regressions = compare(results, baseline, options.threshold)
+        if regressions:
+            print("regressions:")
+            for regression in regressions:
+                print(f"  {regression}")
+            sys.exit(1)
+
+if __name__ == "__main__":
+    main()
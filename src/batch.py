@@ -0,0 +1,223 @@
+import json
+import os
+import sys
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, wait
+from typing import Any, Dict, Iterable, Iterator, List, NamedTuple, Optional, TextIO, Tuple
+
+from lexer import lex_spans
+from parse import ASTNode, Parser, count_nodes
+from diskcache import DiskCache
+from transpiler import Transpiler
+from validate import validate
+from instrument import CumulativeStats, FormulaMetrics, tree_counts
+
+# (input line number, caller's id if the input had one, formula source, and
+# why the line could not be read, in which case the source is None)
+Item = Tuple[int, Any, Optional[str], Optional[str]]
+
+
+class BatchStats(NamedTuple):
+    formulas: int
+    errors: int
+    seconds: float
+
+    @property
+    def throughput(self) -> float:
+        return self.formulas / self.seconds if self.seconds else 0.0
+
+
+def read_formulas(lines: Iterable[str], jsonl: bool = False) -> Iterator[Item]:
+    """Stream formulas from newline-delimited input, one line at a time
+
+    Plain input has one formula per line. JSONL input has one JSON value per
+    line: either a string, or an object with a "formula" key and optionally
+    an "id" that is copied to the output. Blank lines are skipped. A JSONL
+    line that is not valid JSON, or not one of those, is yielded with no
+    source and the reason, so it gets an error result like any formula.
+    """
+    for number, line in enumerate(lines, 1):
+        line = line.rstrip("\r\n")
+        if not line.strip():
+            continue
+        if not jsonl:
+            yield number, None, line, None
+            continue
+        try:
+            value = json.loads(line)
+        except ValueError as e:
+            yield number, None, None, f"Invalid JSON: {e}"
+            continue
+        if isinstance(value, str):
+            yield number, None, value, None
+        elif isinstance(value, dict) and isinstance(value.get("formula"), str):
+            yield number, value.get("id"), value["formula"], None
+        else:
+            yield number, None, None, "Expected a string or an object with a \"formula\" key"
+
+def chunked(items: Iterable[Item], size: int) -> Iterator[List[Item]]:
+    chunk: List[Item] = []
+    for item in items:
+        chunk.append(item)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def summarize(ast: Optional[ASTNode]) -> Optional[Dict[str, Any]]:
+    if ast is None:
+        return None
+    return {"root": type(ast).__name__, "nodes": count_nodes(ast)}
+
+# One parser and transpiler per worker process
+parser = Parser()
+transpiler = Transpiler()
+# Compile caches opened by this worker process, by path
+disk_caches: Dict[str, DiskCache] = {}
+
+def open_disk_cache(path: str) -> DiskCache:
+    cache = disk_caches.get(path)
+    if cache is None:
+        cache = disk_caches[path] = DiskCache(path)
+    return cache
+
+def process_chunk(chunk: List[Item], table_name: str, emit_sql: bool, profile: bool = False,
+                  cache_path: Optional[str] = None, diagnose: bool = False, dialect: Optional[str] = None
+                  ) -> Tuple[List[Dict[str, Any]], Optional[Dict[str, Any]]]:
+    """Parse, and optionally transpile, one chunk of formulas
+
+    Runs in a worker process. Every formula gets one result: its AST
+    summary and SQL, or the error it failed with; so does every input line
+    that could not be read. With `profile`, the chunk's
+    per-phase `instrument.CumulativeStats` are returned too, as a dict.
+    With `cache_path`, formulas in that `diskcache.DiskCache` are loaded
+    from it rather than parsed. With `diagnose`, failing formulas also get
+    every problem `validate.validate` finds in them, as "diagnostics".
+    The SQL is written for `dialect`, a `dialects.dialects` name.
+    """
+    results = []
+    stats = CumulativeStats() if profile else None
+    clock = time.perf_counter
+    disk = open_disk_cache(cache_path) if cache_path is not None else None
+    for line, formula_id, code, unreadable in chunk:
+        result: Dict[str, Any] = {"line": line}
+        if formula_id is not None:
+            result["id"] = formula_id
+        if code is None:
+            result["error"] = unreadable
+            results.append(result)
+            continue
+        metrics = FormulaMetrics(code) if profile else None
+        try:
+            if metrics is None:
+                ast = disk.get(code) if disk is not None else None
+                if ast is None:
+                    ast = parser.parse(lex_spans(code))
+                result["ast"] = summarize(ast)
+                if emit_sql and ast is not None:
+                    result["sql"] = transpiler.transpile(ast, table_name, "result", dialect=dialect)
+            else:
+                start = clock()
+                ast = disk.get(code) if disk is not None else None
+                if ast is not None:
+                    metrics.timings["load"] = clock() - start
+                    metrics.nodes = count_nodes(ast)
+                else:
+                    start = clock()
+                    stream = lex_spans(code)
+                    metrics.timings["lex"] = clock() - start
+                    metrics.tokens = len(stream)
+                    start = clock()
+                    ast = parser.parse(stream)
+                    metrics.timings["parse"] = clock() - start
+                    metrics.nodes, metrics.folded = tree_counts(stream, ast)
+                result["ast"] = summarize(ast)
+                if emit_sql and ast is not None:
+                    start = clock()
+                    result["sql"] = transpiler.transpile(ast, table_name, "result", dialect=dialect)
+                    metrics.timings["transpile"] = clock() - start
+        except Exception as e:
+            result["error"] = str(e)
+            if diagnose:
+                result["diagnostics"] = [diagnostic.as_dict() for diagnostic in validate(code)]
+            if metrics is not None:
+                metrics.error = str(e)
+        if metrics is not None:
+            stats.add(metrics)
+        results.append(result)
+    return results, stats.as_dict() if stats is not None else None
+
+
+def run_batch(lines: Iterable[str], out: TextIO, jsonl: bool = False, workers: Optional[int] = None,
+              chunk_size: int = 500, ordered: bool = True, table_name: str = "my_table",
+              emit_sql: bool = True, profile: Optional[CumulativeStats] = None,
+              cache_path: Optional[str] = None, diagnose: bool = False,
+              dialect: Optional[str] = None) -> BatchStats:
+    """Process a stream of formulas on a pool of worker processes
+
+    Input is read lazily and dispatched in chunks, with at most two chunks
+    per worker in flight, so memory use does not grow with the input.
+    Results are written to `out` as JSONL, one line per formula.
+
+    Args:
+        lines (Iterable[str]): The input, e.g. an open file
+        out (TextIO): Where the JSONL results are written
+        jsonl (bool): Whether the input is JSONL rather than one formula per line
+        workers (int | None): The number of worker processes; defaults to the CPU count
+        chunk_size (int): Formulas per dispatched chunk
+        ordered (bool): Whether results keep the input order; unordered
+            output is written as soon as any chunk finishes
+        table_name (str): The table the formulas' fields belong to
+        emit_sql (bool): Whether to transpile, or only parse and summarize
+        profile (CumulativeStats | None): If given, per-phase timings and
+            counts from every worker are added into it
+        cache_path (str | None): A `diskcache.build_cache` file; every worker
+            maps it and loads the formulas found there instead of parsing them
+        diagnose (bool): Whether failing formulas get structured diagnostics
+        dialect (str | None): The SQL dialect, e.g. "sqlite"; generic SQL if None
+
+    Returns:
+        BatchStats: How many formulas were processed and how many failed,
+            and how long it took
+    """
+    workers = workers or os.cpu_count() or 1
+    max_in_flight = workers * 2
+    formulas = errors = 0
+    start = time.perf_counter()
+
+    def write(chunk_results: Tuple[List[Dict[str, Any]], Optional[Dict[str, Any]]]) -> None:
+        nonlocal formulas, errors
+        results, chunk_stats = chunk_results
+        if profile is not None and chunk_stats is not None:
+            profile.merge(chunk_stats)
+        formulas += len(results)
+        errors += sum("error" in result for result in results)
+        out.write("".join(json.dumps(result) + "\n" for result in results))
+
+    pending: "deque[Future]" = deque()
+
+    def finish_some() -> None:
+        if ordered:
+            write(pending.popleft().result())
+            return
+        done, _ = wait(pending, return_when=FIRST_COMPLETED)
+        for future in done:
+            pending.remove(future)
+            write(future.result())
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        for chunk in chunked(read_formulas(lines, jsonl), chunk_size):
+            if len(pending) >= max_in_flight:
+                finish_some()
+            pending.append(executor.submit(process_chunk, chunk, table_name, emit_sql,
+                                           profile is not None, cache_path, diagnose, dialect))
+        while pending:
+            finish_some()
+    return BatchStats(formulas, errors, time.perf_counter() - start)
+
+def report(stats: BatchStats, stream: TextIO = sys.stderr) -> None:
+    print(f"{stats.formulas} formulas ({stats.errors} errors) in {stats.seconds:.2f}s: "
+          f"{stats.throughput:,.0f} formulas/s", file=stream)
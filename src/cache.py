@@ -0,0 +1,122 @@
+import threading
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+from lexer import TokenType, lex_spans
+from parse import ASTNode, NodeTable, Parser, count_nodes
+from diskcache import DiskCache
+
+
+def canonicalize(code: str) -> str:
+    """Canonical source text for `code`
+
+    Tokens are re-joined with single spaces and function names are upper-cased,
+    so formulas differing only in whitespace or function-name case share a key;
+    the parser upper-cases function names too. Re-lexing the canonical text
+    gives back the same tokens.
+    """
+    stream = lex_spans(code)
+    kinds, starts, ends = stream.kinds, stream.starts, stream.ends
+    func_code, lparen_code = TokenType.ID.value, TokenType.LPAREN.value
+    parts = []
+    last = len(kinds) - 1
+    for i in range(len(kinds)):
+        text = code[starts[i]:ends[i]]
+        if kinds[i] == func_code and i < last and kinds[i + 1] == lparen_code:
+            text = text.upper()
+        parts.append(text)
+    return " ".join(parts)
+
+
+class ParseCache:
+    """A size-bounded LRU cache of parsed formulas, keyed on canonical source
+
+    The returned ASTs are shared between every caller that asked for an
+    equivalent formula, so they must be treated as read-only. The cache is
+    safe to use from several threads; parsing happens outside its lock.
+
+    Args:
+        max_entries (int): the maximum number of cached formulas
+        max_nodes (int | None): if set, the maximum total number of AST nodes
+            held by the cache, as an approximation of its memory use
+        table (NodeTable | None): if set, parsed ASTs are interned into it, so
+            equal subtrees are shared across all cached formulas
+        disk (DiskCache | None): if set, formulas found in this precompiled
+            cache are loaded from it instead of being lexed and parsed
+    """
+
+    def __init__(self, max_entries: int = 4096, max_nodes: Optional[int] = None,
+                 table: Optional[NodeTable] = None, disk: Optional[DiskCache] = None) -> None:
+        self.max_entries = max_entries
+        self.max_nodes = max_nodes
+        self.table = table
+        self.disk = disk
+        self.parser = Parser()
+        self.lock = threading.Lock()
+        self.entries: "OrderedDict[str, Tuple[Optional[ASTNode], int]]" = OrderedDict()
+        self.nodes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def get(self, code: str) -> Optional[ASTNode]:
+        """Return the AST for `code`, parsing it on a cache miss
+
+        Raises:
+            Exception: When `code` fails to lex or parse; failures are not cached
+        """
+        if self.disk is not None:
+            # Looked up by exact source, so a hit needs no lexing at all
+            ast = self.disk.get(code, self.table)
+            if ast is not None:
+                return ast
+        key = canonicalize(code)
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None:
+                self.hits += 1
+                self.entries.move_to_end(key)
+                return entry[0]
+            self.misses += 1
+        ast = self.parser.parse(lex_spans(key))
+        with self.lock:
+            if ast is not None and self.table is not None:
+                ast = self.table.intern_tree(ast)
+            size = count_nodes(ast) if ast is not None else 0
+            if key not in self.entries:
+                self.nodes += size
+            else:
+                self.nodes += size - self.entries[key][1]
+            self.entries[key] = (ast, size)
+            self.evict()
+        return ast
+
+    def evict(self) -> None:
+        # Always keep the most recent entry, even if it alone exceeds max_nodes
+        while len(self.entries) > 1 and (len(self.entries) > self.max_entries
+                                         or (self.max_nodes is not None and self.nodes > self.max_nodes)):
+            _, (_, size) = self.entries.popitem(last=False)
+            self.nodes -= size
+            self.evictions += 1
+
+    def clear(self) -> None:
+        with self.lock:
+            self.entries.clear()
+            self.nodes = 0
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "entries": len(self.entries),
+            "nodes": self.nodes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "disk_hits": self.disk.hits if self.disk is not None else 0,
+        }
+
+
+# Process-wide cache used by `formula.Formula`
+parse_cache = ParseCache()
@@ -0,0 +1,146 @@
+from typing import Dict, FrozenSet, Hashable, Iterable, Iterator, NamedTuple, Optional, Set, Tuple
+
+from lexer import TokenType, lex_spans, variable_name
+from parse import ASTNode, FunctionCall, Variable, walk
+
+FIELD_CODE = TokenType.VARIABLE_NAME.value
+ID_CODE = TokenType.ID.value
+LPAREN_CODE = TokenType.LPAREN.value
+
+
+class Dependencies(NamedTuple):
+    """What one formula refers to
+
+    Attributes:
+        fields (frozenset[str]): Referenced field names, `{Field}` or bare
+        functions (frozenset[str]): Called function names
+    """
+    fields: FrozenSet[str]
+    functions: FrozenSet[str]
+
+def scan_dependencies(code: str) -> Dependencies:
+    """The fields and functions `code` refers to, from its tokens alone
+
+    Reads tokens the way the parser does, without building a tree: an ID
+    followed by `(` is a call, any other ID or `{...}` is a field. Function
+    names are upper-cased, as the parser does. Formulas
+    that lex but fail to parse are scanned too, which is what a schema change
+    needs to know about.
+
+    Raises:
+        Exception: When `code` fails to lex
+    """
+    stream = lex_spans(code)
+    kinds, starts, ends = stream.kinds, stream.starts, stream.ends
+    fields: Set[str] = set()
+    functions: Set[str] = set()
+    last = len(kinds) - 1
+    for i, kind_code in enumerate(kinds):
+        if kind_code == FIELD_CODE:
+            fields.add(variable_name(code[starts[i]:ends[i]]))
+        elif kind_code == ID_CODE:
+            name = code[starts[i]:ends[i]]
+            if i < last and kinds[i + 1] == LPAREN_CODE:
+                functions.add(name.upper())
+            else:
+                fields.add(name)
+    return Dependencies(frozenset(fields), frozenset(functions))
+
+def tree_dependencies(ast: Optional[ASTNode]) -> Dependencies:
+    """The fields and functions still referred to by a parsed, possibly
+    optimized, tree"""
+    fields: Set[str] = set()
+    functions: Set[str] = set()
+    if ast is not None:
+        for node in walk(ast):
+            if isinstance(node, Variable):
+                fields.add(node.name)
+            elif isinstance(node, FunctionCall):
+                functions.add(node.name)
+    return Dependencies(frozenset(fields), frozenset(functions))
+
+
+class FieldIndex:
+    """An inverted index from fields and functions to the formulas using them
+
+    Formulas are identified by any hashable id chosen by the caller, such as
+    a field or record id. Adding a formula under an id it already has
+    replaces the old entry, so the index can follow edits one formula at a
+    time. Formulas are scanned with `scan_dependencies`; nothing is parsed.
+    """
+    def __init__(self) -> None:
+        self.formulas: Dict[Hashable, Dependencies] = {}
+        self.fields: Dict[str, Set[Hashable]] = {}
+        self.functions: Dict[str, Set[Hashable]] = {}
+
+    @classmethod
+    def build(cls, formulas: Iterable[Tuple[Hashable, str]]) -> "FieldIndex":
+        """Index (id, source) pairs, skipping formulas that fail to lex
+
+        Use `add` instead to be told about those.
+        """
+        index = cls()
+        for formula_id, code in formulas:
+            try:
+                index.add(formula_id, code)
+            except Exception:
+                continue
+        return index
+
+    def __len__(self) -> int:
+        return len(self.formulas)
+
+    def __contains__(self, formula_id: Hashable) -> bool:
+        return formula_id in self.formulas
+
+    def __iter__(self) -> Iterator[Hashable]:
+        return iter(self.formulas)
+
+    def add(self, formula_id: Hashable, code: str) -> Dependencies:
+        """Index a formula, replacing any previous one with the same id
+
+        Raises:
+            Exception: When `code` fails to lex; the previous entry is kept
+        """
+        dependencies = scan_dependencies(code)
+        self.remove(formula_id)
+        self.formulas[formula_id] = dependencies
+        for name in dependencies.fields:
+            self.fields.setdefault(name, set()).add(formula_id)
+        for name in dependencies.functions:
+            self.functions.setdefault(name, set()).add(formula_id)
+        return dependencies
+
+    def remove(self, formula_id: Hashable) -> None:
+        """Drop a formula from the index, if it is there"""
+        dependencies = self.formulas.pop(formula_id, None)
+        if dependencies is None:
+            return
+        for names, postings in ((dependencies.fields, self.fields), (dependencies.functions, self.functions)):
+            for name in names:
+                users = postings[name]
+                users.discard(formula_id)
+                if not users:
+                    del postings[name]
+
+    def dependencies(self, formula_id: Hashable) -> Dependencies:
+        """
+        Raises:
+            KeyError: When no formula has that id
+        """
+        return self.formulas[formula_id]
+
+    def using_field(self, name: str) -> FrozenSet[Hashable]:
+        """The ids of the formulas referring to field `name`"""
+        return frozenset(self.fields.get(name, ()))
+
+    def using_fields(self, names: Iterable[str]) -> FrozenSet[Hashable]:
+        """The ids of the formulas referring to any of the fields `names`"""
+        users: Set[Hashable] = set()
+        for name in names:
+            users.update(self.fields.get(name, ()))
+        return frozenset(users)
+
+    def calling(self, name: str) -> FrozenSet[Hashable]:
+        """The ids of the formulas calling function `name`, in any case"""
+        return frozenset(self.functions.get(name.upper(), ()))
@@ -0,0 +1,518 @@
+import re
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple, Union
+
+from lexer import TokenType
+from parse import ASTNode, Array, BinOp, FunctionCall, Number, String, Variable
+from functions import Emitter, Part, logical_operand, sql_call, sql_constant, sql_find, value_test
+from evaluator import datetime_units
+from typecheck import BOOLEAN, DATE, NUMBER, STRING
+
+# Emits the SQL for one binary operation, given the node and its context
+BinOpEmitter = Callable[[BinOp, dict], List[Part]]
+
+
+def is_literal(node: ASTNode) -> bool:
+    """Whether `node` is a literal that is never NULL"""
+    return isinstance(node, (Number, String)) and node.value is not None
+
+def joined(args: Sequence[ASTNode], ctx: dict, separator: str,
+           wrap: Optional[Callable[[ASTNode], List[Part]]] = None) -> List[Part]:
+    """`args` separated by `separator`, each optionally wrapped"""
+    parts: List[Part] = []
+    for i, arg in enumerate(args):
+        if i:
+            parts.append(separator)
+        parts += wrap(arg) if wrap is not None else [(arg, ctx)]
+    return parts
+
+def concat_operands(args: Sequence[ASTNode]) -> List[ASTNode]:
+    """Flatten nested `&` and CONCATENATE operands, left to right"""
+    flat: List[ASTNode] = []
+    stack = list(reversed(args))
+    while stack:
+        node = stack.pop()
+        if isinstance(node, BinOp) and node.op == TokenType.AMPERSAND:
+            stack.extend((node.right, node.left))
+        elif isinstance(node, FunctionCall) and node.name == "CONCATENATE":
+            stack.extend(reversed(node.args))
+        else:
+            flat.append(node)
+    return flat
+
+def flattened(args: Sequence[ASTNode]) -> List[ASTNode]:
+    # Aggregates take the elements of array arguments, as the evaluator does
+    flat: List[ASTNode] = []
+    for arg in args:
+        flat.extend(arg.elements if isinstance(arg, Array) else (arg,))
+    return flat
+
+
+class Dialect:
+    """How the SQL for one database engine is spelled
+
+    The base class is the generic flavour the transpiler has always written.
+    Subclasses change how literals, identifiers, text joins and operators are
+    written, and replace the library's emitter for every function the engine
+    has a better or more faithful native form of, in `functions`.
+    """
+    name = "generic"
+    # Function name to emitter, overriding `functions.library`
+    functions: Dict[str, Emitter] = {}
+    # Binary operator to emitter, overriding the transpiler's
+    binops: Dict[TokenType, BinOpEmitter] = {}
+
+    def text(self, value: str) -> str:
+        """The text a string literal stands for"""
+        return value
+
+    def string(self, value: str) -> str:
+        return f'"{value}"'
+
+    def identifier(self, name: str) -> str:
+        return name
+
+    def concat(self, args: Sequence[ASTNode], ctx: dict) -> List[Part]:
+        """Join text, treating NULL as empty, as `&` does"""
+        return ["CONCAT("] + joined(args, ctx, ", ") + [")"]
+
+    def add_text(self, node: BinOp, ctx: dict) -> List[Part]:
+        """`+` on two text operands, which joins them but keeps NULL"""
+        return self.concat((node.left, node.right), ctx)
+
+    def array(self, node: Array, ctx: dict) -> List[Part]:
+        return ["["] + joined(node.elements, ctx, ", ") + ["]"]
+
+    def placeholder(self, position: int) -> str:
+        """The placeholder for the `position`th parameter, counting from 1"""
+        return "?"
+
+    def parameter(self, value: Any, params: List[Any]) -> str:
+        """Add `value` to the parameters and return its placeholder"""
+        params.append(value)
+        return self.placeholder(len(params))
+
+    def timestamp(self, value: datetime, params: Optional[List[Any]] = None) -> str:
+        """A date literal, comparable with stored dates, or a parameter for it
+        if `params` is given"""
+        text = value.isoformat(" ")
+        return self.string(text) if params is None else self.parameter(text, params)
+
+    def number(self, arg: ASTNode, ctx: dict) -> List[Part]:
+        """`arg` where a number is needed, e.g. in arithmetic"""
+        return [(arg, ctx)]
+
+    def as_text(self, arg: ASTNode, ctx: dict) -> List[Part]:
+        """`arg` where text is needed, e.g. joined with `&`"""
+        return [(arg, ctx)]
+
+    def untyped_truth(self, arg: ASTNode, ctx: dict) -> List[Part]:
+        """A boolean test of `arg`, whose type is not known; never NULL"""
+        return value_test(arg, ctx)
+
+    def condition(self, arg: ASTNode, ctx: dict) -> List[Part]:
+        """`arg` as the condition of an IF"""
+        return [(arg, ctx)]
+
+
+def sql_chain(operator: str, associative: bool = False,
+              operand: Callable[[ASTNode, dict], List[Part]] = logical_operand) -> BinOpEmitter:
+    """A run of one operator as a single flat expression, e.g. `(a + b + c)`
+
+    Left-nested operands are always merged, as SQL evaluates left to right;
+    right-nested ones only for an `associative` operator. Long chains then
+    do not nest parentheses, which SQLite's parser allows only 100 deep.
+    Operands of AND and OR are written with `operand`.
+    """
+    def emit(node: BinOp, ctx: dict) -> List[Part]:
+        types = ctx.get("types")
+        logical = node.op in (TokenType.AND, TokenType.OR)
+        operands: List[ASTNode] = []
+        # (node, whether it may be merged into the chain)
+        stack: List[Tuple[ASTNode, bool]] = [(node, True)]
+        while stack:
+            current, mergeable = stack.pop()
+            if mergeable and isinstance(current, BinOp) and current.op == node.op \
+                    and (current is node or types is None or types.type_of(current) is not STRING):
+                stack += [(current.right, associative), (current.left, True)]
+            else:
+                operands.append(current)
+        if logical:
+            wrap = lambda arg: operand(arg, ctx)
+        else:
+            wrap = lambda arg: ctx.get("dialect", generic).number(arg, ctx)
+        return ["("] + joined(operands, ctx, f" {operator} ", wrap) + [")"]
+    return emit
+
+
+class StandardDialect(Dialect):
+    """What the real engines share: standard string literals, quoted
+    identifiers and flat operator chains. String escapes are resolved, as
+    SQL has none."""
+    binops: Dict[TokenType, BinOpEmitter] = {
+        TokenType.PLUS: sql_chain("+"),
+        TokenType.MINUS: sql_chain("-"),
+        TokenType.MUL: sql_chain("*"),
+        TokenType.AND: sql_chain("AND", associative=True),
+        TokenType.OR: sql_chain("OR", associative=True),
+    }
+
+    def text(self, value: str) -> str:
+        return re.sub(r"\\(.)", r"\1", value)
+
+    def string(self, value: str) -> str:
+        return "'" + self.text(value).replace("'", "''") + "'"
+
+    def identifier(self, name: str) -> str:
+        return '"' + name.replace('"', '""') + '"'
+
+    def concat(self, args: Sequence[ASTNode], ctx: dict) -> List[Part]:
+        return ["CONCAT("] + joined(concat_operands(args), ctx, ", ") + [")"]
+
+    def add_text(self, node: BinOp, ctx: dict) -> List[Part]:
+        return ["(", (node.left, ctx), " || ", (node.right, ctx), ")"]
+
+    def timestamp(self, value: datetime, params: Optional[List[Any]] = None) -> str:
+        if params is None:
+            return "TIMESTAMP " + self.string(value.isoformat(" "))
+        return f"CAST({self.parameter(value.isoformat(' '), params)} AS TIMESTAMP)"
+
+
+# Emitters shared by the engine dialects
+
+def numbers(args: Sequence[ASTNode], ctx: dict, separator: str = ", ",
+            wrap: Callable[[List[Part]], List[Part]] = lambda parts: parts) -> List[Part]:
+    """`args` separated by `separator`, each as a number, then optionally wrapped"""
+    dialect = ctx.get("dialect", generic)
+    return joined(args, ctx, separator, lambda arg: wrap(dialect.number(arg, ctx)))
+
+def sql_numeric_call(function: str) -> Emitter:
+    """A call of `function` with every argument as a number"""
+    return lambda node, ctx: [f"{function}("] + numbers(node.args, ctx) + [")"]
+
+def sql_text_call(function: str) -> Emitter:
+    """A call of `function` with every argument as text"""
+    def emit(node: FunctionCall, ctx: dict) -> List[Part]:
+        dialect = ctx.get("dialect", generic)
+        return [f"{function}("] + joined(node.args, ctx, ", ", lambda arg: dialect.as_text(arg, ctx)) + [")"]
+    return emit
+
+def coalesced(parts: List[Part]) -> List[Part]:
+    return ["COALESCE("] + parts + [", 0)"]
+
+def sql_divide(node: BinOp, ctx: dict) -> List[Part]:
+    # Formulas divide as real numbers and give blank for division by zero
+    dialect = ctx.get("dialect", generic)
+    left, right = dialect.number(node.left, ctx), dialect.number(node.right, ctx)
+    if isinstance(node.right, Number) and node.right.value:
+        return ["("] + left + [" * 1.0 / "] + right + [")"]
+    return ["("] + left + [" * 1.0 / NULLIF("] + right + [", 0))"]
+
+def sql_comparison(operator: str) -> BinOpEmitter:
+    """A comparison; a boolean compared with anything else is compared as a
+    number, as formulas do"""
+    def emit(node: BinOp, ctx: dict) -> List[Part]:
+        types = ctx.get("types")
+        mixed = types is not None and (types.type_of(node.left) is BOOLEAN) != (types.type_of(node.right) is BOOLEAN)
+        if not mixed:
+            return ["(", (node.left, ctx), f" {operator} ", (node.right, ctx), ")"]
+        return ["("] + numbers((node.left, node.right), ctx, f" {operator} ") + [")"]
+    return emit
+
+def sql_sum(node: FunctionCall, ctx: dict) -> List[Part]:
+    # A row-wise sum over the arguments, skipping blanks
+    return ["("] + numbers(flattened(node.args), ctx, " + ", coalesced) + [")"]
+
+def sql_average(node: FunctionCall, ctx: dict) -> List[Part]:
+    args = flattened(node.args)
+    return (["(("] + numbers(args, ctx, " + ", coalesced)
+            + [") * 1.0 / NULLIF("]
+            + joined(args, ctx, " + ", lambda arg: ["(CASE WHEN ", (arg, ctx), " IS NULL THEN 0 ELSE 1 END)"])
+            + [", 0))"])
+
+def sql_extreme(function: str) -> Emitter:
+    """MIN or MAX over the arguments with an engine function that returns
+    NULL if any argument is; each NULL is replaced by another argument,
+    which cannot change the result"""
+    def emit(node: FunctionCall, ctx: dict) -> List[Part]:
+        args = flattened(node.args)
+        if len(args) == 1:
+            return ctx.get("dialect", generic).number(args[0], ctx)
+        parts: List[Part] = [f"{function}("]
+        for i, arg in enumerate(args):
+            others = args[i + 1:] + args[:i]
+            parts += [", " if i else "", "COALESCE("] + numbers([arg] + others, ctx) + [")"]
+        parts.append(")")
+        return parts
+    return emit
+
+def unit_divisor(node: FunctionCall, ctx: dict, scale: float) -> List[Part]:
+    """The length of DATETIME_DIFF's unit, in seconds times `scale`"""
+    if len(node.args) < 3:
+        return [str(int(scale))]
+    unit = node.args[2]
+    if isinstance(unit, String):
+        length = datetime_units.get(unit.value.lower())
+        if length is None:
+            raise Exception(f"Unknown DATETIME_DIFF unit {unit.value!r}")
+        return [str(int(length * scale)) if length * scale >= 1 else str(length * scale)]
+    parts: List[Part] = ["(CASE LOWER(", (unit, ctx), ")"]
+    for name, length in datetime_units.items():
+        value = length * scale
+        parts.append(f" WHEN '{name}' THEN {int(value) if value >= 1 else value}")
+    parts.append(" END)")
+    return parts
+
+def sql_round_numeric(node: FunctionCall, ctx: dict) -> List[Part]:
+    # PostgreSQL rounds NUMERIC half away from zero, as formulas do, but a
+    # double to even, and only NUMERIC to a number of places
+    value = ["CAST("] + numbers(node.args[:1], ctx) + [" AS NUMERIC)"]
+    if len(node.args) == 1:
+        return ["ROUND("] + value + [")"]
+    return ["ROUND("] + value + [", "] + numbers(node.args[1:], ctx) + [")"]
+
+def sql_compare_as(convert: str, operator: str) -> Emitter:
+    """Compare two dates after `convert`, a template for one argument"""
+    before, after = convert.split("{}")
+    def emit(node: FunctionCall, ctx: dict) -> List[Part]:
+        return ["(", before, (node.args[0], ctx), after, f" {operator} ", before, (node.args[1], ctx), after, ")"]
+    return emit
+
+def truth(arg: ASTNode, ctx: dict) -> List[Part]:
+    """A boolean test of `arg` with formula truth, chosen by its inferred
+    type: numbers are true unless zero, text unless empty, dates unless blank"""
+    types = ctx.get("types")
+    kind = types.type_of(arg) if types is not None else None
+    if kind is BOOLEAN:
+        return ["(", (arg, ctx), " IS TRUE)"]
+    if kind is NUMBER:
+        return ["(COALESCE(", (arg, ctx), ", 0) <> 0)"]
+    if kind is STRING:
+        return ["(COALESCE(", (arg, ctx), ", '') <> '')"]
+    if kind is DATE:
+        return ["(", (arg, ctx), " IS NOT NULL)"]
+    return ctx.get("dialect", generic).untyped_truth(arg, ctx)
+
+def boolean(arg: ASTNode, ctx: dict) -> List[Part]:
+    """`arg` where a boolean is needed: tested for truth unless it is one"""
+    # A boolean field is still tested, as it may be NULL
+    types = ctx.get("types")
+    if not isinstance(arg, Variable) and types is not None and types.type_of(arg) is BOOLEAN:
+        return [(arg, ctx)]
+    return truth(arg, ctx)
+
+def sql_not(node: FunctionCall, ctx: dict) -> List[Part]:
+    return ["(NOT "] + truth(node.args[0], ctx) + [")"]
+
+def sql_xor(node: FunctionCall, ctx: dict) -> List[Part]:
+    # True when an odd number of arguments are
+    counted = lambda arg: ["(CASE WHEN "] + truth(arg, ctx) + [" THEN 1 ELSE 0 END)"]
+    return ["(("] + joined(node.args, ctx, " + ", counted) + [") % 2 = 1)"]
+
+
+def sqlite_concat(args: Sequence[ASTNode], ctx: dict) -> List[Part]:
+    # `||` gives NULL if either side is; literals never are
+    return ["("] + joined(concat_operands(args), ctx, " || ", lambda arg: [(arg, ctx)] if is_literal(arg)
+                          else ["IFNULL("] + ctx.get("dialect", sqlite).as_text(arg, ctx) + [", '')"]) + [")"]
+
+
+class SQLiteDialect(StandardDialect):
+    """SQLite 3.23 or later
+
+    Text is joined with `||`, dates are compared and subtracted as julian
+    days, and MIN/MAX use the scalar forms of the aggregates. SQLite tests
+    text for truth as a number and writes whole REALs as e.g. `2.0`, so
+    conditions are tested by type and numbers turned into text the way
+    formulas write them.
+    """
+    name = "sqlite"
+
+    def concat(self, args: Sequence[ASTNode], ctx: dict) -> List[Part]:
+        return sqlite_concat(args, ctx)
+
+    def as_text(self, arg: ASTNode, ctx: dict) -> List[Part]:
+        types = ctx.get("types")
+        kind = types.type_of(arg) if types is not None else None
+        if isinstance(arg, (Number, String)) or kind in (STRING, BOOLEAN, DATE):
+            return [(arg, ctx)]
+        # Whole numbers without a fraction, as `evaluator.to_text` writes them
+        return ["(CASE WHEN typeof(", (arg, ctx), ") = 'real' AND ", (arg, ctx), " = CAST(", (arg, ctx),
+                " AS INTEGER) THEN CAST(CAST(", (arg, ctx), " AS INTEGER) AS TEXT) ELSE ", (arg, ctx), " END)"]
+
+    def untyped_truth(self, arg: ASTNode, ctx: dict) -> List[Part]:
+        # Text is true unless empty, anything else unless zero or NULL
+        return ["(CASE typeof(", (arg, ctx), ") WHEN 'text' THEN ", (arg, ctx), " <> '' WHEN 'null' THEN 0 ELSE ",
+                (arg, ctx), " <> 0 END)"]
+
+    def condition(self, arg: ASTNode, ctx: dict) -> List[Part]:
+        return boolean(arg, ctx)
+
+    def array(self, node: Array, ctx: dict) -> List[Part]:
+        raise Exception("SQLite has no array values")
+
+    # Dates are stored as text in the format of `datetime()`, which sorts in
+    # time order
+    timestamp = Dialect.timestamp
+
+    binops: Dict[TokenType, BinOpEmitter] = {
+        **StandardDialect.binops,
+        TokenType.AND: sql_chain("AND", associative=True, operand=boolean),
+        TokenType.OR: sql_chain("OR", associative=True, operand=boolean),
+        TokenType.DIV: sql_divide,
+    }
+
+    functions: Dict[str, Emitter] = {
+        "TRUE": sql_constant("1"),
+        "FALSE": sql_constant("0"),
+        "BLANK": sql_constant("NULL"),
+        "NOT": sql_not,
+        "XOR": sql_xor,
+        "SUM": sql_sum,
+        "AVERAGE": sql_average,
+        "MIN": sql_extreme("MIN"),
+        "MAX": sql_extreme("MAX"),
+        "FIND": sql_find("INSTR", "MAX"),
+        "CONCATENATE": lambda node, ctx: sqlite_concat(node.args, ctx),
+        "LEN": sql_text_call("LENGTH"),
+        "UPPER": sql_text_call("UPPER"),
+        "LOWER": sql_text_call("LOWER"),
+        "TRIM": sql_text_call("TRIM"),
+        "SUBSTITUTE": sql_text_call("REPLACE"),
+        "DATETIME_DIFF": lambda node, ctx: (
+            ["(CAST(ROUND((julianday(", (node.args[0], ctx), ") - julianday(", (node.args[1], ctx),
+             ")) * 86400000) AS INTEGER) / "] + unit_divisor(node, ctx, 1000) + [")"]),
+        "NOW": sql_constant("CURRENT_TIMESTAMP"),
+        "IS_BEFORE": sql_compare_as("julianday({})", "<"),
+        "IS_AFTER": sql_compare_as("julianday({})", ">"),
+        "IS_BLANK": lambda node, ctx: ["(IFNULL(", (node.args[0], ctx), ", '') = '')"],
+    }
+
+
+class PostgresDialect(StandardDialect):
+    """PostgreSQL
+
+    Booleans are real booleans, which neither convert to numbers nor test
+    other types implicitly: conditions and truth tests depend on the inferred
+    type of their argument, and booleans are written as 1 and 0 where a
+    number is needed.
+    CONCAT, LEAST and GREATEST skip NULLs natively.
+    """
+    name = "postgres"
+
+    def array(self, node: Array, ctx: dict) -> List[Part]:
+        return ["ARRAY["] + joined(node.elements, ctx, ", ") + ["]"]
+
+    def placeholder(self, position: int) -> str:
+        return f"${position}"
+
+    def concat(self, args: Sequence[ASTNode], ctx: dict) -> List[Part]:
+        return ["CONCAT("] + joined(concat_operands(args), ctx, ", ", lambda arg: self.as_text(arg, ctx)) + [")"]
+
+    def as_text(self, arg: ASTNode, ctx: dict) -> List[Part]:
+        # Text functions take no other type; formulas write booleans as 1 and 0
+        types = ctx.get("types")
+        if isinstance(arg, String) or (types is not None and types.type_of(arg) is STRING):
+            return [(arg, ctx)]
+        return ["CAST("] + self.number(arg, ctx) + [" AS TEXT)"]
+
+    def number(self, arg: ASTNode, ctx: dict) -> List[Part]:
+        types = ctx.get("types")
+        if types is None or types.type_of(arg) is not BOOLEAN:
+            return [(arg, ctx)]
+        if isinstance(arg, FunctionCall) and arg.name in ("TRUE", "FALSE") and not arg.args:
+            return ["1" if arg.name == "TRUE" else "0"]
+        return ["CAST(", (arg, ctx), " AS INTEGER)"]
+
+    def untyped_truth(self, arg: ASTNode, ctx: dict) -> List[Part]:
+        # Every type converts to text, where false, zero and blank are spelled
+        # as below once any sign and zeros are trimmed; text spelling one of
+        # them is read as false too
+        return ["(LTRIM(COALESCE(CAST(", (arg, ctx), " AS TEXT), ''), '-0.') NOT IN ('', 'false', 'NaN', 'nan'))"]
+
+    def condition(self, arg: ASTNode, ctx: dict) -> List[Part]:
+        return boolean(arg, ctx)
+
+    binops: Dict[TokenType, BinOpEmitter] = {
+        **StandardDialect.binops,
+        TokenType.AND: sql_chain("AND", associative=True, operand=boolean),
+        TokenType.OR: sql_chain("OR", associative=True, operand=boolean),
+        TokenType.DIV: sql_divide,
+        **{op: sql_comparison(operator) for op, operator in (
+            (TokenType.EQ, "="), (TokenType.NE, "!="), (TokenType.LT, "<"),
+            (TokenType.LE, "<="), (TokenType.GT, ">"), (TokenType.GE, ">="))},
+    }
+
+    functions: Dict[str, Emitter] = {
+        "TRUE": sql_constant("TRUE"),
+        "FALSE": sql_constant("FALSE"),
+        "BLANK": sql_constant("NULL"),
+        "NOT": sql_not,
+        "XOR": sql_xor,
+        "ADD": lambda node, ctx: ["("] + numbers(node.args, ctx, " + ") + [")"],
+        "SUM": sql_sum,
+        "AVERAGE": sql_average,
+        "MIN": lambda node, ctx: ["LEAST("] + numbers(flattened(node.args), ctx) + [")"],
+        "MAX": lambda node, ctx: ["GREATEST("] + numbers(flattened(node.args), ctx) + [")"],
+        "ABS": sql_numeric_call("ABS"),
+        "ROUND": sql_round_numeric,
+        "CONCATENATE": lambda node, ctx: ctx.get("dialect", generic).concat(node.args, ctx),
+        "LEN": sql_text_call("LENGTH"),
+        "UPPER": sql_text_call("UPPER"),
+        "LOWER": sql_text_call("LOWER"),
+        "TRIM": sql_text_call("TRIM"),
+        "SUBSTITUTE": sql_text_call("REPLACE"),
+        "FIND": sql_find("STRPOS", "GREATEST"),
+        "DATETIME_DIFF": lambda node, ctx: (
+            ["TRUNC(EXTRACT(EPOCH FROM (CAST(", (node.args[0], ctx), " AS TIMESTAMP) - CAST(",
+             (node.args[1], ctx), " AS TIMESTAMP))) / "] + unit_divisor(node, ctx, 1) + [")"]),
+        "IS_BEFORE": sql_compare_as("CAST({} AS TIMESTAMP)", "<"),
+        "IS_AFTER": sql_compare_as("CAST({} AS TIMESTAMP)", ">"),
+        "IS_BLANK": lambda node, ctx: ["(COALESCE(CAST(", (node.args[0], ctx), " AS TEXT), '') = '')"],
+    }
+
+
+class DuckDBDialect(PostgresDialect):
+    """DuckDB, which follows PostgreSQL but has list literals and `epoch`"""
+    name = "duckdb"
+
+    def array(self, node: Array, ctx: dict) -> List[Part]:
+        return Dialect.array(self, node, ctx)
+
+    def as_text(self, arg: ASTNode, ctx: dict) -> List[Part]:
+        # DuckDB writes whole doubles as e.g. `2.0`
+        types = ctx.get("types")
+        if isinstance(arg, Number) or types is None or types.type_of(arg) is not NUMBER:
+            return PostgresDialect.as_text(self, arg, ctx)
+        return ["(CASE WHEN ", (arg, ctx), " = TRUNC(", (arg, ctx), ") THEN CAST(CAST(", (arg, ctx),
+                " AS BIGINT) AS TEXT) ELSE CAST(", (arg, ctx), " AS TEXT) END)"]
+
+    functions: Dict[str, Emitter] = dict(
+        PostgresDialect.functions,
+        ROUND=sql_numeric_call("ROUND"),
+        FIND=sql_find("INSTR", "GREATEST"),
+        DATETIME_DIFF=lambda node, ctx: (
+            ["TRUNC((EPOCH(CAST(", (node.args[0], ctx), " AS TIMESTAMP)) - EPOCH(CAST(",
+             (node.args[1], ctx), " AS TIMESTAMP))) / "] + unit_divisor(node, ctx, 1) + [")"]),
+    )
+
+
+generic, sqlite, postgres, duckdb = Dialect(), SQLiteDialect(), PostgresDialect(), DuckDBDialect()
+
+# Name to dialect, for `get_dialect`
+dialects: Dict[str, Dialect] = {dialect.name: dialect for dialect in (generic, sqlite, postgres, duckdb)}
+dialects["postgresql"] = postgres
+
+def get_dialect(dialect: Union[str, Dialect, None]) -> Dialect:
+    """The dialect for a name, e.g. "sqlite"; None is the generic one
+
+    Raises:
+        Exception: When no dialect has that name
+    """
+    if dialect is None:
+        return generic
+    if isinstance(dialect, Dialect):
+        return dialect
+    found = dialects.get(dialect.lower())
+    if found is None:
+        raise Exception(f"Unknown SQL dialect {dialect!r}, expected one of {sorted(dialects)}")
+    return found
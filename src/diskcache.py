@@ -0,0 +1,161 @@
+import hashlib
+import mmap
+import os
+import struct
+import tempfile
+from typing import Iterable, List, Optional, Tuple
+
+from lexer import lex_spans
+from parse import ASTNode, NodeTable, Parser
+from serialize import decode, encode
+
+# A cache file is a header, the serialized ASTs back to back, then an index
+# of (source digest, offset, length) entries sorted by digest
+MAGIC = b"FCACHE01"
+header = struct.Struct("<8sQQ")       # magic, entry count, index offset
+entry = struct.Struct("<16sQQ")       # digest, offset, length
+DIGEST_SIZE = 16
+
+def digest(code: str) -> bytes:
+    """The cache key of a formula: a hash of its exact source text"""
+    return hashlib.blake2b(code.encode("utf-8"), digest_size=DIGEST_SIZE).digest()
+
+
+def build_cache(path: str, formulas: Iterable[str], parser: Optional[Parser] = None) -> Tuple[int, int]:
+    """Parse `formulas` and write their ASTs to a cache file at `path`
+
+    The file is written next to `path` and renamed over it when complete, so
+    processes that have the old file open keep reading a consistent copy.
+    Formulas that fail to parse, and empty ones, are left out; a cache miss
+    makes the reader parse them itself. Only the index is held in memory.
+
+    Returns:
+        tuple[int, int]: How many formulas were stored, and how many failed
+    """
+    parser = parser or Parser()
+    index: List[Tuple[bytes, int, int]] = []
+    seen = set()
+    failed = 0
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, temp_path = tempfile.mkstemp(dir=directory, prefix=".formula-cache-")
+    try:
+        with os.fdopen(fd, "wb") as file:
+            file.write(header.pack(MAGIC, 0, 0))
+            offset = header.size
+            for code in formulas:
+                key = digest(code)
+                if key in seen:
+                    continue
+                seen.add(key)
+                try:
+                    ast = parser.parse(lex_spans(code))
+                except Exception:
+                    failed += 1
+                    continue
+                if ast is None:
+                    continue
+                data = encode(ast)
+                file.write(data)
+                index.append((key, offset, len(data)))
+                offset += len(data)
+            index.sort()
+            file.write(b"".join(entry.pack(*item) for item in index))
+            file.seek(0)
+            file.write(header.pack(MAGIC, len(index), offset))
+            file.flush()
+            os.fsync(file.fileno())
+        # mkstemp creates the file private to its owner; caches are shared
+        os.chmod(temp_path, 0o644)
+        os.replace(temp_path, path)
+    except BaseException:
+        os.unlink(temp_path)
+        raise
+    return len(index), failed
+
+
+class DiskCache:
+    """A read-only, memory-mapped cache of parsed formulas built by `build_cache`
+
+    The file is mapped rather than read, so every process opening the same
+    cache shares one copy of it in the page cache, and opening it costs the
+    same however large it is. Lookups hash the formula source and binary
+    search the index; nothing is lexed or parsed.
+
+    Args:
+        path (str): The cache file
+
+    Raises:
+        Exception: When `path` is not a formula cache
+    """
+    def __init__(self, path: str) -> None:
+        self.path = path
+        with open(path, "rb") as file:
+            # An empty file cannot be mapped at all
+            if os.fstat(file.fileno()).st_size < header.size:
+                raise Exception(f"{path} is not a formula cache")
+            self.map = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, self.count, self.index_offset = header.unpack_from(self.map)
+        if magic != MAGIC or self.index_offset + self.count * entry.size > len(self.map):
+            self.map.close()
+            raise Exception(f"{path} is not a formula cache")
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self) -> int:
+        return self.count
+
+    def __contains__(self, code: str) -> bool:
+        data = self.find(code)
+        if data is None:
+            return False
+        data.release()
+        return True
+
+    def __enter__(self) -> "DiskCache":
+        return self
+
+    def __exit__(self, *exc_info: object) -> None:
+        self.close()
+
+    def find(self, code: str) -> Optional[memoryview]:
+        """The serialized AST of `code`, as a view into the mapped file, or None
+
+        The view must be released before the cache is closed.
+        """
+        key = digest(code)
+        data, base = self.map, self.index_offset
+        low, high = 0, self.count
+        while low < high:
+            middle = (low + high) // 2
+            position = base + middle * entry.size
+            found = data[position:position + DIGEST_SIZE]
+            if found < key:
+                low = middle + 1
+            elif found > key:
+                high = middle
+            else:
+                _, offset, length = entry.unpack_from(data, position)
+                return memoryview(data)[offset:offset + length]
+        return None
+
+    def get(self, code: str, table: Optional[NodeTable] = None) -> Optional[ASTNode]:
+        """The cached AST of `code`, or None if it is not in the cache
+
+        Empty formulas are never stored, so None always means a miss.
+
+        Args:
+            code (str): The formula source, matched exactly
+            table (NodeTable | None): If given, the AST is interned into it
+        """
+        data = self.find(code)
+        if data is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        try:
+            return decode(data, table)
+        finally:
+            data.release()
+
+    def close(self) -> None:
+        self.map.close()
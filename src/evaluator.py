@@ -0,0 +1,390 @@
+import math
+from datetime import date, datetime
+from decimal import Decimal, InvalidOperation, ROUND_HALF_UP
+from typing import Any, Callable, Dict, List, Mapping, Optional, Sequence, Tuple
+
+from lexer import TokenType
+from parse import ASTNode, BinOp, UnOp, Number, String, FunctionCall, Variable, Array
+
+Record = Mapping[str, Any]
+Compiled = Callable[[Record], Any]
+
+
+# Value semantics follow the generated SQL: blanks (None) propagate through
+# arithmetic, comparisons and most functions, while `&`/CONCATENATE treat them
+# as empty text and logical tests treat them as false.
+
+def truthy(value: Any) -> bool:
+    return bool(value) and not (isinstance(value, float) and math.isnan(value))
+
+def to_text(value: Any) -> str:
+    if value is None:
+        return ""
+    if isinstance(value, bool):
+        return "1" if value else "0"
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return str(value)
+
+def to_datetime(value: Any) -> Optional[datetime]:
+    if value is None or isinstance(value, datetime):
+        return value
+    if isinstance(value, date):
+        return datetime(value.year, value.month, value.day)
+    return datetime.fromisoformat(str(value))
+
+def is_blank(value: Any) -> bool:
+    return value is None or value == ""
+
+def null_safe(op: Callable[[Any, Any], Any]) -> Callable[[Any, Any], Any]:
+    def apply(left: Any, right: Any) -> Any:
+        if left is None or right is None:
+            return None
+        try:
+            return op(left, right)
+        except (TypeError, ZeroDivisionError):
+            return None
+    return apply
+
+binary_ops: Dict[TokenType, Callable[[Any, Any], Any]] = {
+    TokenType.PLUS: null_safe(lambda a, b: a + b),
+    TokenType.MINUS: null_safe(lambda a, b: a - b),
+    TokenType.MUL: null_safe(lambda a, b: a * b),
+    TokenType.DIV: null_safe(lambda a, b: a / b),
+    TokenType.EQ: null_safe(lambda a, b: a == b),
+    TokenType.NE: null_safe(lambda a, b: a != b),
+    TokenType.LT: null_safe(lambda a, b: a < b),
+    TokenType.LE: null_safe(lambda a, b: a <= b),
+    TokenType.GT: null_safe(lambda a, b: a > b),
+    TokenType.GE: null_safe(lambda a, b: a >= b),
+    TokenType.AMPERSAND: lambda a, b: to_text(a) + to_text(b),
+    TokenType.AND: lambda a, b: truthy(a) and truthy(b),
+    TokenType.OR: lambda a, b: truthy(a) or truthy(b),
+}
+
+# What a function or operator raises for a value it cannot take, e.g. text
+# where a number is expected or an unreadable date; the result is blank
+evaluation_errors = (TypeError, ValueError, ArithmeticError)
+
+def call(function: Callable[..., Any], args: Sequence[Any]) -> Any:
+    """`function` applied to evaluated arguments, or blank if it cannot take them"""
+    try:
+        return function(*args)
+    except evaluation_errors:
+        return None
+
+def negate(value: Any) -> Any:
+    try:
+        return None if value is None else -value
+    except TypeError:
+        return None
+
+def find(needle: Any, haystack: Any, start: Any = 1) -> Any:
+    if needle is None or haystack is None:
+        return None
+    return to_text(haystack).find(to_text(needle), max(int(start) - 1, 0)) + 1
+
+def substitute(text: Any, old: Any, new: Any) -> Any:
+    if text is None:
+        return None
+    return to_text(text).replace(to_text(old), to_text(new))
+
+datetime_units: Dict[str, float] = {
+    "milliseconds": 0.001, "ms": 0.001,
+    "seconds": 1, "s": 1,
+    "minutes": 60, "m": 60,
+    "hours": 3600, "h": 3600,
+    "days": 86400, "d": 86400,
+    "weeks": 604800, "w": 604800,
+}
+
+def datetime_diff(first: Any, second: Any, unit: Any = "seconds") -> Any:
+    if first is None or second is None:
+        return None
+    length = datetime_units.get(str(unit).lower())
+    if length is None:
+        return None
+    seconds = (to_datetime(first) - to_datetime(second)).total_seconds()
+    return float(int(seconds / length))
+
+def is_before(first: Any, second: Any) -> Any:
+    if first is None or second is None:
+        return None
+    return to_datetime(first) < to_datetime(second)
+
+def is_after(first: Any, second: Any) -> Any:
+    if first is None or second is None:
+        return None
+    return to_datetime(first) > to_datetime(second)
+
+def round_number(value: Any, precision: Any = 0) -> float:
+    # As in SQL, halves round away from zero rather than to even; the
+    # shortest decimal form of the float is rounded, so ROUND(0.125, 2) is 0.13
+    number = Decimal(repr(float(value)))
+    if not number.is_finite():
+        return float(value)
+    try:
+        return float(number.quantize(Decimal(1).scaleb(-int(precision)), ROUND_HALF_UP))
+    except InvalidOperation:
+        # More digits than a float holds, so there is nothing to round
+        return float(value)
+
+def numbers(args: tuple) -> List[Any]:
+    values: List[Any] = []
+    for arg in args:
+        if isinstance(arg, list):
+            values.extend(a for a in arg if a is not None)
+        elif arg is not None:
+            values.append(arg)
+    return values
+
+def text_function(op: Callable[[str], Any]) -> Callable[[Any], Any]:
+    return lambda value: None if value is None else op(to_text(value))
+
+def number_function(op: Callable[..., Any]) -> Callable[..., Any]:
+    return lambda value, *rest: None if value is None else op(value, *rest)
+
+# Functions whose arguments are all evaluated before the call. IF, AND and OR
+# short-circuit and are handled by the compiler and interpreter directly.
+functions: Dict[str, Callable[..., Any]] = {
+    "NOT": lambda value: not truthy(value),
+    "XOR": lambda *args: sum(truthy(arg) for arg in args) % 2 == 1,
+    "TRUE": lambda: True,
+    "FALSE": lambda: False,
+    "BLANK": lambda: None,
+    "ADD": lambda *args: None if None in args else sum(args),
+    "SUM": lambda *args: float(sum(numbers(args))),
+    "MIN": lambda *args: min(numbers(args), default=None),
+    "MAX": lambda *args: max(numbers(args), default=None),
+    "AVERAGE": lambda *args: (sum(values) / len(values)) if (values := numbers(args)) else None,
+    "ABS": number_function(abs),
+    "ROUND": number_function(round_number),
+    "LEN": text_function(len),
+    "UPPER": text_function(str.upper),
+    "LOWER": text_function(str.lower),
+    "TRIM": text_function(str.strip),
+    "FIND": find,
+    "SUBSTITUTE": substitute,
+    "CONCATENATE": lambda *args: "".join(to_text(arg) for arg in args),
+    "DATETIME_DIFF": datetime_diff,
+    "TODAY": date.today,
+    "NOW": datetime.now,
+    "IS_BEFORE": is_before,
+    "IS_AFTER": is_after,
+    "IS_BLANK": is_blank,
+}
+
+
+comparison_ops: Dict[TokenType, str] = {
+    TokenType.EQ: "==", TokenType.NE: "!=",
+    TokenType.LT: "<", TokenType.LE: "<=",
+    TokenType.GT: ">", TokenType.GE: ">=",
+}
+arithmetic_ops: Dict[TokenType, str] = {
+    TokenType.PLUS: "+", TokenType.MINUS: "-", TokenType.MUL: "*", TokenType.DIV: "/",
+}
+# Functions that always return a bool (or blank), so their result needs no `truthy`
+boolean_functions = ("AND", "OR", "NOT", "XOR", "TRUE", "FALSE", "IS_BLANK", "IS_BEFORE", "IS_AFTER")
+
+
+class CodeGenerator:
+    """Generates the source of one Python expression that evaluates an AST
+
+    Blank checks are inlined with walrus-bound temporaries, literals are
+    embedded as constants, and IF/AND/OR become Python conditional and
+    boolean expressions so they short-circuit.
+    """
+    def __init__(self) -> None:
+        self.names: Dict[str, Any] = {"truthy": truthy, "to_text": to_text}
+        self.temps = 0
+
+    def temp(self) -> str:
+        self.temps += 1
+        return f"t{self.temps}"
+
+    def constant(self, value: Any) -> str:
+        if value is None or isinstance(value, (bool, str)) or (isinstance(value, float) and math.isfinite(value)):
+            return repr(value)
+        name = f"c{len(self.names)}"
+        self.names[name] = value
+        return name
+
+    def function(self, name: str) -> str:
+        if name not in functions:
+            raise Exception(f"Unknown function {name}")
+        self.names[f"f_{name}"] = functions[name]
+        return f"f_{name}"
+
+    def condition(self, node: ASTNode) -> str:
+        code = self.expression(node)
+        if (isinstance(node, BinOp) and node.op in comparison_ops) or \
+                (isinstance(node, FunctionCall) and node.name in boolean_functions):
+            return code
+        return f"truthy({code})"
+
+    def text(self, node: ASTNode) -> str:
+        code = self.expression(node)
+        if isinstance(node, String) or (isinstance(node, BinOp) and node.op == TokenType.AMPERSAND):
+            return code
+        return f"to_text({code})"
+
+    def null_checked(self, nodes: List[ASTNode], template: str) -> str:
+        """Evaluate `nodes` into temporaries and yield blank if any of them is blank"""
+        names, checks = [], []
+        for node in nodes:
+            code = self.expression(node)
+            if isinstance(node, (Number, String)) and node.value is not None:
+                names.append(code)
+            else:
+                name = self.temp()
+                names.append(name)
+                checks.append(f"({name} := {code}) is None")
+        result = template.format(*names)
+        if not checks:
+            return f"({result})"
+        return f"(None if {' or '.join(checks)} else {result})"
+
+    def expression(self, node: ASTNode) -> str:
+        if isinstance(node, (Number, String)):
+            return self.constant(node.value)
+        elif isinstance(node, Variable):
+            return f"get({node.name!r})"
+        elif isinstance(node, BinOp):
+            if node.op in comparison_ops:
+                return self.null_checked([node.left, node.right], "{} " + comparison_ops[node.op] + " {}")
+            elif node.op in arithmetic_ops:
+                return self.null_checked([node.left, node.right], "{} " + arithmetic_ops[node.op] + " {}")
+            elif node.op == TokenType.AMPERSAND:
+                return f"({self.text(node.left)} + {self.text(node.right)})"
+            elif node.op == TokenType.AND:
+                return f"bool({self.condition(node.left)} and {self.condition(node.right)})"
+            elif node.op == TokenType.OR:
+                return f"bool({self.condition(node.left)} or {self.condition(node.right)})"
+            raise Exception(f"Invalid operator {node.op}")
+        elif isinstance(node, UnOp):
+            if node.op != TokenType.MINUS:
+                raise Exception(f"Invalid operator {node.op}")
+            return self.null_checked([node.right], "-{}")
+        elif isinstance(node, Array):
+            return "[" + ", ".join(self.expression(element) for element in node.elements) + "]"
+        elif isinstance(node, FunctionCall):
+            args = node.args
+            if node.name == "IF":
+                if len(args) not in (2, 3):
+                    raise Exception(f"IF takes 2 or 3 arguments, got {len(args)}")
+                otherwise = self.expression(args[2]) if len(args) == 3 else "None"
+                return f"({self.expression(args[1])} if {self.condition(args[0])} else {otherwise})"
+            elif node.name in ("AND", "OR"):
+                if not args:
+                    return "True" if node.name == "AND" else "False"
+                # Comparisons yield blank on blank input, so coerce the result to a bool
+                joiner = " and " if node.name == "AND" else " or "
+                return "bool(" + joiner.join(self.condition(arg) for arg in args) + ")"
+            function = self.function(node.name)
+            return f"{function}(" + ", ".join(self.expression(arg) for arg in args) + ")"
+        raise Exception(f"Invalid node {node}")
+
+
+def compile_formula(node: ASTNode) -> Compiled:
+    """Compile an AST into a callable that evaluates it against one record
+
+    The tree is translated once into the source of a single Python function,
+    which looks `Variable` names up in the record it is given (missing fields
+    read as blank). Values of the wrong type and division by zero are rare,
+    so the generated code does not guard against them; a record that
+    triggers one of the `evaluation_errors` is re-evaluated with
+    `interpret`, which turns them into blanks.
+
+    Args:
+        node (ASTNode): The root node of the AST
+
+    Raises:
+        Exception: When the AST uses an unknown function or operator
+
+    Returns:
+        Callable[[Mapping[str, Any]], Any]: The compiled formula
+    """
+    generator = CodeGenerator()
+    try:
+        expression = generator.expression(node)
+        source = (
+            "def formula(record):\n"
+            "    get = record.get\n"
+            "    try:\n"
+            f"        return {expression}\n"
+            "    except evaluation_errors:\n"
+            "        return interpret(node, record)\n"
+        )
+        namespace = dict(generator.names, interpret=interpret, node=node, evaluation_errors=evaluation_errors)
+        exec(compile(source, "<formula>", "exec"), namespace)
+    except (SyntaxError, RecursionError, MemoryError):
+        # Too deeply nested to generate or compile as one expression; fall
+        # back to `interpret`, which walks the tree without recursion
+        return lambda record: interpret(node, record)
+    return namespace["formula"]
+
+
+def interpret(node: ASTNode, record: Record) -> Any:
+    """Evaluate an AST against one record by walking the tree
+
+    This is the straightforward reference evaluator; `compile_formula` gives
+    the same results and is much faster when a formula is applied to many records.
+    The tree is walked with an explicit work stack rather than recursion, so
+    formulas of any nesting depth can be evaluated. An operator or function
+    given a value it cannot take gives blank rather than raising.
+    """
+    # Work items are (node, None) to evaluate a node and push its value, or
+    # (node, step) to resume a node whose operands are on `values`; for AND
+    # and OR, `step` is the number of arguments evaluated so far
+    values: List[Any] = []
+    stack: List[Tuple[ASTNode, Optional[int]]] = [(node, None)]
+    while stack:
+        node, step = stack.pop()
+        if isinstance(node, (Number, String)):
+            values.append(node.value)
+        elif isinstance(node, Variable):
+            values.append(record.get(node.name))
+        elif isinstance(node, BinOp):
+            if step is None:
+                stack += [(node, 0), (node.right, None), (node.left, None)]
+            else:
+                right = values.pop()
+                values.append(binary_ops[node.op](values.pop(), right))
+        elif isinstance(node, UnOp):
+            if step is None:
+                stack += [(node, 0), (node.right, None)]
+            else:
+                values.append(negate(values.pop()))
+        elif isinstance(node, (Array, FunctionCall)):
+            args = node.elements if isinstance(node, Array) else node.args
+            name = node.name if isinstance(node, FunctionCall) else None
+            if name == "IF":
+                if step is None:
+                    stack += [(node, 0), (args[0], None)]
+                elif truthy(values.pop()):
+                    stack.append((args[1], None))
+                elif len(args) > 2:
+                    stack.append((args[2], None))
+                else:
+                    values.append(None)
+            elif name in ("AND", "OR"):
+                # Arguments are evaluated until one decides the result
+                done = step or 0
+                if done and truthy(values.pop()) != (name == "AND"):
+                    values.append(name == "OR")
+                elif done == len(args):
+                    values.append(name == "AND")
+                else:
+                    stack += [(node, done + 1), (args[done], None)]
+            elif name is not None and name not in functions:
+                raise Exception(f"Unknown function {name}")
+            elif step is None:
+                stack.append((node, 0))
+                stack.extend((arg, None) for arg in reversed(args))
+            else:
+                operands = values[len(values) - len(args):]
+                del values[len(values) - len(args):]
+                values.append(call(functions[name], operands) if name is not None else operands)
+        else:
+            raise Exception(f"Invalid node {node}")
+    return values[0]
@@ -0,0 +1,197 @@
+from typing import Dict, List, Optional
+
+from lexer import TokenType
+from parse import ASTNode, BinOp, FunctionCall, Number, String, Variable, make_hash
+from functions import Part, field_test
+from dialects import generic, is_literal, joined, truth
+from evaluator import to_datetime, truthy
+from typecheck import BOOLEAN, DATE, NUMBER, STRING
+
+
+class Condition(ASTNode):
+    """A formula used as a record filter
+
+    Transpiles to a predicate that is true exactly for the records the
+    formula is truthy for, or with `negated` exactly for the others; records
+    where the predicate is NULL are not matched, as in a WHERE clause. The
+    predicate is written so that the database can use an index on the
+    fields compared. Conditions are expanded by the transpiler like any
+    node, so nested logic is transpiled without recursion.
+    """
+    __slots__ = ("node", "negated")
+
+    def __init__(self, node: ASTNode, negated: bool = False) -> None:
+        object.__setattr__(self, "node", node)
+        object.__setattr__(self, "negated", negated)
+        make_hash(self, (negated,), (node,))
+
+    def __repr__(self) -> str:
+        return f"Condition({self.node}, negated={self.negated})"
+
+    def children(self) -> tuple:
+        return (self.node,)
+
+    def attributes(self) -> tuple:
+        return (self.negated,)
+
+
+# Comparison to the comparison true exactly when it is false, for non-blank operands
+inverse_comparisons: Dict[TokenType, TokenType] = {
+    TokenType.EQ: TokenType.NE,
+    TokenType.NE: TokenType.EQ,
+    TokenType.LT: TokenType.GE,
+    TokenType.LE: TokenType.GT,
+    TokenType.GT: TokenType.LE,
+    TokenType.GE: TokenType.LT,
+}
+comparison_sql = {TokenType.LT: "<", TokenType.LE: "<=", TokenType.GT: ">", TokenType.GE: ">="}
+
+def constant_truth(node: ASTNode) -> Optional[bool]:
+    """Whether `node` is always truthy or always not, or None if it depends on the record"""
+    if isinstance(node, FunctionCall) and not node.args and node.name in ("TRUE", "FALSE", "BLANK"):
+        return node.name == "TRUE"
+    if isinstance(node, (Number, String)):
+        return truthy(node.value)
+    return None
+
+def logical_operands(node: ASTNode, name: str) -> List[ASTNode]:
+    """The operands of a run of AND (or OR) operators and calls, left to right"""
+    operator = TokenType[name]
+    operands: List[ASTNode] = []
+    stack = [node]
+    while stack:
+        current = stack.pop()
+        if isinstance(current, BinOp) and current.op == operator:
+            stack += [current.right, current.left]
+        elif isinstance(current, FunctionCall) and current.name == name and current.args:
+            stack.extend(reversed(current.args))
+        else:
+            operands.append(current)
+    return operands
+
+def or_blank(test: List[Part], nodes: List[ASTNode], ctx: dict) -> List[Part]:
+    """`test`, or any of the `nodes` that may be blank being blank"""
+    parts = ["("] + test
+    for node in nodes:
+        if not is_literal(node):
+            parts += [" OR ", (node, ctx), " IS NULL"]
+    return parts + [")"]
+
+def field_condition(node: Variable, negated: bool, ctx: dict) -> List[Part]:
+    # A field is compared with the value that makes it false, rather than
+    # wrapped in COALESCE, so an index on it stays usable
+    types = ctx.get("types")
+    kind = types.type_of(node) if types is not None else None
+    if kind is BOOLEAN:
+        false = FunctionCall("FALSE", ())
+        if negated:
+            return or_blank(["(", (node, ctx), " = ", (false, ctx), ")"], [node], ctx)
+        return ["(", (node, ctx), " = ", (FunctionCall("TRUE", ()), ctx), ")"]
+    if kind is NUMBER or kind is STRING:
+        false = Number(0) if kind is NUMBER else String("")
+        if negated:
+            return or_blank(["(", (node, ctx), " = ", (false, ctx), ")"], [node], ctx)
+        return ["(", (node, ctx), " <> ", (false, ctx), ")"]
+    # A field of unknown type gets a test that is never NULL
+    test = field_test(node, ctx)
+    return ["(NOT "] + test + [")"] if negated else test
+
+def blank_condition(node: FunctionCall, negated: bool, ctx: dict) -> Optional[List[Part]]:
+    arg = node.args[0]
+    types = ctx.get("types")
+    kind = types.type_of(arg) if types is not None else None
+    if kind is STRING:
+        if negated:
+            return ["(", (arg, ctx), " <> ", (String(""), ctx), ")"]
+        return ["(", (arg, ctx), " IS NULL OR ", (arg, ctx), " = ", (String(""), ctx), ")"]
+    # Only text can be empty; the generic dialect tests every value for NULL
+    if kind in (NUMBER, BOOLEAN, DATE) or "IS_BLANK" not in ctx.get("dialect", generic).functions:
+        return ["(", (arg, ctx), " IS NOT NULL)" if negated else " IS NULL)"]
+    return None
+
+def date_condition(node: FunctionCall, negated: bool, ctx: dict) -> Optional[List[Part]]:
+    # A field compared with a literal date becomes a plain range test on the field
+    first, second = node.args
+    operator = TokenType.LT if node.name == "IS_BEFORE" else TokenType.GT
+    if isinstance(first, String) and isinstance(second, Variable):
+        first, second = second, first
+        operator = TokenType.GT if operator == TokenType.LT else TokenType.LT
+    if not (isinstance(first, Variable) and isinstance(second, String)) or second.value is None:
+        return None
+    try:
+        when = to_datetime(second.value)
+    except ValueError:
+        return None
+    if negated:
+        operator = inverse_comparisons[operator]
+    literal = ctx.get("dialect", generic).timestamp(when, ctx.get("params"))
+    test = ["(", (first, ctx), f" {comparison_sql[operator]} ", literal, ")"]
+    return or_blank(test, [first], ctx) if negated else test
+
+def if_condition(node: FunctionCall, negated: bool, ctx: dict) -> List[Part]:
+    # IF(c, a, b) is true where c and a are, or where c is not and b is;
+    # branches that are constants reduce this to a test of c
+    test = node.args[0]
+    branches = [node.args[1], node.args[2] if len(node.args) > 2 else Number(None)]
+    known = [constant_truth(branch) for branch in branches]
+    if negated:
+        known = [None if value is None else not value for value in known]
+    when, otherwise = Condition(test), Condition(test, True)
+    then_branch, else_branch = (Condition(branch, negated) for branch in branches)
+    if known == [True, False]:
+        return [(when, ctx)]
+    if known == [False, True]:
+        return [(otherwise, ctx)]
+    if known[0] is True:
+        return ["("] + joined([when, else_branch], ctx, " OR ") + [")"]
+    if known[0] is False:
+        return ["("] + joined([otherwise, else_branch], ctx, " AND ") + [")"]
+    if known[1] is True:
+        return ["("] + joined([otherwise, then_branch], ctx, " OR ") + [")"]
+    if known[1] is False:
+        return ["("] + joined([when, then_branch], ctx, " AND ") + [")"]
+    return ["((", (when, ctx), " AND ", (then_branch, ctx), ") OR (",
+            (otherwise, ctx), " AND ", (else_branch, ctx), "))"]
+
+def condition_sql(condition: Condition, ctx: dict) -> List[Part]:
+    """The predicate for a `Condition`, as transpiler parts"""
+    node, negated = condition.node, condition.negated
+    known = constant_truth(node)
+    if known is not None:
+        return ["(1 = 1)" if known != negated else "(1 = 0)"]
+    if isinstance(node, Variable):
+        return field_condition(node, negated, ctx)
+
+    if isinstance(node, BinOp) and node.op in (TokenType.AND, TokenType.OR) or \
+            isinstance(node, FunctionCall) and node.name in ("AND", "OR") and node.args:
+        name = node.op.name if isinstance(node, BinOp) else node.name
+        # Negated, AND becomes OR of the negated operands and vice versa
+        operator = name if not negated else ("OR" if name == "AND" else "AND")
+        operands = [Condition(operand, negated) for operand in logical_operands(node, name)]
+        return ["("] + joined(operands, ctx, f" {operator} ") + [")"]
+    if isinstance(node, BinOp) and node.op in inverse_comparisons:
+        if not negated:
+            return [(node, ctx)]
+        inverse = BinOp(node.left, inverse_comparisons[node.op], node.right)
+        return or_blank([(inverse, ctx)], [node.left, node.right], ctx)
+
+    if isinstance(node, FunctionCall):
+        parts: Optional[List[Part]] = None
+        if node.name == "NOT" and len(node.args) == 1:
+            parts = [(Condition(node.args[0], not negated), ctx)]
+        elif node.name == "IF" and len(node.args) >= 2:
+            parts = if_condition(node, negated, ctx)
+        elif node.name == "IS_BLANK" and len(node.args) == 1:
+            parts = blank_condition(node, negated, ctx)
+        elif node.name in ("IS_BEFORE", "IS_AFTER") and len(node.args) == 2:
+            parts = date_condition(node, negated, ctx)
+        if parts is not None:
+            return parts
+
+    # Anything else is computed and tested for truth
+    test_ctx = dict(ctx, in_logic_exp=True)
+    types = ctx.get("types")
+    if not negated and types is not None and types.type_of(node) is BOOLEAN:
+        return [(node, test_ctx)]
+    test = truth(node, test_ctx)
+    return ["(NOT "] + test + [")"] if negated else test
@@ -1,22 +1,107 @@
-from lexer import Token, TokenType, lex
-from parse import ASTNode, Parser
-
-class Formula:
-    def __init__(self, code: str, print_ast=False, print_tokens=False):
-        self.code = code
-        self.parser = Parser()
-        self.print_tokens = print_tokens
-        self.ast: ASTNode|None = self.parse() 
-        if print_ast and self.ast is not None:
-            self.ast.output()
-    
-    def parse(self) -> ASTNode|None:
-        try: 
-            tokens = lex(self.code)
-            if self.print_tokens:
-                print(tokens)
-            parsed = self.parser.parse(tokens)
-        except Exception as e: 
-            print(f"Failed to parse {self.code}: {e}")
-            return None
-        return parsed
+from typing import Optional, TextIO
+
+from lexer import Token, TokenType, lex, lex_spans, tokenize
+from parse import ASTNode, Parser
+from cache import ParseCache, parse_cache
+from optimize import Optimizer
+from instrument import FormulaMetrics, Instrumentation, tree_counts
+from transpiler import Transpiler
+
+class Formula:
+    def __init__(self, code: str, print_ast=False, print_tokens=False, cache: ParseCache|None = parse_cache,
+                 optimizer: Optimizer|None = None, instrumentation: Instrumentation|None = None):
+        self.code = code
+        self.parser = Parser()
+        self.print_tokens = print_tokens
+        self.cache = cache
+        self.optimizer = optimizer
+        self.instrumentation = instrumentation
+        # Why parsing failed, if it did
+        self.error: Exception|None = None
+        # Per-phase metrics of the parse, when instrumented
+        self.metrics: FormulaMetrics|None = None
+        self.ast: ASTNode|None = self.parse()
+        if print_ast and self.ast is not None:
+            self.ast.output()
+
+    def parse(self) -> ASTNode|None:
+        if self.instrumentation is not None:
+            return self.parse_instrumented(self.instrumentation)
+        try:
+            if self.print_tokens:
+                tokens = lex(self.code)
+                print(tokens)
+                parsed = self.parser.parse(tokens)
+            elif self.cache is not None:
+                # The cached AST may be shared with other formulas
+                parsed = self.cache.get(self.code)
+            else:
+                parsed = self.parser.parse(tokenize(self.code))
+            if parsed is not None and self.optimizer is not None:
+                parsed = self.optimizer.optimize(parsed)
+        except Exception as e:
+            self.error = e
+            print(f"Failed to parse {self.code}: {e}")
+            return None
+        return parsed
+
+    def parse_instrumented(self, instrumentation: Instrumentation) -> ASTNode|None:
+        """Parse with each phase timed separately
+
+        The parse cache is bypassed, so the timings are those of the actual work.
+        """
+        clock = instrumentation.clock
+        metrics = self.metrics = FormulaMetrics(self.code)
+        parsed = None
+        try:
+            start = clock()
+            stream = lex_spans(self.code)
+            metrics.timings["lex"] = clock() - start
+            metrics.tokens = len(stream)
+            if self.print_tokens:
+                print(list(stream))
+
+            start = clock()
+            parsed = self.parser.parse(stream)
+            metrics.timings["parse"] = clock() - start
+            metrics.nodes, metrics.folded = tree_counts(stream, parsed)
+
+            if parsed is not None and self.optimizer is not None:
+                start = clock()
+                parsed = self.optimizer.optimize(parsed)
+                metrics.timings["optimize"] = clock() - start
+                metrics.nodes, _ = tree_counts(stream, parsed)
+        except Exception as e:
+            self.error = e
+            metrics.error = str(e)
+            print(f"Failed to parse {self.code}: {e}")
+            parsed = None
+        instrumentation.record(metrics)
+        return parsed
+
+    def transpile(self, transpiler: Transpiler, table_name: str, result_name: str,
+                  stream: Optional[TextIO] = None) -> Optional[str]:
+        """Transpile this formula's AST, timing it when instrumented
+
+        Args:
+            transpiler (Transpiler): The transpiler to use
+            table_name (str): The table the formula's fields belong to
+            result_name (str): The name of the result column
+            stream (TextIO | None): If given, the SQL is written to this stream
+
+        Returns:
+            str | None: The SQL, or None if it was written to `stream`
+        """
+        if self.instrumentation is None:
+            return transpiler.transpile(self.ast, table_name, result_name, stream)
+        clock = self.instrumentation.clock
+        metrics = FormulaMetrics(self.code)
+        start = clock()
+        try:
+            return transpiler.transpile(self.ast, table_name, result_name, stream)
+        except Exception as e:
+            metrics.error = str(e)
+            raise
+        finally:
+            metrics.timings["transpile"] = clock() - start
+            self.instrumentation.record(metrics)
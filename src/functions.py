@@ -0,0 +1,268 @@
+from typing import Any, Callable, Dict, List, NamedTuple, Optional, Sequence, Tuple, Union
+
+from lexer import TokenType
+from parse import ASTNode, BinOp, FunctionCall, Number, Variable
+from valuetypes import ANY, BOOLEAN, DATE, NULL, NUMBER, STRING, Signature
+import evaluator
+
+# One piece of a node's SQL: text, a child to transpile with its context, or
+# an adjustment to the `transpiler.SQLWriter` (newlines, indentation)
+Part = Union[str, Tuple[ASTNode, dict], Callable[..., None]]
+
+# Emits the SQL for one call, given the call node and its context
+Emitter = Callable[[FunctionCall, dict], List[Part]]
+
+def line(text: str) -> Callable[..., None]:
+    """Start a new, indented line with `text`"""
+    return lambda out: out.write(text, nl=True, indent=True)
+
+def shift(step: int) -> Callable[..., None]:
+    """Change the indentation level by `step`"""
+    def apply(out: Any) -> None:
+        out.indent += step
+    return apply
+
+
+class FunctionDef(NamedTuple):
+    """Everything the library knows about one formula function
+
+    Attributes:
+        name (str): The formula name, upper-case
+        min_args (int): The fewest arguments the function accepts
+        max_args (int | None): The most arguments it accepts, if limited
+        emit (Emitter): Emits the function's SQL
+        evaluate (Callable | None): The in-process implementation, taking
+            evaluated arguments; None if the function only transpiles
+        pure (bool): Whether equal arguments always give equal results, so
+            calls on literals may be evaluated ahead of time
+        signature (Signature | None): The types the function takes and
+            returns, for `typecheck`; None if it takes anything and returns ANY
+    """
+    name: str
+    min_args: int
+    max_args: Optional[int]
+    emit: Emitter
+    evaluate: Optional[Callable[..., Any]]
+    pure: bool
+    signature: Optional[Signature] = None
+
+    def arity_error(self, count: int) -> Optional[str]:
+        """Why `count` arguments are not accepted, or None if they are"""
+        if count < self.min_args or (self.max_args is not None and count > self.max_args):
+            if self.max_args is None:
+                expected = f"at least {self.min_args}"
+            elif self.min_args == self.max_args:
+                expected = f"{self.min_args}"
+            else:
+                expected = f"{self.min_args} to {self.max_args}"
+            noun = "argument" if expected == "1" else "arguments"
+            return f"{self.name} expects {expected} {noun}, got {count}"
+        return None
+
+    def check_arity(self, count: int) -> None:
+        """
+        Raises:
+            Exception: When `count` arguments are not accepted
+        """
+        error = self.arity_error(count)
+        if error is not None:
+            raise Exception(error)
+
+
+# Function name to definition, filled by `register_function`
+library: Dict[str, FunctionDef] = {}
+
+def register_function(name: str, emit: Emitter, evaluate: Optional[Callable[..., Any]] = None,
+                      min_args: int = 0, max_args: Optional[int] = None, pure: bool = True,
+                      signature: Optional[Signature] = None) -> FunctionDef:
+    """Add a function to the library, or replace an existing one
+
+    The transpiler emits calls to `name` with `emit`. If `evaluate` is given,
+    the evaluators use it too; IF, AND and OR are evaluated lazily by the
+    evaluators themselves and cannot be replaced there.
+
+    Args:
+        name (str): The formula name; matched case-insensitively, like the parser
+        emit (Emitter): Returns the call's SQL as a list of parts
+        evaluate (Callable | None): The in-process implementation
+        min_args (int): The fewest arguments accepted
+        max_args (int | None): The most arguments accepted, if limited
+        pure (bool): Whether calls on literals may be folded ahead of time
+        signature (Signature | None): The argument and result types, for
+            `typecheck`; without one, calls are typed ANY
+
+    Returns:
+        FunctionDef: The registered definition
+    """
+    name = name.upper()
+    definition = FunctionDef(name, min_args, max_args, emit, evaluate, pure, signature)
+    library[name] = definition
+    if evaluate is not None:
+        evaluator.functions[name] = evaluate
+    return definition
+
+
+def sql_call(sql_name: str, order: Optional[Sequence[int]] = None) -> Emitter:
+    """An emitter for a plain SQL function call
+
+    Args:
+        sql_name (str): The SQL function's name
+        order (Sequence[int] | None): The formula arguments to pass, by index,
+            if not all of them in order
+    """
+    def emit(node: FunctionCall, ctx: dict) -> List[Part]:
+        args = node.args if order is None else [node.args[i] for i in order]
+        parts: List[Part] = [f"{sql_name}("]
+        for i, arg in enumerate(args):
+            parts.append((arg, ctx))
+            if i < len(args) - 1:
+                parts.append(", ")
+        parts.append(")")
+        return parts
+    return emit
+
+def sql_operator(operator: str) -> Emitter:
+    """An emitter joining all arguments with a binary SQL operator"""
+    def emit(node: FunctionCall, ctx: dict) -> List[Part]:
+        parts: List[Part] = ["(", (node.args[0], ctx)]
+        for arg in node.args[1:]:
+            parts += [f" {operator} ", (arg, ctx)]
+        parts.append(")")
+        return parts
+    return emit
+
+def sql_find(position: str, greatest: str) -> Emitter:
+    """FIND(needle, haystack, start) with the engine's `position(haystack,
+    needle)` function, which has no start argument"""
+    def emit(node: FunctionCall, ctx: dict) -> List[Part]:
+        needle, haystack = node.args[0], node.args[1]
+        if len(node.args) == 2:
+            return [f"{position}(", (haystack, ctx), ", ", (needle, ctx), ")"]
+        offset = node.args[2]
+        if isinstance(offset, Number) and offset.value is not None:
+            start: List[Part] = [str(max(int(offset.value), 1))]
+        else:
+            start = [f"{greatest}(", (offset, ctx), ", 1)"]
+        found: List[Part] = [f"{position}(SUBSTR(", (haystack, ctx), ", "] + start + ["), ", (needle, ctx), ")"]
+        return ["(CASE WHEN "] + found + [" > 0 THEN "] + found + [" + "] + start + [" - 1 ELSE "] + found + [" END)"]
+    return emit
+
+def sql_constant(sql: str) -> Emitter:
+    return lambda node, ctx: [sql]
+
+def chain_binops(args: Sequence[ASTNode], operator: TokenType) -> ASTNode:
+    # Right-nested, built from the end so no argument list is sliced
+    node = args[-1]
+    for arg in reversed(args[:-1]):
+        node = BinOp(arg, operator, node)
+    return node
+
+def value_test(node: ASTNode, ctx: dict) -> List[Part]:
+    """A test of `node`, of unknown type, for formula truth: neither blank,
+    empty text nor zero"""
+    return ["(COALESCE(", (node, ctx), ", '') <> '' AND COALESCE(", (node, ctx), ", 0) <> 0)"]
+
+def field_test(node: Variable, ctx: dict) -> List[Part]:
+    """A field used as a condition
+
+    A field the schema types is tested the way formulas test its values:
+    booleans for being true, numbers for being non-zero and text for being
+    non-empty. A field of unknown type is tested for all of these, the way
+    the dialect tests values of unknown type.
+    """
+    types = ctx.get("types")
+    kind = types.type_of(node) if types is not None else None
+    if kind is BOOLEAN:
+        return ["(", (node, ctx), " IS TRUE)"]
+    if kind is NUMBER:
+        return ["(COALESCE(", (node, ctx), ", 0) <> 0)"]
+    if kind is STRING:
+        return ["(COALESCE(", (node, ctx), ", '') <> '')"]
+    dialect = ctx.get("dialect")
+    return dialect.untyped_truth(node, ctx) if dialect is not None else value_test(node, ctx)
+
+def logical_operand(node: ASTNode, ctx: dict) -> List[Part]:
+    """An operand of AND or OR: in a condition, a bare field is tested"""
+    if isinstance(node, Variable) and ctx.get("in_logic_exp", False):
+        return field_test(node, ctx)
+    return [(node, ctx)]
+
+def sql_logical(operator: TokenType) -> Emitter:
+    def emit(node: FunctionCall, ctx: dict) -> List[Part]:
+        if len(node.args) == 1 and isinstance(node.args[0], Variable):
+            return field_test(node.args[0], ctx)
+        return [(chain_binops(node.args, operator), dict(ctx, in_logic_exp=True))]
+    return emit
+
+def sql_if(node: FunctionCall, ctx: dict) -> List[Part]:
+    parts: List[Part] = []
+    if not ctx.get("in_if", False):
+        parts += ["CASE", shift(1), line("WHEN ")]
+    else:
+        parts.append(line("WHEN "))
+
+    # Only an IF in the ELSE branch continues this CASE; IFs in the
+    # condition and branches get their own
+    test_ctx = {key: value for key, value in ctx.items() if key != "in_if"}
+    branch_ctx = {key: value for key, value in test_ctx.items() if key != "in_logic_exp"}
+    types, dialect = ctx.get("types"), ctx.get("dialect")
+    condition_ctx = dict(test_ctx, in_logic_exp=True)
+    if dialect is not None:
+        parts += dialect.condition(node.args[0], condition_ctx)
+    else:
+        parts.append((node.args[0], condition_ctx))
+    # The branches of a numeric IF are numbers, even where one is a boolean
+    if types is not None and dialect is not None and types.type_of(node) is NUMBER:
+        branch = lambda arg: dialect.number(arg, branch_ctx)
+    else:
+        branch = lambda arg: [(arg, branch_ctx)]
+    parts += [" THEN ", shift(1)] + branch(node.args[1]) + [shift(-1)]
+    otherwise = node.args[2] if len(node.args) > 2 else None
+    if isinstance(otherwise, FunctionCall) and otherwise.name == "IF":
+        # Nested IF, should be transpiled to a nested CASE WHEN
+        parts.append((otherwise, dict(branch_ctx, in_if=True)))
+    elif otherwise is not None:
+        parts += [line("ELSE ")] + branch(otherwise) + [shift(-1)]
+    else:
+        parts.append(shift(-1))
+    if not ctx.get("in_if", False):
+        parts += [shift(-1), line("END")]
+    return parts
+
+
+# Built-in functions: name, emitter, arity, purity and signature. Implementations
+# come from `evaluator.functions`; IF, AND and OR are evaluated by the evaluators,
+# and IF is typed by its branches.
+builtins: List[Tuple[str, Emitter, int, Optional[int], bool, Optional[Signature]]] = [
+    ("IF", sql_if, 2, 3, True, None),
+    ("ADD", sql_operator("+"), 1, None, True, Signature((NUMBER,), NUMBER)),
+    ("AND", sql_logical(TokenType.AND), 1, None, True, Signature((ANY,), BOOLEAN)),
+    ("OR", sql_logical(TokenType.OR), 1, None, True, Signature((ANY,), BOOLEAN)),
+    ("XOR", sql_operator("XOR"), 1, None, True, Signature((ANY,), BOOLEAN)),
+    ("NOT", lambda node, ctx: ["(", (node.args[0], ctx), " = 0)"], 1, 1, True, Signature((ANY,), BOOLEAN)),
+    ("TRUE", sql_constant("1"), 0, 0, True, Signature((), BOOLEAN)),
+    ("FALSE", sql_constant("0"), 0, 0, True, Signature((), BOOLEAN)),
+    ("BLANK", sql_call("BLANK"), 0, 0, True, Signature((), NULL)),
+    ("SUM", sql_call("SUM"), 1, None, True, Signature((ANY,), NUMBER)),
+    ("MIN", sql_call("MIN"), 1, None, True, Signature((ANY,), NUMBER)),
+    ("MAX", sql_call("MAX"), 1, None, True, Signature((ANY,), NUMBER)),
+    ("AVERAGE", sql_call("AVERAGE"), 1, None, True, Signature((ANY,), NUMBER)),
+    ("ABS", sql_call("ABS"), 1, 1, True, Signature((NUMBER,), NUMBER)),
+    ("ROUND", sql_call("ROUND"), 1, 2, True, Signature((NUMBER, NUMBER), NUMBER)),
+    ("LEN", sql_call("LENGTH"), 1, 1, True, Signature((ANY,), NUMBER)),
+    ("UPPER", sql_call("UPPER"), 1, 1, True, Signature((ANY,), STRING)),
+    ("LOWER", sql_call("LOWER"), 1, 1, True, Signature((ANY,), STRING)),
+    ("TRIM", sql_call("TRIM"), 1, 1, True, Signature((ANY,), STRING)),
+    ("FIND", sql_find("INSTR", "GREATEST"), 2, 3, True, Signature((ANY, ANY, NUMBER), NUMBER)),
+    ("CONCATENATE", sql_call("CONCAT"), 1, None, True, Signature((ANY,), STRING)),
+    ("SUBSTITUTE", sql_call("REPLACE"), 3, 3, True, Signature((ANY,), STRING)),
+    ("DATETIME_DIFF", sql_call("DATEDIFF", (0, 1)), 2, 3, True, Signature((DATE, DATE, STRING), NUMBER)),
+    ("TODAY", sql_constant("CURRENT_DATE"), 0, 0, False, Signature((), DATE)),
+    ("NOW", sql_call("NOW"), 0, 0, False, Signature((), DATE)),
+    ("IS_BEFORE", lambda node, ctx: ["(", (node.args[0], ctx), " < ", (node.args[1], ctx), ")"], 2, 2, True,
+     Signature((DATE, DATE), BOOLEAN)),
+    ("IS_AFTER", sql_call("IS_AFTER"), 2, 2, True, Signature((DATE, DATE), BOOLEAN)),
+    ("IS_BLANK", lambda node, ctx: ["(", (node.args[0], ctx), " IS NULL)"], 1, 1, True, Signature((ANY,), BOOLEAN)),
+]
+for name, emit, min_args, max_args, pure, signature in builtins:
+    register_function(name, emit, evaluator.functions.get(name), min_args, max_args, pure, signature)
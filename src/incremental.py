@@ -0,0 +1,131 @@
+from array import array
+from bisect import bisect_left
+from typing import Dict, NamedTuple, Optional
+
+from lexer import TokenStream, TokenType, scan_spans
+from parse import ASTNode, EditedPrimary, Memo, Parser
+
+# Re-lexing restarts this many tokens before the edit: a number followed by
+# `.` is scanned as a possible float, two tokens ahead
+LOOKBEHIND = 2
+
+
+class ParseResult(NamedTuple):
+    """One parse of an editing session, the input to the next `edit`
+
+    Attributes:
+        source (str): The formula text
+        stream (TokenStream): Its tokens, with their source offsets
+        ast (ASTNode | None): The AST, or None if the text is empty or invalid
+        memo (Memo): The span of every bracketed primary parsed so far,
+            valid for `stream`
+        error (str | None): Why parsing failed, if it did
+        relexed (int): How many tokens were lexed to produce this result
+    """
+    source: str
+    stream: TokenStream
+    ast: Optional[ASTNode]
+    memo: Memo
+    error: Optional[str]
+    relexed: int
+
+
+parser = Parser()
+
+def parse_with_memo(stream: TokenStream, memo: Memo, relexed: int,
+                    edited: Optional[Dict[int, EditedPrimary]] = None) -> ParseResult:
+    try:
+        ast = parser.parse(stream, memo, edited)
+        error = None
+    except Exception as e:
+        # Everything already in the memo is still valid for the next edit
+        ast, error = None, str(e)
+    return ParseResult(stream.source, stream, ast, memo, error, relexed)
+
+def parse_full(code: str) -> ParseResult:
+    """Start an editing session by parsing `code` from scratch
+
+    A lexing error propagates, as there is no token stream to edit.
+    """
+    stream = TokenStream(code)
+    for kind_code, start, end in scan_spans(code):
+        stream.kinds.append(kind_code)
+        stream.starts.append(start)
+        stream.ends.append(end)
+    return parse_with_memo(stream, {}, len(stream))
+
+def shifted(offsets: array, delta: int) -> array:
+    return array("I", map(delta.__add__, offsets)) if delta else offsets
+
+def edit(previous: ParseResult, offset: int, deleted: int, inserted: str) -> ParseResult:
+    """Re-parse after replacing `deleted` characters at `offset` with `inserted`
+
+    Only the tokens around the edit are lexed again: lexing restarts just
+    before the edit and stops at the first token that starts where an old
+    token started, past the edit. The tokens after that are the old ones,
+    shifted. Parsing then reuses the subtree of every call, array and
+    parenthesised expression whose tokens lie entirely outside the edit.
+    A call or array enclosing the edit keeps its items before and after it,
+    so only the items the edit touched are parsed again, at each level.
+
+    Operator chains are not memoized: the operands of `+`, `&` and the other
+    binary operators, outside any bracket, are parsed again on every edit,
+    as are the operators between them. An edit to a formula that is one long
+    chain, such as thousands of fields joined with `&`, costs about as much
+    as parsing it from scratch; write such a formula as a call, e.g.
+    `CONCATENATE`, to keep its edits cheap. Shifting the offsets of the
+    tokens and memo entries after the edit is linear in their number either
+    way, though much cheaper than parsing.
+
+    Raises:
+        Exception: When the edited text fails to lex
+    """
+    old = previous.stream
+    source = previous.source[:offset] + inserted + previous.source[offset + deleted:]
+    delta = len(inserted) - deleted
+    kinds, starts, ends = old.kinds, old.starts, old.ends
+    count = len(kinds)
+
+    first = max(bisect_left(ends, offset) - LOOKBEHIND, 0)
+    # An unterminated `{` lexes as LBRACE only because no `}` followed it,
+    # anywhere up to the end of the text; any edit may change that
+    brace = kinds.tobytes().find(TokenType.LBRACE.value)
+    if brace != -1:
+        first = min(first, brace)
+    restart = min(starts[first] if first < count else (ends[count - 1] if count else 0), offset)
+
+    # Lex until a new token starts where an old token after the edit started;
+    # the text from there on is unchanged, so the tokens are too
+    resume = bisect_left(starts, offset + deleted)
+    new_kinds, new_starts, new_ends = array("B"), array("I"), array("I")
+    for kind_code, start, end in scan_spans(source, restart):
+        if start >= offset + len(inserted):
+            while resume < count and starts[resume] < start - delta:
+                resume += 1
+            if resume < count and starts[resume] == start - delta:
+                break
+        new_kinds.append(kind_code)
+        new_starts.append(start)
+        new_ends.append(end)
+    else:
+        resume = count
+
+    stream = TokenStream(source)
+    stream.kinds = kinds[:first] + new_kinds + kinds[resume:]
+    stream.starts = starts[:first] + new_starts + shifted(starts[resume:], delta)
+    stream.ends = ends[:first] + new_ends + shifted(ends[resume:], delta)
+
+    # Keep the primaries that lie wholly before or wholly after the edit, and
+    # the calls and arrays whose brackets and first item start lie outside it
+    shift = first + len(new_kinds) - resume
+    memo: Memo = {}
+    edited: Dict[int, EditedPrimary] = {}
+    for start, entry in previous.memo.items():
+        length = entry[1]
+        if start + length <= first:
+            memo[start] = entry
+        elif start >= resume:
+            memo[start + shift] = entry
+        elif entry[2] is not None and start + entry[2][0] <= first and start + length - 1 >= resume:
+            edited[start] = EditedPrimary(entry[0], length + shift, entry[2], first - start, resume - start, shift)
+    return parse_with_memo(stream, memo, len(new_kinds), edited)
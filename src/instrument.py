@@ -0,0 +1,165 @@
+import time
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+from lexer import TokenStream, TokenType
+from parse import ASTNode, BinOp, UnOp, precedences, walk
+
+# Kind codes of the tokens that each build one BinOp or UnOp while parsing
+operator_codes = frozenset(kind.value for kind in precedences) | {TokenType.MINUS.value}
+
+
+class FormulaMetrics:
+    """What happened to one formula in the phases that ran for it
+
+    Attributes:
+        code (str): The formula source
+        timings (dict[str, float]): Seconds spent per phase ("lex", "parse",
+            "optimize", "transpile", or "load" from a compile cache instead
+            of lexing and parsing), for the phases that ran
+        tokens (int): Tokens lexed
+        nodes (int): Nodes in the final AST
+        folded (int): Operator nodes folded away by `simplify` while parsing
+        error (str | None): Why the formula failed, if it did
+    """
+    __slots__ = ("code", "timings", "tokens", "nodes", "folded", "error")
+
+    def __init__(self, code: str) -> None:
+        self.code = code
+        self.timings: Dict[str, float] = {}
+        self.tokens = 0
+        self.nodes = 0
+        self.folded = 0
+        self.error: Optional[str] = None
+
+    def __repr__(self) -> str:
+        timings = ", ".join(f"{phase}={seconds * 1e6:.1f}us" for phase, seconds in self.timings.items())
+        return (f"FormulaMetrics({timings}, tokens={self.tokens}, nodes={self.nodes}, "
+                f"folded={self.folded}, error={self.error!r})")
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {slot: getattr(self, slot) for slot in self.__slots__}
+
+
+def tree_counts(stream: TokenStream, ast: Optional[ASTNode]) -> Tuple[int, int]:
+    """The node count of `ast`, and how many operators `simplify` folded
+    while parsing it from `stream`
+
+    Every operator token builds exactly one BinOp or UnOp, so those missing
+    from the finished tree are the ones that were folded into literals.
+    """
+    if ast is None:
+        return 0, 0
+    operators = sum(1 for code in stream.kinds if code in operator_codes)
+    nodes = remaining = 0
+    for node in walk(ast):
+        nodes += 1
+        if isinstance(node, (BinOp, UnOp)):
+            remaining += 1
+    return nodes, operators - remaining
+
+
+class PhaseStats:
+    __slots__ = ("count", "seconds", "max_seconds")
+
+    def __init__(self) -> None:
+        self.count = 0
+        self.seconds = 0.0
+        self.max_seconds = 0.0
+
+    def as_dict(self) -> Dict[str, float]:
+        return {
+            "count": self.count,
+            "seconds": self.seconds,
+            "mean_us": self.seconds / self.count * 1e6 if self.count else 0.0,
+            "max_us": self.max_seconds * 1e6,
+        }
+
+
+class CumulativeStats:
+    """Totals over every recorded formula, for batch runs
+
+    Stats from several processes can be combined with `merge`, using the
+    dict form from `as_dict`.
+    """
+    def __init__(self) -> None:
+        self.formulas = 0
+        self.errors = 0
+        self.tokens = 0
+        self.nodes = 0
+        self.folded = 0
+        self.phases: Dict[str, PhaseStats] = {}
+
+    def add(self, metrics: FormulaMetrics) -> None:
+        # A formula is counted once, by the record that lexed or loaded it
+        if "lex" in metrics.timings or "load" in metrics.timings:
+            self.formulas += 1
+            self.tokens += metrics.tokens
+            self.nodes += metrics.nodes
+            self.folded += metrics.folded
+        if metrics.error is not None:
+            self.errors += 1
+        for phase, seconds in metrics.timings.items():
+            stats = self.phases.get(phase)
+            if stats is None:
+                stats = self.phases[phase] = PhaseStats()
+            stats.count += 1
+            stats.seconds += seconds
+            stats.max_seconds = max(stats.max_seconds, seconds)
+
+    def merge(self, other: Dict[str, Any]) -> None:
+        """Add the totals of another `as_dict` result into these"""
+        for name in ("formulas", "errors", "tokens", "nodes", "folded"):
+            setattr(self, name, getattr(self, name) + other[name])
+        for phase, totals in other["phases"].items():
+            stats = self.phases.get(phase)
+            if stats is None:
+                stats = self.phases[phase] = PhaseStats()
+            stats.count += totals["count"]
+            stats.seconds += totals["seconds"]
+            stats.max_seconds = max(stats.max_seconds, totals["max_us"] / 1e6)
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "formulas": self.formulas,
+            "errors": self.errors,
+            "tokens": self.tokens,
+            "nodes": self.nodes,
+            "folded": self.folded,
+            "phases": {phase: stats.as_dict() for phase, stats in self.phases.items()},
+        }
+
+    def report(self) -> str:
+        lines = [f"{self.formulas} formulas, {self.errors} errors, {self.tokens} tokens, "
+                 f"{self.nodes} nodes, {self.folded} folded"]
+        for phase, stats in self.phases.items():
+            totals = stats.as_dict()
+            lines.append(f"  {phase:>10}: {totals['seconds']:.3f}s total, "
+                         f"{totals['mean_us']:.1f}us mean, {totals['max_us']:.1f}us max")
+        return "\n".join(lines)
+
+
+Sink = Callable[[FormulaMetrics], None]
+
+class Instrumentation:
+    """Opt-in metrics for `formula.Formula`
+
+    Pass one to `Formula(..., instrumentation=...)`. Every parse, and every
+    `Formula.transpile`, produces a `FormulaMetrics` record. Each record is
+    added to `stats` and handed to every sink, e.g. to feed a monitoring
+    system. Formulas built without instrumentation skip all of this.
+
+    Args:
+        sinks (Iterable[Sink]): Callbacks receiving every record
+    """
+    def __init__(self, sinks: Iterable[Sink] = ()) -> None:
+        self.sinks: List[Sink] = list(sinks)
+        self.stats = CumulativeStats()
+        self.clock = time.perf_counter
+
+    def add_sink(self, sink: Sink) -> None:
+        self.sinks.append(sink)
+
+    def record(self, metrics: FormulaMetrics) -> None:
+        self.stats.add(metrics)
+        for sink in self.sinks:
+            sink(metrics)
@@ -1,6 +1,7 @@
 import re
+from array import array
 from enum import Enum, auto
-from typing import List, Tuple, Pattern, Union
+from typing import Iterator, List, Tuple, Pattern
 
 class TokenType(Enum):
     SKIP = auto()
@@ -44,7 +45,8 @@ class TokenType(Enum):
 # Define token specifications
 token_specification: List[Tuple[TokenType, Pattern[str]]] = [(i[0], re.compile(i[1])) for i in [
     (TokenType.SKIP,     r'[ \t\n]+'),           # Skip over spaces, newlines, and tabs
-    (TokenType.NUMBER,   r'((\d+)\.\d+)(?!\w)'), # Float
+    (TokenType.VARIABLE_NAME, r'\{(?:\\.|[^}\\])*\}'),  # Field names, \ escapes the next character
+    (TokenType.NUMBER,   r'\d+\.\d+(?!\w)'),     # Float
     (TokenType.NUMBER,   r'\d+(?!\w)'),          # Integer
     (TokenType.LPAREN,   r'\('),                 # Left parenthesis
     (TokenType.RPAREN,   r'\)'),                 # Right parenthesis
@@ -81,34 +83,129 @@ class Token:
     def __repr__(self) -> str:
         return str(self)
 
+# Shared end-of-input token, so running past the end never allocates
+EOF_TOKEN = Token(TokenType.EOF, None)
+
+# Kind codes are the `TokenType` values, which all fit in an unsigned byte
+kinds_by_code: List[TokenType] = [TokenType.MISMATCH] * (max(kind.value for kind in TokenType) + 1)
+for kind in TokenType:
+    kinds_by_code[kind.value] = kind
+
+class TokenStream:
+    """A token sequence stored as parallel arrays instead of `Token` objects
+
+    `kinds` holds one kind code per token and `starts`/`ends` its offsets into
+    `source`; token text is only sliced out when `value` is asked for it.
+    Indexing past the last token yields EOF.
+    """
+    __slots__ = ("source", "kinds", "starts", "ends")
+
+    def __init__(self, source: str) -> None:
+        self.source = source
+        self.kinds = array("B")
+        self.starts = array("I")
+        self.ends = array("I")
+
+    def __len__(self) -> int:
+        return len(self.kinds)
+
+    def __iter__(self) -> Iterator[Token]:
+        for index in range(len(self.kinds)):
+            yield self.token(index)
+
+    def __repr__(self) -> str:
+        return f"TokenStream({list(self)})"
+
+    def kind(self, index: int) -> TokenType:
+        return kinds_by_code[self.kinds[index]] if index < len(self.kinds) else TokenType.EOF
+
+    def value(self, index: int) -> str|None:
+        if index >= len(self.kinds):
+            return None
+        text = self.source[self.starts[index]:self.ends[index]]
+        if self.kinds[index] == TokenType.VARIABLE_NAME.value:
+            return variable_name(text)
+        return text
+
+    def token(self, index: int) -> Token:
+        if index >= len(self.kinds):
+            return EOF_TOKEN
+        return Token(kinds_by_code[self.kinds[index]], self.value(index))
+
+# All patterns combined into one alternation, tried in specification order.
+# Each pattern is wrapped in its own group, so `match.lastindex` identifies
+# which one matched; the patterns themselves must not contain capture groups.
+master_pattern: Pattern[str] = re.compile("|".join(f"({regex.pattern})" for _, regex in token_specification))
+group_kinds: Tuple[TokenType, ...] = (TokenType.MISMATCH,) + tuple(kind for kind, _ in token_specification)
+group_codes: Tuple[int, ...] = tuple(kind.value for kind in group_kinds)
+
+escape_pattern: Pattern[str] = re.compile(r"\\(.)")
+
+def variable_name(text: str) -> str:
+    """Extract the field name from a `{Field Name}` lexeme, resolving escapes"""
+    inner = text[1:-1]
+    if "\\" in inner:
+        inner = escape_pattern.sub(r"\1", inner)
+    return inner
+
 # Lexer function
+def tokenize(code: str) -> Iterator[Token]:
+    """Lazily yield the tokens of `code`, one master-pattern match at a time"""
+    match_at = master_pattern.match
+    kinds = group_kinds
+    pos = 0
+    end = len(code)
+    while pos < end:
+        match = match_at(code, pos)
+        if match is None:
+            raise Exception(f"Invalid character {code[pos]} at position {pos}")
+        kind = kinds[match.lastindex]
+        if kind is TokenType.VARIABLE_NAME:
+            yield Token(kind, variable_name(match.group()))
+        elif kind is not TokenType.SKIP:
+            yield Token(kind, match.group())
+        pos = match.end()
+
 def lex(code: str) -> List[Token]:
+    return list(tokenize(code))
+
+def lex_spans(code: str) -> TokenStream:
+    """Lex `code` into a compact `TokenStream`"""
+    stream = TokenStream(code)
+    add_kind = stream.kinds.append
+    add_start = stream.starts.append
+    add_end = stream.ends.append
+    match_at = master_pattern.match
+    codes = group_codes
+    skip = TokenType.SKIP.value
     pos = 0
-    tokens: List[Token] = []
-    while pos < len(code):
-        match: Union[re.Match[str], None] = None
-        if code[pos] == '{':
-            pos += 1
-            inner = ""
-            while code[pos] != '}':
-                if code[pos] == "\\":
-                    pos += 1
-                inner += code[pos]
-                pos += 1
-            tokens.append(Token(TokenType.VARIABLE_NAME, inner))
-            pos += 1
-            continue
-        for token_kind, regex in token_specification:
-            match = regex.match(code, pos)
-            if match:
-                text = match.group(0)
-                if token_kind != TokenType.SKIP:
-                    tokens.append(Token(token_kind, text))
-                break
-        if not match:
+    end = len(code)
+    while pos < end:
+        match = match_at(code, pos)
+        if match is None:
+            raise Exception(f"Invalid character {code[pos]} at position {pos}")
+        kind_code = codes[match.lastindex]
+        start, pos = match.span()
+        if kind_code != skip:
+            add_kind(kind_code)
+            add_start(start)
+            add_end(pos)
+    return stream
+
+def scan_spans(code: str, pos: int = 0) -> Iterator[Tuple[int, int, int]]:
+    """Lazily yield (kind code, start, end) for each token of `code` from `pos`"""
+    match_at = master_pattern.match
+    codes = group_codes
+    skip = TokenType.SKIP.value
+    end = len(code)
+    while pos < end:
+        match = match_at(code, pos)
+        if match is None:
             raise Exception(f"Invalid character {code[pos]} at position {pos}")
-        pos = match.end(0)
-    return tokens
+        kind_code = codes[match.lastindex]
+        start, pos = match.span()
+        if kind_code != skip:
+            yield kind_code, start, pos
 
 # Example usage
 if __name__ == '__main__':
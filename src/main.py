@@ -1,29 +1,81 @@
-from parse import *
-from lexer import lex
-from formula import Formula
-from transpiler import Transpiler
-import sys
-
-def main():
-    args = sys.argv
-    transpiler = Transpiler()
-    do_transpile = args.count("-t") > 0
-    do_print_parse = args.count("--ast") > 0
-    do_print_tokens = args.count("--tokens") > 0
-    do_use_file = args.count("-f") > 0
-    f = None if not do_use_file else args[args.index("-f") + 1]
-    if do_use_file:
-        inp: str = open(f, "r").read()
-        formula = Formula(inp, print_ast=do_print_parse, print_tokens=do_print_tokens)
-        if do_transpile: print(transpiler.transpile(formula.ast, "my_table", "result"))
-        return
-    while True:
-        try:
-            code = input(">> ")
-            formula = Formula(code, print_ast=do_print_parse, print_tokens=do_print_tokens)
-            if do_transpile: print(transpiler.transpile(formula.ast, "my_table", "result"))
-        except KeyboardInterrupt:
-            exit(0)
-
-if __name__ == "__main__":
+from parse import *
+from lexer import lex
+from formula import Formula
+from transpiler import Transpiler
+from optimize import Optimizer
+from batch import read_formulas, report, run_batch
+from diskcache import build_cache
+from service import serve
+from instrument import CumulativeStats
+import sys
+from contextlib import nullcontext
+
+def main():
+    args = sys.argv
+    do_transpile = args.count("-t") > 0
+    do_filter = args.count("--filter") > 0
+    do_print_parse = args.count("--ast") > 0
+    do_print_tokens = args.count("--tokens") > 0
+    do_use_file = args.count("-f") > 0
+    optimizer = Optimizer() if args.count("-O") > 0 else None
+    f = None if not do_use_file else args[args.index("-f") + 1]
+    dialect = args[args.index("--dialect") + 1] if args.count("--dialect") > 0 else None
+    transpiler = Transpiler(dialect=dialect)
+    if args.count("--serve") > 0:
+        # Resident JSON-RPC service on stdin/stdout, or on a Unix socket
+        serve(socket_path=args[args.index("--socket") + 1] if args.count("--socket") > 0 else None,
+              workers=int(args[args.index("-j") + 1]) if args.count("-j") > 0 else None,
+              cache_path=args[args.index("--cache") + 1] if args.count("--cache") > 0 else None)
+        return
+    if args.count("--batch") > 0:
+        # Batch mode: many formulas, one per line (or JSONL), in parallel
+        path = args[args.index("--batch") + 1]
+        workers = int(args[args.index("-j") + 1]) if args.count("-j") > 0 else None
+        chunk_size = int(args[args.index("--chunk") + 1]) if args.count("--chunk") > 0 else 500
+        jsonl = args.count("--jsonl") > 0 or path.endswith(".jsonl")
+        # Standard streams are used as they are, and left open
+        inp = nullcontext(sys.stdin) if path == "-" else open(path, "r")
+        if args.count("--build-cache") > 0:
+            # Precompile the input into a cache file for later batch runs; lines
+            # that could not be read have nothing to cache
+            with inp as lines:
+                codes = (code for _, _, code, _ in read_formulas(lines, jsonl) if code is not None)
+                stored, failed = build_cache(args[args.index("--build-cache") + 1], codes)
+            print(f"cached {stored} formulas ({failed} failed to parse)", file=sys.stderr)
+            return
+        out = open(args[args.index("-o") + 1], "w") if args.count("-o") > 0 else nullcontext(sys.stdout)
+        profile = CumulativeStats() if args.count("--profile") > 0 else None
+        cache_path = args[args.index("--cache") + 1] if args.count("--cache") > 0 else None
+        with inp as lines, out as results:
+            stats = run_batch(lines, results, jsonl=jsonl, workers=workers, chunk_size=chunk_size,
+                              ordered=args.count("--unordered") == 0, emit_sql=do_transpile, profile=profile,
+                              cache_path=cache_path, diagnose=args.count("--diagnose") > 0,
+                              dialect=dialect)
+        report(stats)
+        if profile is not None:
+            print(profile.report(), file=sys.stderr)
+        return
+    if do_use_file:
+        inp: str = open(f, "r").read()
+        formula = Formula(inp, print_ast=do_print_parse, print_tokens=do_print_tokens, optimizer=optimizer)
+        if do_transpile:
+            # Large files: write the SQL straight out instead of building it in memory
+            if do_filter:
+                transpiler.transpile_filter(formula.ast, "my_table", sys.stdout)
+            else:
+                transpiler.transpile(formula.ast, "my_table", "result", sys.stdout)
+            print()
+        if optimizer is not None:
+            print(f"optimizer rules fired: {optimizer.counts}", file=sys.stderr)
+        return
+    while True:
+        try:
+            code = input(">> ")
+            formula = Formula(code, print_ast=do_print_parse, print_tokens=do_print_tokens, optimizer=optimizer)
+            if do_transpile and do_filter: print(transpiler.transpile_filter(formula.ast, "my_table"))
+            elif do_transpile: print(transpiler.transpile(formula.ast, "my_table", "result"))
+        except KeyboardInterrupt:
+            exit(0)
+
+if __name__ == "__main__":
     main()
\ No newline at end of file
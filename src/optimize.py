@@ -0,0 +1,244 @@
+from typing import Any, Callable, Dict, List, Mapping, Optional, Set, Tuple, Union
+
+from lexer import TokenType
+from parse import ASTNode, BinOp, UnOp, Number, String, FunctionCall
+from simplify import simplify_binop, simplify_unop
+from evaluator import to_text, truthy
+from functions import library
+from typecheck import NUMBER, TypeChecker, ValueType
+
+rules = (
+    "fold_operator",
+    "if_constant",
+    "logic_constant",
+    "fold_function",
+    "flatten_concat",
+    "merge_text",
+    "identity",
+)
+
+
+# Function to a test of literal arguments for which its in-process
+# implementation differs from the SQL a dialect emits, so the call is left to
+# the database: negative ROUND precisions (SQLite reads them as 0), TRIM of
+# whitespace other than spaces, UPPER/LOWER of non-ASCII text (SQLite only
+# changes ASCII letters), SUBSTITUTE with a blank argument (REPLACE gives
+# NULL) and FIND of empty text
+unfoldable: Dict[str, Callable[..., bool]] = {
+    "ROUND": lambda value, precision=0: precision is not None and int(precision) < 0,
+    "TRIM": lambda text: any(char.isspace() and char != " " for char in to_text(text)),
+    "UPPER": lambda text: not to_text(text).isascii(),
+    "LOWER": lambda text: not to_text(text).isascii(),
+    "SUBSTITUTE": lambda *args: None in args,
+    "FIND": lambda needle, *rest: to_text(needle) == "",
+}
+
+
+def is_literal(node: ASTNode) -> bool:
+    return isinstance(node, (Number, String))
+
+def to_literal(value: Any) -> Optional[ASTNode]:
+    """The literal node for an evaluated value, or None if it has none"""
+    if value is None or isinstance(value, bool):
+        return Number(value)
+    if isinstance(value, (int, float)):
+        return Number(float(value))
+    if isinstance(value, str) and not any(char in value for char in "\"'\\"):
+        # String values are emitted unescaped, so keep quotes out of them
+        return String(value)
+    return None
+
+def is_join(node: ASTNode) -> bool:
+    """Whether `node` joins text: `&` or CONCATENATE"""
+    return isinstance(node, BinOp) and node.op == TokenType.AMPERSAND or \
+        isinstance(node, FunctionCall) and node.name == "CONCATENATE"
+
+def is_number(node: ASTNode, value: float) -> bool:
+    return isinstance(node, Number) and isinstance(node.value, float) and node.value == value
+
+
+class Optimizer:
+    """Rewrites a whole AST into a cheaper equivalent
+
+    Rules are applied bottom-up, so every node is rewritten after its
+    children; a rewritten node is revisited until no rule applies. The
+    number of times each rule fired is kept in `counts`, summed over every
+    tree the optimizer has seen.
+
+    The identity rules (`x + 0`, `x * 1`, ...) apply only when `typecheck`
+    shows the other operand is a number: for text, booleans or a field of
+    unknown type the arithmetic converts the value, and dropping it would
+    change the result.
+
+    Args:
+        schema (Mapping[str, ValueType | str] | None): The type of each field
+    """
+    def __init__(self, schema: Optional[Mapping[str, Union[ValueType, str]]] = None) -> None:
+        self.counts: Dict[str, int] = dict.fromkeys(rules, 0)
+        self.schema = dict(schema or {})
+        self.types = TypeChecker(self.schema)
+        # Whether the node being rewritten is part of a larger join
+        self.in_chain = False
+
+    def optimize(self, root: ASTNode) -> ASTNode:
+        """Return the optimized form of `root`"""
+        # Types are only needed while this tree is rewritten
+        self.types = TypeChecker(self.schema)
+        done: Dict[int, ASTNode] = {}
+        # Joins nested in another join; a chain is flattened once, at its top,
+        # rather than again at every level
+        inner: Set[int] = set()
+        stack: List[Tuple[ASTNode, bool]] = [(root, False)]
+        while stack:
+            node, visited = stack.pop()
+            if id(node) in done:
+                continue
+            if visited:
+                children = node.children()
+                rewritten = [done[id(child)] for child in children]
+                if any(new is not old for new, old in zip(rewritten, children)):
+                    node_out = node.with_children(rewritten)
+                else:
+                    node_out = node
+                self.in_chain = id(node) in inner
+                done[id(node)] = self.rewrite(node_out)
+            else:
+                stack.append((node, True))
+                stack.extend((child, False) for child in node.children())
+                if is_join(node):
+                    inner.update(id(child) for child in node.children() if is_join(child))
+        self.in_chain = False
+        return done[id(root)]
+
+    def fired(self, rule: str) -> None:
+        self.counts[rule] += 1
+
+    def rewrite(self, node: ASTNode) -> ASTNode:
+        """Apply rules to a node whose children are already optimized"""
+        while True:
+            result = self.rewrite_once(node)
+            if result is node:
+                return node
+            node = result
+
+    def rewrite_once(self, node: ASTNode) -> ASTNode:
+        if isinstance(node, BinOp):
+            return self.rewrite_binop(node)
+        elif isinstance(node, UnOp):
+            result = simplify_unop(node)
+            if result is not node:
+                self.fired("fold_operator")
+            return result
+        elif isinstance(node, FunctionCall):
+            return self.rewrite_function_call(node)
+        return node
+
+    def rewrite_binop(self, node: BinOp) -> ASTNode:
+        result = simplify_binop(node)
+        if result is not node:
+            self.fired("fold_operator")
+            return result
+
+        left, op, right = node.left, node.op, node.right
+        if op == TokenType.AMPERSAND:
+            if not self.in_chain and any(isinstance(side, FunctionCall) and side.name == "CONCATENATE"
+                   or isinstance(side, BinOp) and side.op == TokenType.AMPERSAND for side in (left, right)):
+                self.fired("flatten_concat")
+                return FunctionCall("CONCATENATE", self.concat_operands((left, right)))
+        elif (op in (TokenType.PLUS, TokenType.MINUS) and is_number(right, 0)
+              or op in (TokenType.MUL, TokenType.DIV) and is_number(right, 1)) and self.is_number(left):
+            self.fired("identity")
+            return left
+        elif (op == TokenType.PLUS and is_number(left, 0)
+              or op == TokenType.MUL and is_number(left, 1)) and self.is_number(right):
+            self.fired("identity")
+            return right
+        return node
+
+    def is_number(self, node: ASTNode) -> bool:
+        return self.types.infer(node) is NUMBER
+
+    def concat_operands(self, operands: Tuple[ASTNode, ...]) -> List[ASTNode]:
+        """Flatten nested `&` and CONCATENATE operands, left to right"""
+        flat: List[ASTNode] = []
+        stack = list(reversed(operands))
+        while stack:
+            node = stack.pop()
+            if isinstance(node, BinOp) and node.op == TokenType.AMPERSAND:
+                stack.extend((node.right, node.left))
+            elif isinstance(node, FunctionCall) and node.name == "CONCATENATE":
+                stack.extend(reversed(node.args))
+            else:
+                flat.append(node)
+        return flat
+
+    def rewrite_function_call(self, node: FunctionCall) -> ASTNode:
+        name, args = node.name, node.args
+        if name == "IF" and len(args) in (2, 3) and is_literal(args[0]):
+            self.fired("if_constant")
+            if truthy(args[0].value):
+                return args[1]
+            return args[2] if len(args) == 3 else Number(None)
+
+        if name in ("AND", "OR") and args and any(is_literal(arg) for arg in args):
+            # A false literal decides AND, a true one decides OR; the others
+            # cannot change the result and are dropped
+            deciding = name == "OR"
+            if any(is_literal(arg) and truthy(arg.value) == deciding for arg in args):
+                self.fired("logic_constant")
+                return Number(deciding)
+            remaining = [arg for arg in args if not is_literal(arg)]
+            self.fired("logic_constant")
+            return FunctionCall(name, remaining) if remaining else Number(not deciding)
+
+        if name == "CONCATENATE":
+            if not self.in_chain and any(isinstance(arg, BinOp) and arg.op == TokenType.AMPERSAND
+                   or isinstance(arg, FunctionCall) and arg.name == "CONCATENATE" for arg in args):
+                self.fired("flatten_concat")
+                return FunctionCall(name, self.concat_operands(args))
+            merged = self.merge_text(args)
+            if merged is not None:
+                self.fired("merge_text")
+                return FunctionCall(name, merged)
+
+        definition = library.get(name)
+        if definition is not None and definition.pure and definition.evaluate is not None \
+                and all(is_literal(arg) for arg in args):
+            if any(isinstance(arg, String) and "\\" in arg.value for arg in args):
+                # Escapes are kept verbatim in string literals; leave them to the database
+                return node
+            values = [arg.value for arg in args]
+            try:
+                if name in unfoldable and unfoldable[name](*values):
+                    return node
+                literal = to_literal(definition.evaluate(*values))
+            except Exception:
+                # Invalid at run time too, e.g. a wrong argument count; keep it
+                return node
+            if literal is not None:
+                self.fired("fold_function")
+                return literal
+        return node
+
+    def merge_text(self, args: Tuple[ASTNode, ...]) -> Optional[List[ASTNode]]:
+        """Join runs of adjacent literal arguments and drop empty text, or
+        None if there is nothing to merge"""
+        merged: List[ASTNode] = []
+        changed = False
+        for arg in args:
+            if isinstance(arg, String) and arg.value == "" and len(args) > 1:
+                changed = True
+                continue
+            if merged and is_literal(arg) and is_literal(merged[-1]):
+                text = to_literal(to_text(merged[-1].value) + to_text(arg.value))
+                if text is not None:
+                    merged[-1] = text
+                    changed = True
+                    continue
+            merged.append(arg)
+        return merged if changed else None
+
+
+def optimize(node: ASTNode) -> ASTNode:
+    """Optimize an AST with a fresh `Optimizer`"""
+    return Optimizer().optimize(node)
@@ -1,24 +1,87 @@
-from lexer import Token, TokenType
-from typing import List, Union, Optional
+from abc import ABC, abstractmethod
+from bisect import bisect_left, bisect_right
+from lexer import EOF_TOKEN, Token, TokenStream, TokenType
+from typing import Any, Dict, Iterable, Iterator, List, NamedTuple, Optional, Sequence, Tuple, Union
 class ASTNode:
+    """Base class of the immutable AST node family
+
+    Nodes compare and hash structurally. The hash is computed once, from the
+    children's hashes, when a node is built; equality checks identity and hash
+    before comparing fields, so equal interned subtrees compare in O(1).
+    """
+    __slots__ = ("_hash",)
+
     def __init__(self) -> None:
-        pass
+        object.__setattr__(self, "_hash", hash(type(self)))
     def output(self, indent: int = 0) -> None:
         pass
+    def children(self) -> Tuple["ASTNode", ...]:
+        return ()
+    def attributes(self) -> tuple:
+        """The node's non-child fields"""
+        return ()
+    def with_children(self, children: Sequence["ASTNode"]) -> "ASTNode":
+        """A copy of this node with its children replaced"""
+        return self
     def __repr__(self) -> str:
         return "Node()"
     def __str__(self) -> str:
         return self.__repr__()
+    def __setattr__(self, name: str, value: Any) -> None:
+        raise AttributeError(f"{type(self).__name__} nodes are immutable")
+    def __delattr__(self, name: str) -> None:
+        raise AttributeError(f"{type(self).__name__} nodes are immutable")
+    def __hash__(self) -> int:
+        return self._hash
+    def __eq__(self, other: object) -> bool:
+        if self is other:
+            return True
+        if not isinstance(other, ASTNode):
+            return NotImplemented
+        # Compare iteratively so deep trees cannot exhaust the call stack
+        stack: List[Tuple[ASTNode, ASTNode]] = [(self, other)]
+        while stack:
+            a, b = stack.pop()
+            if a is b:
+                continue
+            if type(a) is not type(b) or a._hash != b._hash or a.attributes() != b.attributes():
+                return False
+            a_children, b_children = a.children(), b.children()
+            if len(a_children) != len(b_children):
+                return False
+            stack.extend(zip(a_children, b_children))
+        return True
+    def __ne__(self, other: object) -> bool:
+        equal = self.__eq__(other)
+        return equal if equal is NotImplemented else not equal
     
 
+def make_hash(node: ASTNode, attributes: tuple, children: Tuple[ASTNode, ...]) -> None:
+    object.__setattr__(node, "_hash", hash((type(node).__name__, attributes, tuple(child._hash for child in children))))
+
 class BinOp(ASTNode):
+    __slots__ = ("left", "op", "right")
+
     def __init__(self, left: ASTNode, op: TokenType, right: ASTNode) -> None:
-        self.left = left
-        self.op = op
-        self.right = right
+        object.__setattr__(self, "left", left)
+        object.__setattr__(self, "op", op)
+        object.__setattr__(self, "right", right)
+        make_hash(self, (op,), (left, right))
 
     def __repr__(self) -> str:
         return f'BinOp({self.left} {self.op} {self.right})'
+
+    def __reduce__(self) -> tuple:
+        return (BinOp, (self.left, self.op, self.right))
+
+    def children(self) -> Tuple[ASTNode, ...]:
+        return (self.left, self.right)
+
+    def attributes(self) -> tuple:
+        return (self.op,)
+
+    def with_children(self, children: Sequence[ASTNode]) -> ASTNode:
+        return BinOp(children[0], self.op, children[1])
     
     def output(self, indent: int = 0) -> None:
         print(' ' * indent + f'BinOp({self.op}')
@@ -27,12 +90,27 @@ class BinOp(ASTNode):
         print(' ' * indent + ')')
 
 class UnOp(ASTNode):
+    __slots__ = ("op", "right")
+
     def __init__(self, op: TokenType, right: ASTNode) -> None:
-        self.op = op
-        self.right = right
+        object.__setattr__(self, "op", op)
+        object.__setattr__(self, "right", right)
+        make_hash(self, (op,), (right,))
 
     def __repr__(self) -> str:
         return f'UnOp({self.op} {self.right})'
+
+    def __reduce__(self) -> tuple:
+        return (UnOp, (self.op, self.right))
+
+    def children(self) -> Tuple[ASTNode, ...]:
+        return (self.right,)
+
+    def attributes(self) -> tuple:
+        return (self.op,)
+
+    def with_children(self, children: Sequence[ASTNode]) -> ASTNode:
+        return UnOp(self.op, children[0])
     
     def output(self, indent: int = 0) -> None:
         print(' ' * indent + f'UnOp({self.op}')
@@ -40,42 +118,86 @@ class UnOp(ASTNode):
         print(' ' * indent + ')')
 
 class Number(ASTNode):
+    __slots__ = ("value",)
+
     def __init__(self, value: Optional[float]) -> None:
-        self.value = value
+        object.__setattr__(self, "value", value)
+        make_hash(self, (type(value), value), ())
 
     def __repr__(self) -> str:
         return f"Number({self.value})"
+
+    def __reduce__(self) -> tuple:
+        return (Number, (self.value,))
+
+    def attributes(self) -> tuple:
+        # Keep Number(True) and Number(1.0) distinct
+        return (type(self.value), self.value)
     
     def output(self, indent: int = 0) -> None:
         print(' ' * indent + f"Number({self.value})")
 
 class String(ASTNode):
+    __slots__ = ("value",)
+
     def __init__(self, value: str) -> None:
-        self.value = value
+        object.__setattr__(self, "value", value)
+        make_hash(self, (value,), ())
 
     def __repr__(self) -> str:
         return f'String("{self.value}")'
+
+    def __reduce__(self) -> tuple:
+        return (String, (self.value,))
+
+    def attributes(self) -> tuple:
+        return (self.value,)
     
     def output(self, indent: int = 0) -> None:
         print(' ' * indent + f'String("{self.value}")')
 
 class Variable(ASTNode):
+    __slots__ = ("name",)
+
     def __init__(self, name: str) -> None:
-        self.name = name
+        object.__setattr__(self, "name", name)
+        make_hash(self, (name,), ())
 
     def __repr__(self) -> str:
         return f'Variable("{self.name}")'
+
+    def __reduce__(self) -> tuple:
+        return (Variable, (self.name,))
+
+    def attributes(self) -> tuple:
+        return (self.name,)
     
     def output(self, indent: int = 0) -> None:
         print(' ' * indent + f'Variable("{self.name}")')
 
 class FunctionCall(ASTNode):
-    def __init__(self, name: str, args: List[ASTNode]) -> None:
-        self.name = name
-        self.args = args
+    __slots__ = ("name", "args")
+
+    def __init__(self, name: str, args: Sequence[ASTNode]) -> None:
+        args = tuple(args)
+        object.__setattr__(self, "name", name)
+        object.__setattr__(self, "args", args)
+        make_hash(self, (name,), args)
 
     def __repr__(self) -> str:
-        return f'FunctionCall("{self.name}", {self.args})'
+        return f'FunctionCall("{self.name}", {list(self.args)})'
+
+    def __reduce__(self) -> tuple:
+        return (FunctionCall, (self.name, self.args))
+
+    def children(self) -> Tuple[ASTNode, ...]:
+        return self.args
+
+    def attributes(self) -> tuple:
+        return (self.name,)
+
+    def with_children(self, children: Sequence[ASTNode]) -> ASTNode:
+        return FunctionCall(self.name, children)
     
     def output(self, indent: int = 0) -> None:
         print(' ' * indent + f'FunctionCall("{self.name}"')
@@ -84,11 +206,24 @@ class FunctionCall(ASTNode):
         print(' ' * indent + ')')
 
 class Array(ASTNode):
-    def __init__(self, elements: List[ASTNode]) -> None:
-        self.elements = elements
+    __slots__ = ("elements",)
+
+    def __init__(self, elements: Sequence[ASTNode]) -> None:
+        elements = tuple(elements)
+        object.__setattr__(self, "elements", elements)
+        make_hash(self, (), elements)
 
     def __repr__(self) -> str:
-        return f'Array({self.elements})'
+        return f'Array({list(self.elements)})'
+
+    def __reduce__(self) -> tuple:
+        return (Array, (self.elements,))
+
+    def children(self) -> Tuple[ASTNode, ...]:
+        return self.elements
+
+    def with_children(self, children: Sequence[ASTNode]) -> ASTNode:
+        return Array(children)
     
     def output(self, indent: int = 0) -> None:
         print(' ' * indent + 'Array(')
@@ -96,147 +231,434 @@ class Array(ASTNode):
             element.output(indent + 4)
         print(' ' * indent + ')')
 
-from simplify import simplify_binop, simplify_unop
+class NodeTable:
+    """An interning (hash-consing) table for AST nodes
 
-class Parser:
+    Every structurally distinct subtree passed through the table is stored
+    once, and later equal subtrees are replaced by that shared instance, so
+    interned trees can be compared with `is`. One table can be shared by
+    any number of formulas; it keeps its nodes alive until `clear` is called.
+    """
     def __init__(self) -> None:
-        self.tokens: List[Token] = []
-        self.pos: int = 0
+        self.nodes: Dict[ASTNode, ASTNode] = {}
+
+    def __len__(self) -> int:
+        return len(self.nodes)
+
+    def intern(self, node: ASTNode) -> ASTNode:
+        """Intern a single node whose children are already interned"""
+        return self.nodes.setdefault(node, node)
+
+    def intern_tree(self, root: ASTNode) -> ASTNode:
+        """Intern every subtree of `root`, bottom-up, and return the shared root"""
+        nodes = self.nodes
+        interned: Dict[int, ASTNode] = {}
+        stack: List[Tuple[ASTNode, bool]] = [(root, False)]
+        while stack:
+            node, visited = stack.pop()
+            if id(node) in interned:
+                continue
+            if nodes.get(node) is node:
+                # Already canonical, and so are all of its descendants
+                interned[id(node)] = node
+            elif visited:
+                children = node.children()
+                shared = [interned[id(child)] for child in children]
+                rebuilt = node
+                if any(new is not old for new, old in zip(shared, children)):
+                    rebuilt = node.with_children(shared)
+                interned[id(node)] = nodes.setdefault(rebuilt, rebuilt)
+            else:
+                stack.append((node, True))
+                stack.extend((child, False) for child in node.children())
+        return interned[id(root)]
+
+    def clear(self) -> None:
+        self.nodes.clear()
+
+def walk(node: ASTNode) -> Iterator[ASTNode]:
+    """Yield `node` and all of its descendants in pre-order"""
+    stack = [node]
+    while stack:
+        node = stack.pop()
+        yield node
+        stack.extend(reversed(node.children()))
+
+def count_nodes(node: ASTNode) -> int:
+    return sum(1 for _ in walk(node))
+
+from simplify import simplify_binop, simplify_unop
+
+# Token index of a bracketed primary (call, array or parentheses) to its node,
+# its length in tokens, and for a call or array the offset of each item from
+# its start. Offsets are relative so that entries move with a plain re-key.
+Memo = Dict[int, Tuple[ASTNode, int, Optional[Tuple[int, ...]]]]
 
-    def current_token(self) -> Token:
-        return self.tokens[self.pos] if self.pos < len(self.tokens) else Token(TokenType.EOF, None)
+class EditedPrimary(NamedTuple):
+    """A call or array from an earlier parse whose brackets survived an edit
+    made between them, so its items outside the edit can be reused
+
+    Attributes:
+        node (ASTNode): The call or array as previously parsed
+        length (int): Its length in tokens after the edit
+        offsets (tuple[int, ...]): Where each item started, relative to its start
+        edit_start (int): Where the edited tokens start, relative to its start
+        edit_end (int): Where the tokens after the edit started before it,
+            relative to its start
+        shift (int): How far the tokens after the edit moved
+    """
+    node: ASTNode
+    length: int
+    offsets: Tuple[int, ...]
+    edit_start: int
+    edit_end: int
+    shift: int
+
+class Cursor(ABC):
+    """A position in a token sequence; each parse gets its own cursor
+
+    Subclasses keep the index of the current token in `pos`.
+    """
+    pos: int
+    # Read and filled by the parser when set; see `incremental`
+    memo: Optional[Memo] = None
+    # Token index to a partly reusable call or array, read by the parser
+    edited: Optional[Dict[int, EditedPrimary]] = None
+
+    @abstractmethod
+    def token(self) -> Token:
+        """The current token"""
+
+    @abstractmethod
+    def kind(self) -> TokenType:
+        """The current token's type"""
+
+    @abstractmethod
+    def value(self) -> str|None:
+        """The current token's text"""
+
+    @abstractmethod
+    def peek(self) -> TokenType:
+        """The next token's type"""
+
+    @abstractmethod
+    def advance(self) -> None:
+        """Move to the next token"""
 
     def eat(self, token_type: TokenType) -> None:
-        if self.current_token().kind == token_type:
-            self.pos += 1
+        if self.kind() == token_type:
+            self.advance()
         else:
-            raise Exception(f"Unexpected token {self.current_token().kind}, expected {token_type}")
+            raise Exception(f"Unexpected token {self.kind()}, expected {token_type}")
+
+class TokenCursor(Cursor):
+    """Pulls `Token` objects from an iterator on demand, with a small lookahead buffer"""
+    def __init__(self, tokens: Iterable[Token]) -> None:
+        self.tokens: Iterator[Token] = iter(tokens)
+        self.lookahead: List[Token] = []
+        self.pos: int = 0
+
+    def fill(self, count: int) -> None:
+        # Past the end of the stream, the shared EOF token is buffered
+        while len(self.lookahead) < count:
+            self.lookahead.append(next(self.tokens, EOF_TOKEN))
+
+    def token(self) -> Token:
+        if not self.lookahead:
+            self.fill(1)
+        return self.lookahead[0]
+
+    def kind(self) -> TokenType:
+        return self.token().kind
+
+    def value(self) -> str|None:
+        return self.token().value
+
+    def peek(self) -> TokenType:
+        self.fill(2)
+        return self.lookahead[1].kind
+
+    def advance(self) -> None:
+        del self.lookahead[0]
+        self.pos += 1
+
+class StreamCursor(Cursor):
+    """Walks a `TokenStream` by index; token text is sliced only when `value` is called"""
+    def __init__(self, stream: TokenStream) -> None:
+        self.stream = stream
+        self.pos: int = 0
+
+    def token(self) -> Token:
+        return self.stream.token(self.pos)
+
+    def kind(self) -> TokenType:
+        return self.stream.kind(self.pos)
+
+    def value(self) -> str|None:
+        return self.stream.value(self.pos)
 
-    def parse(self, tokens: List[Token]) -> Optional[ASTNode]:
-        self.tokens = tokens
-        self.pos = 0
-        if not self.tokens:
+    def peek(self) -> TokenType:
+        return self.stream.kind(self.pos + 1)
+
+    def advance(self) -> None:
+        self.pos += 1
+
+# Binding strength of each binary operator; anything else ends an expression
+precedences: Dict[TokenType, int] = {
+    TokenType.PLUS: 10,
+    TokenType.AMPERSAND: 10,
+    TokenType.MINUS: 10,
+    TokenType.MUL: 20,
+    TokenType.DIV: 20,
+    TokenType.AND: 5,
+    TokenType.OR: 5,
+    TokenType.EQ: 7,
+    TokenType.NE: 7,
+    TokenType.LT: 7,
+    TokenType.GT: 7,
+    TokenType.LE: 7,
+    TokenType.GE: 7,
+}
+
+# Kinds of pending work on the parser stack. Each frame is a list whose first
+# item is its kind; `start` is the token index where a bracketed primary began:
+#   [EXPR, precedence, left, op]  an operator-precedence loop; `left`/`op` are
+#                                 set while its right operand is being parsed
+#   [CALL, start, name, args, offsets, edited]
+#                                 a function call collecting its arguments;
+#                                 `offsets` and `edited` are only used with a memo
+#   [ARRAY, start, None, elements, offsets, edited]
+#                                 an array literal collecting its elements
+#   [PAREN, start]                a parenthesised expression awaiting `)`
+#   [NEG]                         a unary minus awaiting its operand
+EXPR, CALL, ARRAY, PAREN, NEG = range(5)
+
+# Tokens that can open a bracketed primary, which a cursor memo may hold
+bracket_kinds = (TokenType.ID, TokenType.LPAREN, TokenType.LBRACK)
+
+
+class Parser:
+    """Operator-precedence formula parser
+
+    A Parser holds no state between calls: each `parse` threads its own
+    cursor through the grammar methods, so one instance can be shared by
+    any number of threads. Nesting is tracked on an explicit stack rather
+    than the Python call stack, so the depth of a formula is bounded only
+    by memory.
+    """
+    def parse(self, tokens: Union[Iterable[Token], TokenStream], memo: Optional[Memo] = None,
+              edited: Optional[Dict[int, EditedPrimary]] = None) -> Optional[ASTNode]:
+        """Parse tokens into an AST
+
+        `tokens` is either a compact `lexer.TokenStream`, which is read in place,
+        or any iterable of `Token`s. Iterables are pulled only as the parser
+        needs them, so a generator such as `lexer.tokenize(code)` is lexed and
+        parsed in a single pass.
+
+        If `memo` is given (with a `TokenStream`), bracketed primaries found
+        in it are reused instead of parsed, and every bracketed primary parsed
+        is added to it. The calls and arrays in `edited` are parsed again
+        only from their first item touching the edit to the first item
+        after it.
+        """
+        if isinstance(tokens, TokenStream):
+            cursor: Cursor = StreamCursor(tokens)
+            cursor.memo = memo
+            cursor.edited = edited if memo is not None else None
+        else:
+            cursor = TokenCursor(tokens)
+        if cursor.kind() == TokenType.EOF:
             return None
         
-        ret = self.expression()
+        ret = self.expression(cursor)
         
-        if (token := self.current_token().kind) != TokenType.EOF:
+        if (token := cursor.kind()) != TokenType.EOF:
             raise Exception(f"parser didn't consume all tokens, found {token}")
         
         return ret
 
-    def expression(self, precedence: int = 0) -> ASTNode:
-        left = self.primary()
+    def expression(self, cursor: Cursor, precedence: int = 0) -> ASTNode:
+        stack: List[List[Any]] = [[EXPR, precedence, None, None]]
         while True:
-            token = self.current_token()
-            token_precedence = self.get_precedence(token.kind)
-
-            if token_precedence <= precedence:
-                break
+            node = self.primary(cursor, stack)
+            if node is None:
+                # A bracket or unary minus was opened; read its first operand
+                continue
 
-            op = token.kind
-            self.eat(op)
-            right = self.expression(token_precedence)
-            left = BinOp(left, op, right)
-            left = simplify_binop(left)
+            # Hand the finished node to the innermost pending frame, closing
+            # frames until one of them needs another operand
+            while True:
+                frame = stack[-1]
+                kind = frame[0]
+                if kind == EXPR:
+                    if frame[2] is not None:
+                        node = simplify_binop(BinOp(frame[2], frame[3], node))
+                    op = cursor.kind()
+                    token_precedence = precedences.get(op, 0)
+                    if token_precedence > frame[1]:
+                        cursor.advance()
+                        frame[2], frame[3] = node, op
+                        stack.append([EXPR, token_precedence, None, None])
+                        break
+                    stack.pop()
+                    if not stack:
+                        return node
+                elif kind == CALL or kind == ARRAY:
+                    items = frame[3]
+                    items.append(node)
+                    if cursor.kind() == TokenType.COMMA:
+                        cursor.eat(TokenType.COMMA)
+                    if frame[5] is not None:
+                        self.rejoin_items(cursor, frame)
+                    closing = TokenType.RPAREN if kind == CALL else TokenType.RBRACK
+                    if cursor.kind() != closing:
+                        if frame[4] is not None:
+                            frame[4].append(cursor.pos - frame[1])
+                        stack.append([EXPR, 0, None, None])
+                        break
+                    cursor.eat(closing)
+                    stack.pop()
+                    node = FunctionCall(frame[2], items) if kind == CALL else Array(items)
+                    if cursor.memo is not None:
+                        cursor.memo[frame[1]] = (node, cursor.pos - frame[1], tuple(frame[4]))
+                elif kind == PAREN:
+                    cursor.eat(TokenType.RPAREN)
+                    stack.pop()
+                    if cursor.memo is not None:
+                        cursor.memo[frame[1]] = (node, cursor.pos - frame[1], None)
+                elif kind == NEG:
+                    stack.pop()
+                    node = simplify_unop(UnOp(TokenType.MINUS, node))
 
-        return left
+    def primary(self, cursor: Cursor, stack: List[List[Any]]) -> Optional[ASTNode]:
+        """Parse one primary, or open the frame for a bracketed one
 
-    def primary(self) -> ASTNode:
-        token = self.current_token()
+        Returns the node for a complete primary. For a call, array,
+        parenthesised expression or unary minus, pushes its frame onto
+        `stack` (followed by a frame for its first operand) and returns None.
+        """
+        kind = cursor.kind()
+        start = cursor.pos
+        if cursor.memo is not None and kind in bracket_kinds:
+            reused = cursor.memo.get(start)
+            if reused is not None:
+                cursor.pos = start + reused[1]
+                return reused[0]
 
-        if token.kind == TokenType.NUMBER:
-            self.eat(TokenType.NUMBER)
-            if token.value is not None:
-                return Number(float(token.value))
+        if kind == TokenType.NUMBER:
+            value = cursor.value()
+            cursor.eat(TokenType.NUMBER)
+            if value is not None:
+                return Number(float(value))
             else:
                 raise ValueError("Token value is None and cannot be converted to float")
 
-        elif token.kind == TokenType.ID:
+        elif kind == TokenType.ID:
             # Check if it's a function call
-            if self.peek() == TokenType.LPAREN:
-                func_name = token.value
-                self.eat(TokenType.ID)
-                self.eat(TokenType.LPAREN)
-                args = []
-                while self.current_token().kind != TokenType.RPAREN:
-                    args.append(self.expression())
-                    if self.current_token().kind == TokenType.COMMA:
-                        self.eat(TokenType.COMMA)
-                self.eat(TokenType.RPAREN)
-                if func_name is not None:
-                    return FunctionCall(func_name, args)
-                else:
+            if cursor.peek() == TokenType.LPAREN:
+                func_name = cursor.value()
+                cursor.eat(TokenType.ID)
+                cursor.eat(TokenType.LPAREN)
+                if func_name is None:
                     raise ValueError("Function name is None")
+                # Function names are case-insensitive; calls carry them upper-cased
+                func_name = func_name.upper()
+                if cursor.kind() == TokenType.RPAREN:
+                    cursor.eat(TokenType.RPAREN)
+                    return FunctionCall(func_name, [])
+                frame = [CALL, start, func_name, [], None, None]
+                if cursor.memo is not None:
+                    self.open_items(cursor, frame)
+                stack.append(frame)
+                stack.append([EXPR, 0, None, None])
+                return None
             else:
                 # Just a variable
-                var_name = token.value
-                self.eat(TokenType.ID)
+                var_name = cursor.value()
+                cursor.eat(TokenType.ID)
                 if var_name is not None:
                     return Variable(var_name)
                 else:
                     raise ValueError("Variable name is None")
-        elif token.kind == TokenType.STRING:
-            self.eat(TokenType.STRING)
-            if token.value is not None:
-                return String(token.value[1:-1])
+        elif kind == TokenType.STRING:
+            value = cursor.value()
+            cursor.eat(TokenType.STRING)
+            if value is not None:
+                return String(value[1:-1])
             else:
                 raise ValueError("Token value is None and cannot be converted to string")
         
-        elif token.kind == TokenType.NULL:
-            self.eat(TokenType.NULL)
+        elif kind == TokenType.NULL:
+            cursor.eat(TokenType.NULL)
             return Number(None)
 
-        elif token.kind == TokenType.LPAREN:
-            self.eat(TokenType.LPAREN)
-            node = self.expression()
-            self.eat(TokenType.RPAREN)
-            return node
-
-        elif token.kind == TokenType.MINUS:
-            self.eat(TokenType.MINUS)
-            unop = UnOp(TokenType.MINUS, self.primary())
-            unop = simplify_unop(unop)
-            return unop
-
-        elif token.kind == TokenType.LBRACK:
-            self.eat(TokenType.LBRACK)
-            e = []
-            while self.current_token().kind != TokenType.RBRACK:
-                e.append(self.expression())
-                if self.current_token().kind == TokenType.COMMA:
-                    self.eat(TokenType.COMMA)
-            self.eat(TokenType.RBRACK)
-            return Array(e)
+        elif kind == TokenType.LPAREN:
+            cursor.eat(TokenType.LPAREN)
+            stack.append([PAREN, start])
+            stack.append([EXPR, 0, None, None])
+            return None
+
+        elif kind == TokenType.MINUS:
+            cursor.eat(TokenType.MINUS)
+            stack.append([NEG])
+            return None
+
+        elif kind == TokenType.LBRACK:
+            cursor.eat(TokenType.LBRACK)
+            if cursor.kind() == TokenType.RBRACK:
+                cursor.eat(TokenType.RBRACK)
+                return Array([])
+            frame = [ARRAY, start, None, [], None, None]
+            if cursor.memo is not None:
+                self.open_items(cursor, frame)
+            stack.append(frame)
+            stack.append([EXPR, 0, None, None])
+            return None
     
-        elif token.kind == TokenType.VARIABLE_NAME:
-            name = token.value
-            self.eat(TokenType.VARIABLE_NAME)
+        elif kind == TokenType.VARIABLE_NAME:
+            name = cursor.value()
+            cursor.eat(TokenType.VARIABLE_NAME)
             if name is not None:
                 return Variable(name)
             else:
                 raise ValueError("Variable name is None")
         else:
-            raise Exception(f"Unexpected token {token.kind}")
+            raise Exception(f"Unexpected token {kind}")
 
-    def peek(self) -> TokenType:
-        return self.tokens[self.pos + 1].kind if self.pos + 1 < len(self.tokens) else TokenType.EOF
+    def open_items(self, cursor: Cursor, frame: List[Any]) -> None:
+        """Start recording item offsets for the memo; for an edited call or
+        array, take over its items before the edit and move past them"""
+        start = frame[1]
+        frame[4] = [cursor.pos - start]
+        edited = cursor.edited.get(start) if cursor.edited else None
+        if edited is None:
+            return
+        offsets = edited.offsets
+        # An item is kept if the next one starts before the edit, so that
+        # neither it nor its separator was touched
+        kept = max(bisect_right(offsets, edited.edit_start) - 1, 0)
+        frame[3].extend(edited.node.children()[:kept])
+        frame[4] = list(offsets[:kept + 1])
+        frame[5] = edited
+        cursor.pos = start + offsets[kept]
+
+    def rejoin_items(self, cursor: Cursor, frame: List[Any]) -> None:
+        """Take over the remaining items of an edited call or array once the
+        cursor is back at the start of one of its items after the edit"""
+        edited: EditedPrimary = frame[5]
+        start = frame[1]
+        old_offset = cursor.pos - start - edited.shift
+        if old_offset < edited.edit_end:
+            return
+        offsets = edited.offsets
+        index = bisect_left(offsets, old_offset)
+        if index < len(offsets) and offsets[index] == old_offset:
+            # The tokens from here to the closing bracket are unchanged, so
+            # they would parse to the same items
+            frame[3].extend(edited.node.children()[index:])
+            frame[4].extend(offset + edited.shift for offset in offsets[index:])
+            frame[5] = None
+            cursor.pos = start + edited.length - 1
 
     def get_precedence(self, token_type: TokenType) -> int:
-        precedences = {
-            TokenType.PLUS: 10,
-            TokenType.AMPERSAND: 10,
-            TokenType.MINUS: 10,
-            TokenType.MUL: 20,
-            TokenType.DIV: 20,
-            TokenType.AND: 5,
-            TokenType.OR: 5,
-            TokenType.EQ: 7,
-            TokenType.NE: 7,
-            TokenType.LT: 7,
-            TokenType.GT: 7,
-            TokenType.LE: 7,
-            TokenType.GE: 7,
-        }
         return precedences.get(token_type, 0)
-    
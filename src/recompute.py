@@ -0,0 +1,168 @@
+from collections import OrderedDict, deque
+from typing import Any, Dict, FrozenSet, Iterable, List, Mapping, MutableMapping, Set, Tuple
+
+from lexer import lex_spans
+from parse import ASTNode, Parser
+from evaluator import Compiled, compile_formula
+from deps import tree_dependencies
+
+
+class CycleError(Exception):
+    """Computed fields that refer to each other in a loop
+
+    Attributes:
+        cycle (list[str]): The fields around the loop, starting and ending
+            with the same field
+    """
+    def __init__(self, cycle: List[str]) -> None:
+        self.cycle = cycle
+        super().__init__("Circular reference: " + " -> ".join(cycle))
+
+
+class DependencyGraph:
+    """The computed fields of a table, in an order that respects their references
+
+    Every formula is parsed and compiled once. A computed field depends on
+    every field its formula refers to; computed fields are kept in a
+    topological order, so a field is always evaluated after the fields it
+    reads. When some fields of a record change, `recompute` evaluates only
+    the computed fields downstream of them, in that order, each reading the
+    new values of the ones before it.
+
+    Args:
+        formulas (Mapping[str, str]): Each computed field's formula source
+        plan_cache_size (int): How many distinct sets of changed fields keep
+            their recompute plan
+
+    Raises:
+        CycleError: When computed fields refer to each other in a loop
+        Exception: When a formula fails to parse, or uses an unknown function
+    """
+    def __init__(self, formulas: Mapping[str, str], plan_cache_size: int = 256) -> None:
+        parser = Parser()
+        self.asts: Dict[str, ASTNode] = {}
+        self.compiled: Dict[str, Compiled] = {}
+        self.inputs: Dict[str, FrozenSet[str]] = {}
+        for field, code in formulas.items():
+            try:
+                ast = parser.parse(lex_spans(code))
+            except Exception as e:
+                raise Exception(f"Field {field}: {e}")
+            if ast is None:
+                raise Exception(f"Field {field}: empty formula")
+            self.asts[field] = ast
+            self.compiled[field] = compile_formula(ast)
+            self.inputs[field] = tree_dependencies(ast).fields
+
+        # Field to the computed fields that read it
+        self.dependents: Dict[str, List[str]] = {}
+        for field, inputs in self.inputs.items():
+            for name in inputs:
+                self.dependents.setdefault(name, []).append(field)
+        self.order = self.topological_order()
+        self.position = {field: i for i, field in enumerate(self.order)}
+        self.plan_cache_size = plan_cache_size
+        self.plans: "OrderedDict[FrozenSet[str], List[str]]" = OrderedDict()
+
+    def topological_order(self) -> List[str]:
+        # Kahn's algorithm over the computed fields, in their given order
+        # where references allow
+        waiting = {field: sum(name in self.inputs for name in inputs) for field, inputs in self.inputs.items()}
+        ready = deque(field for field, count in waiting.items() if count == 0)
+        order: List[str] = []
+        while ready:
+            field = ready.popleft()
+            order.append(field)
+            for dependent in self.dependents.get(field, ()):
+                waiting[dependent] -= 1
+                if waiting[dependent] == 0:
+                    ready.append(dependent)
+        if len(order) < len(self.inputs):
+            raise CycleError(self.find_cycle({field for field, count in waiting.items() if count > 0}))
+        return order
+
+    def find_cycle(self, blocked: Set[str]) -> List[str]:
+        """A loop among `blocked`, the fields left waiting by the sort
+
+        Every blocked field reads at least one other blocked field, so
+        following those references from any of them must come back around.
+        """
+        field = next(iter(blocked))
+        path: List[str] = []
+        seen: Dict[str, int] = {}
+        while field not in seen:
+            seen[field] = len(path)
+            path.append(field)
+            field = next(name for name in sorted(self.inputs[field]) if name in blocked)
+        return path[seen[field]:] + [field]
+
+    def affected(self, changed: Iterable[str]) -> List[str]:
+        """The computed fields that may change when `changed` fields do, in
+        evaluation order; plans are cached per set of changed fields"""
+        key = frozenset(changed)
+        plan = self.plans.get(key)
+        if plan is not None:
+            self.plans.move_to_end(key)
+            return plan
+        reached: Set[str] = set()
+        stack = list(key)
+        while stack:
+            for dependent in self.dependents.get(stack.pop(), ()):
+                if dependent not in reached:
+                    reached.add(dependent)
+                    stack.append(dependent)
+        plan = sorted(reached, key=self.position.__getitem__)
+        self.plans[key] = plan
+        if len(self.plans) > self.plan_cache_size:
+            self.plans.popitem(last=False)
+        return plan
+
+    def evaluate(self, record: MutableMapping[str, Any]) -> Dict[str, Any]:
+        """Compute every computed field of `record`, storing the values in it
+
+        Returns:
+            dict[str, Any]: The computed values
+        """
+        values: Dict[str, Any] = {}
+        for field in self.order:
+            record[field] = values[field] = self.compiled[field](record)
+        return values
+
+    def recompute(self, record: MutableMapping[str, Any], changed: Iterable[str]) -> Dict[str, Any]:
+        """Bring the computed fields of `record` up to date after `changed`
+        fields were modified in it
+
+        `record` must hold the current values of the computed fields, e.g.
+        from `evaluate`. Only the computed fields downstream of `changed`
+        are considered, in order. A field is re-evaluated only if one of its
+        inputs actually changed value, so a recomputed field that comes out
+        the same stops the change from spreading further.
+
+        Returns:
+            dict[str, Any]: The computed fields whose values changed, and
+                their new values
+        """
+        changed = frozenset(changed)
+        dirty = set(changed)
+        updates: Dict[str, Any] = {}
+        for field in self.affected(changed):
+            if self.inputs[field].isdisjoint(dirty):
+                continue
+            value, old = self.compiled[field](record), record.get(field)
+            # True == 1.0 and False == 0, but they format differently
+            if type(value) is not type(old) or value != old:
+                record[field] = updates[field] = value
+                dirty.add(field)
+        return updates
+
+    def recompute_batch(self, changes: Iterable[Tuple[MutableMapping[str, Any], Iterable[str]]]
+                        ) -> List[Dict[str, Any]]:
+        """`recompute` for many records, each with its own changed fields
+
+        Records changing the same fields share one cached plan, so a batch
+        costs one graph traversal per distinct set of changed fields.
+
+        Returns:
+            list[dict[str, Any]]: Each record's updates, in input order
+        """
+        return [self.recompute(record, changed) for record, changed in changes]
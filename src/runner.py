@@ -0,0 +1,127 @@
+import sqlite3
+from collections import OrderedDict
+from typing import Any, Dict, List, Mapping, NamedTuple, Optional, Sequence, Tuple, Union
+
+from cache import ParseCache
+from parse import ASTNode, Variable
+from transpiler import Transpiler
+from typecheck import ValueType
+
+
+class Statement(NamedTuple):
+    """Parameterized SQL and the values of its placeholders, in order"""
+    sql: str
+    params: Tuple[Any, ...]
+
+
+class SQLiteRunner:
+    """Runs formulas against a SQLite database with parameterized SQL
+
+    Formulas are transpiled with their literals as parameters, so formulas
+    that differ only in constants share one SQL text, and so one prepared
+    statement. The connection keeps a bounded LRU of prepared statements
+    keyed on that text (`sqlite3`'s statement cache, sized by
+    `max_statements`); the runner keeps the same LRU of the texts, to count
+    how often a statement was reused rather than compiled, which is exact as
+    long as the connection is only used through the runner. Statements are
+    also kept per formula, in an LRU of `max_formulas`, so a repeated formula
+    is neither parsed nor transpiled again.
+
+    Args:
+        database (str): The database path, or ":memory:"
+        schema (Mapping[str, ValueType | str] | None): The type of each field,
+            for the transpiler
+        max_statements (int): Prepared statements the connection keeps
+        max_formulas (int): Formulas whose statements are kept
+        **connect_kwargs: Passed on to `sqlite3.connect`
+    """
+    def __init__(self, database: str = ":memory:", schema: Optional[Mapping[str, Union[ValueType, str]]] = None,
+                 max_statements: int = 128, max_formulas: int = 4096, **connect_kwargs: Any) -> None:
+        self.connection = sqlite3.connect(database, cached_statements=max_statements, **connect_kwargs)
+        self.transpiler = Transpiler(schema=schema, dialect="sqlite")
+        self.parse_cache = ParseCache(max_formulas)
+        self.max_statements = max_statements
+        self.max_formulas = max_formulas
+        # (mode, formula, table, columns) to statement
+        self.formulas: "OrderedDict[Tuple[str, str, str, Tuple[str, ...]], Statement]" = OrderedDict()
+        # SQL texts in the connection's statement cache, least recently used first
+        self.prepared: "OrderedDict[str, None]" = OrderedDict()
+        self.counters = {"formula_hits": 0, "formula_misses": 0, "statement_hits": 0, "statement_misses": 0}
+
+    def parse(self, code: str) -> ASTNode:
+        ast = self.parse_cache.get(code)
+        if ast is None:
+            raise Exception("Empty formula")
+        return ast
+
+    def statement(self, code: str, table_name: str, mode: str = "select",
+                  columns: Sequence[str] = ()) -> Statement:
+        """The parameterized statement for a formula
+
+        Args:
+            code (str): The formula source
+            table_name (str): The table the formula's fields belong to
+            mode (str): "select" for the formula's value per record, as a
+                "result" column after `columns`, or "filter" for the
+                `columns` (every column if empty) of the records it is truthy for
+            columns (Sequence[str]): Fields to select as well
+
+        Raises:
+            Exception: When the formula fails to parse or transpile, or the
+                mode is unknown
+        """
+        key = (mode, code, table_name, tuple(columns))
+        statement = self.formulas.get(key)
+        if statement is not None:
+            self.formulas.move_to_end(key)
+            self.counters["formula_hits"] += 1
+            return statement
+        self.counters["formula_misses"] += 1
+        ast = self.parse(code)
+        params: List[Any] = []
+        if mode == "select":
+            selected = [(name, Variable(name)) for name in columns] + [("result", ast)]
+            sql = self.transpiler.transpile_many(selected, table_name, params=params).sql
+        elif mode == "filter":
+            sql = self.transpiler.transpile_filter(ast, table_name, columns=columns or None, params=params)
+        else:
+            raise Exception(f"Unknown mode {mode!r}, expected 'select' or 'filter'")
+        statement = self.formulas[key] = Statement(sql, tuple(params))
+        if len(self.formulas) > self.max_formulas:
+            self.formulas.popitem(last=False)
+        return statement
+
+    def execute(self, statement: Statement) -> sqlite3.Cursor:
+        """Run a statement, reusing its prepared form if the connection has it"""
+        if statement.sql in self.prepared:
+            self.prepared.move_to_end(statement.sql)
+            self.counters["statement_hits"] += 1
+        else:
+            self.prepared[statement.sql] = None
+            self.counters["statement_misses"] += 1
+            if len(self.prepared) > self.max_statements:
+                self.prepared.popitem(last=False)
+        return self.connection.execute(statement.sql, statement.params)
+
+    def evaluate(self, code: str, table_name: str, columns: Sequence[str] = ()) -> List[tuple]:
+        """The formula's value for every record of `table_name`
+
+        Returns:
+            list[tuple]: One row per record: the `columns`, then the value
+        """
+        return self.execute(self.statement(code, table_name, "select", columns)).fetchall()
+
+    def filter(self, code: str, table_name: str, columns: Sequence[str] = ()) -> List[tuple]:
+        """The records of `table_name` the formula is truthy for, as
+        `Transpiler.transpile_filter` selects them
+
+        Returns:
+            list[tuple]: The `columns` of each record, or every column if empty
+        """
+        return self.execute(self.statement(code, table_name, "filter", columns)).fetchall()
+
+    def stats(self) -> Dict[str, int]:
+        return dict(self.counters, formulas=len(self.formulas), statements=len(self.prepared))
+
+    def close(self) -> None:
+        self.connection.close()
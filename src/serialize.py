@@ -0,0 +1,203 @@
+import struct
+import sys
+from array import array
+from typing import Dict, List, Optional, Tuple, Union
+
+from lexer import TokenType
+from parse import ASTNode, Array, BinOp, FunctionCall, NodeTable, Number, String, UnOp, Variable
+
+# A serialized AST is a header, then three little-endian sections:
+#   numbers  float64 per distinct number literal
+#   code     uint32 words: the nodes in post-order, each one word holding
+#            its opcode (low 4 bits) and operand; calls take a second word
+#   strings  the char length (uint32) of each distinct string, then their UTF-8 text
+# A subtree equal to one already written is written as a REF to its node
+# number (nodes are numbered in the order they are written), so shared
+# subtrees stay shared when decoded.
+MAGIC = b"FAST"
+header = struct.Struct("<4sIII")
+
+# Opcode: operand
+NUMBER, NULL, TRUE, FALSE, STRING, VARIABLE, BINOP, UNOP, CALL, ARRAY, REF = range(11)
+#   NUMBER: number index     STRING, VARIABLE: string index
+#   BINOP, UNOP: token kind  CALL: name string index, then a word with the argument count
+#   ARRAY: element count     REF: node number
+#   NULL, TRUE, FALSE: none
+OP_BITS = 4
+OP_MASK = (1 << OP_BITS) - 1
+
+token_kinds: Dict[int, TokenType] = {kind.value: kind for kind in TokenType}
+
+def little_endian(values: array) -> bytes:
+    if sys.byteorder == "big":
+        values = array(values.typecode, values)
+        values.byteswap()
+    return values.tobytes()
+
+def read_array(typecode: str, data: memoryview) -> array:
+    values = array(typecode)
+    values.frombytes(data)
+    if sys.byteorder == "big":
+        values.byteswap()
+    return values
+
+
+def encode(root: Optional[ASTNode]) -> bytes:
+    """Serialize an AST into its compact binary form
+
+    Raises:
+        Exception: When the tree holds a node or value with no binary form
+    """
+    numbers = array("d")
+    number_index: Dict[float, int] = {}
+    strings: List[str] = []
+    string_index: Dict[str, int] = {}
+    code = array("I")
+    numbered: Dict[ASTNode, int] = {}
+
+    def intern_string(text: str) -> int:
+        index = string_index.get(text)
+        if index is None:
+            index = string_index[text] = len(strings)
+            strings.append(text)
+        return index
+
+    stack: List[Tuple[ASTNode, bool]] = [(root, False)] if root is not None else []
+    while stack:
+        node, visited = stack.pop()
+        number = numbered.get(node)
+        if number is not None:
+            code.append(REF | number << OP_BITS)
+            continue
+        if not visited:
+            stack.append((node, True))
+            stack.extend((child, False) for child in reversed(node.children()))
+            continue
+
+        node_type = type(node)
+        if node_type is BinOp:
+            code.append(BINOP | node.op.value << OP_BITS)
+        elif node_type is FunctionCall:
+            code.extend((CALL | intern_string(node.name) << OP_BITS, len(node.args)))
+        elif node_type is Variable:
+            code.append(VARIABLE | intern_string(node.name) << OP_BITS)
+        elif node_type is String:
+            code.append(STRING | intern_string(node.value) << OP_BITS)
+        elif node_type is Number:
+            value = node.value
+            if value is None:
+                code.append(NULL)
+            elif value is True or value is False:
+                code.append(TRUE if value else FALSE)
+            elif isinstance(value, float):
+                index = number_index.get(value)
+                if index is None:
+                    index = number_index[value] = len(numbers)
+                    numbers.append(value)
+                code.append(NUMBER | index << OP_BITS)
+            else:
+                raise Exception(f"Cannot serialize number {value!r}")
+        elif node_type is UnOp:
+            code.append(UNOP | node.op.value << OP_BITS)
+        elif node_type is Array:
+            code.append(ARRAY | len(node.elements) << OP_BITS)
+        else:
+            raise Exception(f"Cannot serialize {node_type.__name__} nodes")
+        numbered[node] = len(numbered)
+
+    lengths = array("I", (len(text) for text in strings))
+    return b"".join((
+        header.pack(MAGIC, len(numbers), len(code), len(strings)),
+        little_endian(numbers),
+        little_endian(code),
+        little_endian(lengths),
+        "".join(strings).encode("utf-8"),
+    ))
+
+def decode(data: Union[bytes, memoryview], table: Optional[NodeTable] = None) -> Optional[ASTNode]:
+    """Rebuild an AST from `encode`'s output
+
+    Args:
+        data (bytes | memoryview): The serialized tree, e.g. a slice of a
+            memory-mapped `diskcache.DiskCache`
+        table (NodeTable | None): If given, every node is interned into it
+
+    Raises:
+        Exception: When `data` is not a serialized AST
+    """
+    view = memoryview(data)
+    if len(view) < header.size:
+        raise Exception("Truncated serialized AST")
+    magic, number_count, code_count, string_count = header.unpack_from(view)
+    if magic != MAGIC:
+        raise Exception("Not a serialized AST")
+    if len(view) < header.size + 8 * number_count + 4 * code_count + 4 * string_count:
+        raise Exception("Truncated serialized AST")
+    pos = header.size
+    numbers = read_array("d", view[pos:pos + 8 * number_count])
+    pos += 8 * number_count
+    code = read_array("I", view[pos:pos + 4 * code_count])
+    pos += 4 * code_count
+    lengths = read_array("I", view[pos:pos + 4 * string_count])
+    pos += 4 * string_count
+    try:
+        text = str(view[pos:], "utf-8")
+    except UnicodeDecodeError as e:
+        raise Exception(f"Corrupt serialized AST: {e}")
+    if len(text) != sum(lengths):
+        raise Exception("Corrupt serialized AST: strings do not match their lengths")
+    strings: List[str] = []
+    start = 0
+    for length in lengths:
+        strings.append(text[start:start + length])
+        start += length
+
+    intern = table.intern if table is not None else None
+    stack: List[ASTNode] = []
+    nodes: List[ASTNode] = []
+    i, end = 0, len(code)
+    try:
+        while i < end:
+            word = code[i]
+            op, operand = word & OP_MASK, word >> OP_BITS
+            i += 1
+            if op == REF:
+                stack.append(nodes[operand])
+                continue
+            if op == BINOP:
+                right = stack.pop()
+                node: ASTNode = BinOp(stack.pop(), token_kinds[operand], right)
+            elif op == CALL:
+                split = len(stack) - code[i]
+                if split < 0:
+                    raise IndexError("too few arguments on the stack")
+                node = FunctionCall(strings[operand], stack[split:])
+                del stack[split:]
+                i += 1
+            elif op == VARIABLE:
+                node = Variable(strings[operand])
+            elif op == STRING:
+                node = String(strings[operand])
+            elif op == NUMBER:
+                node = Number(numbers[operand])
+            elif op == NULL or op == TRUE or op == FALSE:
+                node = Number(None if op == NULL else op == TRUE)
+            elif op == UNOP:
+                node = UnOp(token_kinds[operand], stack.pop())
+            elif op == ARRAY:
+                split = len(stack) - operand
+                if split < 0:
+                    raise IndexError("too few elements on the stack")
+                node = Array(stack[split:])
+                del stack[split:]
+            else:
+                raise Exception(f"Unknown opcode {op}")
+            if intern is not None:
+                node = intern(node)
+            nodes.append(node)
+            stack.append(node)
+    except (IndexError, KeyError) as e:
+        raise Exception(f"Corrupt serialized AST: {e}")
+    if len(stack) > 1 or (not stack and end):
+        raise Exception("Corrupt serialized AST: not a single tree")
+    return stack[0] if stack else None
@@ -0,0 +1,354 @@
+import asyncio
+import json
+import os
+import sys
+from collections import OrderedDict
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from cache import parse_cache
+from diskcache import DiskCache
+from batch import summarize
+from transpiler import Transpiler
+from dialects import dialects
+from validate import validate
+
+# JSON-RPC 2.0 error codes
+PARSE_ERROR = -32700
+INVALID_REQUEST = -32600
+METHOD_NOT_FOUND = -32601
+INVALID_PARAMS = -32602
+FORMULA_ERROR = -32000
+
+# A call as sent to a worker, and its outcome: (True, result) or (False, error message)
+Call = Tuple[str, Dict[str, Any]]
+Outcome = Tuple[bool, Any]
+
+
+class RPCError(Exception):
+    def __init__(self, code: int, message: str) -> None:
+        super().__init__(message)
+        self.code = code
+
+
+# Runs in the worker processes, which each keep the process-wide
+# `cache.parse_cache` warm between requests
+transpiler = Transpiler()
+
+def init_worker(cache_path: Optional[str]) -> None:
+    if cache_path is not None:
+        parse_cache.disk = DiskCache(cache_path)
+
+def run_call(method: str, params: Dict[str, Any]) -> Any:
+    code = params["formula"]
+    if method == "validate":
+        diagnostics = [diagnostic.as_dict() for diagnostic in validate(code)]
+        if diagnostics:
+            return {"valid": False, "error": diagnostics[0]["message"], "diagnostics": diagnostics}
+        try:
+            ast = parse_cache.get(code)
+            if ast is not None:
+                transpiler.transpile(ast, "my_table", "result")
+        except Exception as e:
+            return {"valid": False, "error": str(e), "diagnostics": []}
+        return {"valid": True, "error": None, "diagnostics": []}
+    ast = parse_cache.get(code)
+    if method == "parse":
+        return {"ast": summarize(ast)}
+    if ast is None:
+        return {"sql": None, "params": []} if params.get("parameterize", False) else {"sql": None}
+    if not params.get("parameterize", False):
+        return {"sql": transpiler.transpile(ast, params.get("table", "my_table"), params.get("result", "result"),
+                                            dialect=params.get("dialect"))}
+    values: List[Any] = []
+    sql = transpiler.transpile(ast, params.get("table", "my_table"), params.get("result", "result"),
+                               dialect=params.get("dialect"), params=values)
+    return {"sql": sql, "params": values}
+
+def run_calls(calls: List[Call]) -> List[Outcome]:
+    """Run a batch of calls; one failing formula does not fail the others"""
+    outcomes: List[Outcome] = []
+    for method, params in calls:
+        try:
+            outcomes.append((True, run_call(method, params)))
+        except Exception as e:
+            outcomes.append((False, str(e)))
+    return outcomes
+
+
+def check_params(method: str, params: Any) -> Dict[str, Any]:
+    """
+    Raises:
+        RPCError: When the method or its parameters are not valid
+    """
+    if method not in FormulaService.methods:
+        raise RPCError(METHOD_NOT_FOUND, f"Unknown method {method!r}")
+    if not isinstance(params, dict):
+        raise RPCError(INVALID_PARAMS, "params must be an object")
+    if method == "stats":
+        return params
+    if not isinstance(params.get("formula"), str):
+        raise RPCError(INVALID_PARAMS, "params.formula must be a string")
+    for name in ("table", "result"):
+        if name in params and not isinstance(params[name], str):
+            raise RPCError(INVALID_PARAMS, f"params.{name} must be a string")
+    if not isinstance(params.get("parameterize", False), bool):
+        raise RPCError(INVALID_PARAMS, "params.parameterize must be a boolean")
+    if "dialect" in params:
+        # Names are matched as `dialects.get_dialect` matches them, and the
+        # result cache sees one spelling
+        if not isinstance(params["dialect"], str) or params["dialect"].lower() not in dialects:
+            raise RPCError(INVALID_PARAMS, f"params.dialect must be one of {', '.join(sorted(dialects))}")
+        params = dict(params, dialect=params["dialect"].lower())
+    return params
+
+
+class FormulaService:
+    """A resident formula service speaking JSON-RPC 2.0, one message per line
+
+    Methods:
+        parse {formula}: the AST summary, as in batch mode
+        transpile {formula, table?, result?, dialect?, parameterize?}: the
+            SQL, for one of `dialects.dialects`; with parameterize, literals
+            are placeholders and their values are returned as "params"
+        validate {formula}: whether the formula parses and transpiles, and
+            every problem found if not, as `validate.Diagnostic` dicts
+        stats {}: cache and batching counters
+
+    Requests are answered as they complete, not necessarily in order. Work
+    runs on a pool of worker processes, each keeping a warm parse cache (and
+    optionally mapping a shared `diskcache.DiskCache`), so the event loop is
+    never blocked by a slow formula. Requests arriving together are sent to
+    the pool in small batches, to pay for one inter-process round trip
+    rather than one each; large formulas are sent on their own so they
+    delay nothing else. Results, and errors in the formulas themselves, are
+    kept in an LRU cache; a call whose worker failed is not, so it is
+    retried when asked again. Identical requests in flight at the same time
+    are computed once.
+
+    Args:
+        workers (int | None): Worker processes; 0 runs calls on a thread in
+            this process instead, which is useful for tests
+        cache_path (str | None): A compile cache every worker maps
+        max_batch (int): The most calls sent to a worker at once
+        batch_window (float): Seconds to wait for more calls to batch
+        solo_size (int): Formulas at least this long are never batched
+        max_results (int): Results kept in the LRU cache
+    """
+    methods = ("parse", "transpile", "validate", "stats")
+
+    def __init__(self, workers: Optional[int] = None, cache_path: Optional[str] = None, max_batch: int = 32,
+                 batch_window: float = 0.001, solo_size: int = 2000, max_results: int = 4096) -> None:
+        self.workers = workers if workers is not None else (os.cpu_count() or 1)
+        self.cache_path = cache_path
+        self.max_batch = max_batch
+        self.batch_window = batch_window
+        self.solo_size = solo_size
+        self.max_results = max_results
+        self.executor: Optional[Executor] = None
+        self.results: "OrderedDict[str, Outcome]" = OrderedDict()
+        self.in_flight: Dict[str, "asyncio.Future[Outcome]"] = {}
+        self.pending: List[Tuple[Call, "asyncio.Future[Outcome]"]] = []
+        self.flush_handle: Optional[asyncio.TimerHandle] = None
+        self.counters = {"requests": 0, "result_hits": 0, "shared": 0, "batches": 0, "batched_calls": 0}
+
+    def start(self) -> None:
+        if self.workers == 0:
+            init_worker(self.cache_path)
+            self.executor = ThreadPoolExecutor(max_workers=1)
+        else:
+            self.executor = ProcessPoolExecutor(max_workers=self.workers, initializer=init_worker,
+                                                initargs=(self.cache_path,))
+            # Start every worker now rather than on the first requests
+            for future in [self.executor.submit(run_calls, []) for _ in range(self.workers)]:
+                future.result()
+
+    def close(self) -> None:
+        if self.executor is not None:
+            self.executor.shutdown(cancel_futures=True)
+            self.executor = None
+
+    async def __aenter__(self) -> "FormulaService":
+        # Worker start-up blocks, so it runs off the event loop
+        await asyncio.get_running_loop().run_in_executor(None, self.start)
+        return self
+
+    async def __aexit__(self, *exc_info: object) -> None:
+        self.close()
+
+    async def call(self, method: str, params: Dict[str, Any]) -> Any:
+        """Run one call
+
+        Raises:
+            RPCError: When the call is invalid or its formula fails
+        """
+        params = check_params(method, params)
+        self.counters["requests"] += 1
+        if method == "stats":
+            return dict(self.counters, results=len(self.results), workers=self.workers)
+        key = json.dumps([method, params], sort_keys=True)
+        outcome = self.results.get(key)
+        if outcome is not None:
+            self.results.move_to_end(key)
+            self.counters["result_hits"] += 1
+        else:
+            future = self.in_flight.get(key)
+            if future is not None:
+                self.counters["shared"] += 1
+            else:
+                future = self.in_flight[key] = asyncio.get_running_loop().create_future()
+                self.enqueue((method, params), future)
+            try:
+                outcome = await asyncio.shield(future)
+            except Exception as e:
+                # The worker failed rather than the formula; nothing to keep
+                raise RPCError(FORMULA_ERROR, f"Worker failed: {e}")
+            finally:
+                self.in_flight.pop(key, None)
+            self.results[key] = outcome
+            if len(self.results) > self.max_results:
+                self.results.popitem(last=False)
+        ok, value = outcome
+        if not ok:
+            raise RPCError(FORMULA_ERROR, value)
+        return value
+
+    def enqueue(self, call: Call, future: "asyncio.Future[Outcome]") -> None:
+        if len(call[1]["formula"]) >= self.solo_size:
+            self.dispatch([(call, future)])
+            return
+        self.pending.append((call, future))
+        if len(self.pending) >= self.max_batch:
+            self.flush()
+        elif self.flush_handle is None:
+            self.flush_handle = asyncio.get_running_loop().call_later(self.batch_window, self.flush)
+
+    def flush(self) -> None:
+        if self.flush_handle is not None:
+            self.flush_handle.cancel()
+            self.flush_handle = None
+        if self.pending:
+            batch, self.pending = self.pending, []
+            self.dispatch(batch)
+
+    def dispatch(self, batch: List[Tuple[Call, "asyncio.Future[Outcome]"]]) -> None:
+        if self.executor is None:
+            raise Exception("FormulaService is not started")
+        self.counters["batches"] += 1
+        self.counters["batched_calls"] += len(batch)
+        loop = asyncio.get_running_loop()
+        work = loop.run_in_executor(self.executor, run_calls, [call for call, _ in batch])
+
+        def done(work: "asyncio.Future[List[Outcome]]") -> None:
+            error = work.exception() if not work.cancelled() else Exception("cancelled")
+            for i, (_, future) in enumerate(batch):
+                if future.done():
+                    continue
+                if error is not None:
+                    future.set_exception(error)
+                else:
+                    future.set_result(work.result()[i])
+        work.add_done_callback(done)
+
+    async def handle_message(self, message: Any) -> Optional[Dict[str, Any]]:
+        """The response to one decoded JSON-RPC request, or None for a notification"""
+        if not isinstance(message, dict) or message.get("jsonrpc") != "2.0" \
+                or not isinstance(message.get("method"), str):
+            return error_response(None, INVALID_REQUEST, "Invalid request")
+        request_id = message.get("id")
+        try:
+            result = await self.call(message["method"], message.get("params", {}))
+            response = {"jsonrpc": "2.0", "id": request_id, "result": result}
+        except RPCError as e:
+            response = error_response(request_id, e.code, str(e))
+        return response if "id" in message else None
+
+    async def handle_line(self, line: str) -> Optional[str]:
+        """The response line to one request line, which may be a JSON-RPC batch"""
+        try:
+            message = json.loads(line)
+        except ValueError as e:
+            return json.dumps(error_response(None, PARSE_ERROR, f"Parse error: {e}"))
+        if isinstance(message, list):
+            if not message:
+                return json.dumps(error_response(None, INVALID_REQUEST, "Empty batch"))
+            responses = await asyncio.gather(*(self.handle_message(item) for item in message))
+            answered = [response for response in responses if response is not None]
+            return json.dumps(answered) if answered else None
+        response = await self.handle_message(message)
+        return json.dumps(response) if response is not None else None
+
+    async def serve_lines(self, reader: asyncio.StreamReader, write: Callable[[str], Awaitable[None]]) -> None:
+        """Answer every request line from `reader` concurrently, until it ends"""
+        tasks = set()
+
+        async def answer(line: str) -> None:
+            response = await self.handle_line(line)
+            if response is not None:
+                await write(response + "\n")
+
+        while True:
+            line = await reader.readline()
+            if not line:
+                break
+            if not line.strip():
+                continue
+            task = asyncio.ensure_future(answer(line.decode("utf-8")))
+            tasks.add(task)
+            task.add_done_callback(tasks.discard)
+        if tasks:
+            await asyncio.gather(*tasks)
+
+    async def serve_stdio(self) -> None:
+        loop = asyncio.get_running_loop()
+        reader = asyncio.StreamReader(limit=2 ** 26)
+        await loop.connect_read_pipe(lambda: asyncio.StreamReaderProtocol(reader), sys.stdin)
+        out = sys.stdout
+
+        async def write(text: str) -> None:
+            out.write(text)
+            out.flush()
+        await self.serve_lines(reader, write)
+
+    async def serve_socket(self, path: str) -> None:
+        """Serve clients on a Unix domain socket at `path` until cancelled"""
+        async def connection(reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+            lock = asyncio.Lock()
+
+            async def write(text: str) -> None:
+                async with lock:
+                    writer.write(text.encode("utf-8"))
+                    await writer.drain()
+            try:
+                await self.serve_lines(reader, write)
+            except ConnectionError:
+                pass
+            finally:
+                writer.close()
+
+        if os.path.exists(path):
+            os.unlink(path)
+        server = await asyncio.start_unix_server(connection, path, limit=2 ** 26)
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            if os.path.exists(path):
+                os.unlink(path)
+
+def error_response(request_id: Any, code: int, message: str) -> Dict[str, Any]:
+    return {"jsonrpc": "2.0", "id": request_id, "error": {"code": code, "message": message}}
+
+
+def serve(socket_path: Optional[str] = None, workers: Optional[int] = None, cache_path: Optional[str] = None) -> None:
+    """Run the service on stdin/stdout, or on a Unix socket, until stopped"""
+    async def run() -> None:
+        async with FormulaService(workers=workers, cache_path=cache_path) as service:
+            if socket_path is None:
+                await service.serve_stdio()
+            else:
+                await service.serve_socket(socket_path)
+    try:
+        asyncio.run(run())
+    except KeyboardInterrupt:
+        pass
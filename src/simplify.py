@@ -1,8 +1,8 @@
-
 from lexer import Token, TokenType, lex
 from typing import List, Union, Optional
 
 from parse import ASTNode, BinOp, UnOp, Number, String
+from valuetypes import STRING, numeric, value_type
 
 def get_literal(node: ASTNode) -> Union[int, float, str, None]:
     if isinstance(node, Number):
@@ -14,60 +14,55 @@ def get_literal(node: ASTNode) -> Union[int, float, str, None]:
 
 def simplify_unop(node: UnOp) -> ASTNode:
     right = get_literal(node.right)
-    if right is None:
-        return node
-    try:
-        if node.op == TokenType.MINUS:
-            return Number(-right)
-        else:
-            raise Exception(f"Invalid operator {node.op}")
-    except:
+    if node.op != TokenType.MINUS or value_type(right) not in numeric:
         return node
+    return Number(-right)
 
 def simplify_binop(node: BinOp) -> ASTNode:
+    """Fold an operator applied to two literals, when their types allow it
+
+    Only numbers (and booleans) are folded by arithmetic, comparisons and
+    logic, and only text by `&`; anything else, including division by zero,
+    is left for run time.
+    """
     left = get_literal(node.left)
     right = get_literal(node.right)
+    left_type, right_type = value_type(left), value_type(right)
 
-    if left is None or right is None:
+    if node.op == TokenType.AMPERSAND:
+        if left_type is STRING and right_type is STRING:
+            return String(left + right)
         return node
-    try:
-        if node.op == TokenType.PLUS:
-            if isinstance(left, str) or isinstance(right, str):
-                raise Exception("Cannot add strings")
-            return Number(left + right)
-        elif node.op == TokenType.AMPERSAND:
-            if isinstance(left, str) and isinstance(right, str):
-                return String(left + right)
-            else:
-                raise Exception("Cannot concatenate non-strings")
-        
-        left = float(left)
-        right = float(right)
-            
-        match node.op:
-            case TokenType.MINUS:
-                return Number(left - right)
-            case TokenType.MUL:
-                return Number(left * right)
-            case TokenType.DIV:
-                return Number(left / right)
-            case TokenType.EQ:
-                return Number(left == right)
-            case TokenType.NE:
-                return Number(left != right)
-            case TokenType.LT:
-                return Number(left < right)
-            case TokenType.LE:
-                return Number(left <= right)
-            case TokenType.GT:
-                return Number(left > right)
-            case TokenType.GE:
-                return Number(left >= right)
-            case TokenType.AND:
-                return Number(left and right)
-            case TokenType.OR:
-                return Number(left or right)
-            case _:
-                raise Exception(f"Invalid operator {node.op}")
-    except:
-        return node
\ No newline at end of file
+    if left_type not in numeric or right_type not in numeric:
+        return node
+    if node.op == TokenType.PLUS:
+        return Number(left + right)
+
+    left = float(left)
+    right = float(right)
+
+    match node.op:
+        case TokenType.MINUS:
+            return Number(left - right)
+        case TokenType.MUL:
+            return Number(left * right)
+        case TokenType.DIV:
+            return Number(left / right) if right != 0 else node
+        case TokenType.EQ:
+            return Number(left == right)
+        case TokenType.NE:
+            return Number(left != right)
+        case TokenType.LT:
+            return Number(left < right)
+        case TokenType.LE:
+            return Number(left <= right)
+        case TokenType.GT:
+            return Number(left > right)
+        case TokenType.GE:
+            return Number(left >= right)
+        case TokenType.AND:
+            return Number(left and right)
+        case TokenType.OR:
+            return Number(left or right)
+        case _:
+            return node
@@ -1,5 +1,210 @@
-from parse import ASTNode, BinOp, UnOp, Number, String, FunctionCall, Variable, Array
+from typing import Any, Dict, Iterable, List, Mapping, NamedTuple, Optional, Sequence, TextIO, Tuple, Union
+
+from parse import ASTNode, BinOp, UnOp, Number, String, FunctionCall, Variable, Array, NodeTable, make_hash
 from lexer import TokenType
+from functions import Part, library, logical_operand, sql_call
+from typecheck import STRING, TypeChecker, ValueType
+from dialects import Dialect, generic, get_dialect
+from filters import Condition, condition_sql, logical_operands
+
+
+def column_name(name: str) -> str:
+    return name.replace(" ", "_")
+
+
+class BatchTranspilation(NamedTuple):
+    sql: Optional[str]
+    columns: int
+    scans_saved: int
+
+
+class SQLWriter:
+    """The output of one transpile call
+
+    Text goes to `stream` if one is given, and is otherwise collected in a
+    list and joined once by `getvalue`, so output is built in linear time.
+    """
+    def __init__(self, stream: Optional[TextIO] = None, indent_str: str = "  ") -> None:
+        self.parts: List[str] = []
+        self.emit = stream.write if stream is not None else self.parts.append
+        self.indent = 0
+        self.indent_str = indent_str
+
+    def write(self, text: str, indent=False, nl=False) -> None:
+        self.emit(("\n" if nl else "") + self.indent_str * (self.indent if indent else 0) + text)
+
+    def writeln(self, text: str, indent=True,nl=False) -> None:
+        self.write(text + "\n", indent=indent,nl=nl)
+
+    def getvalue(self) -> str:
+        return "".join(self.parts)
+
+
+class Subexpression(ASTNode):
+    """A reference to a common subexpression computed in a derived table"""
+    __slots__ = ("name",)
+
+    def __init__(self, name: str) -> None:
+        object.__setattr__(self, "name", name)
+        make_hash(self, (name,), ())
+
+    def __repr__(self) -> str:
+        return f'Subexpression("{self.name}")'
+
+    def attributes(self) -> tuple:
+        return (self.name,)
+
+# A reference has the type of the expression it names, which the transpiler
+# adds to the schema under that name
+TypeChecker.rules[Subexpression] = TypeChecker.infer_variable
+
+
+class Hoisting(NamedTuple):
+    roots: List[ASTNode]
+    # Innermost level first; each level is a list of (column name, expression)
+    levels: List[List[Tuple[str, ASTNode]]]
+
+
+def hoist_common_subexpressions(roots: Sequence[ASTNode], min_nodes: int = 2) -> Hoisting:
+    """Find subtrees that occur more than once and move them into derived columns
+
+    A subtree is hoisted when it has at least `min_nodes` nodes and occurs at
+    least twice, counting each hoisted definition once. Subtrees containing
+    an IF or a division are never hoisted: the database computes a derived
+    column for every row, even where the formula would not have evaluated it.
+    Definitions may refer to other definitions, which are then placed in a
+    deeper level.
+
+    Args:
+        roots (Sequence[ASTNode]): The ASTs of every output column
+        min_nodes (int): The smallest subtree worth hoisting
+
+    Returns:
+        Hoisting: `roots` with hoisted subtrees replaced by `Subexpression`
+            references, and the hoisted definitions by level
+    """
+    table = NodeTable()
+    roots = [table.intern_tree(root) for root in roots]
+
+    # Interned nodes are shared, so per-subtree facts can be keyed by id
+    sizes: Dict[int, int] = {}
+    hoistable: Dict[int, bool] = {}
+    stack: List[Tuple[ASTNode, bool]] = [(root, False) for root in roots]
+    while stack:
+        node, visited = stack.pop()
+        if id(node) in sizes:
+            continue
+        if visited:
+            children = node.children()
+            sizes[id(node)] = 1 + sum(sizes[id(child)] for child in children)
+            hoistable[id(node)] = (all(hoistable[id(child)] for child in children)
+                                   and not (isinstance(node, FunctionCall) and node.name == "IF")
+                                   and not (isinstance(node, BinOp) and node.op == TokenType.DIV))
+        else:
+            stack.append((node, True))
+            stack.extend((child, False) for child in node.children())
+
+    names: Dict[int, str] = {}
+    definitions: List[ASTNode] = []
+    while True:
+        # Count occurrences in the output columns and in each definition,
+        # where an already hoisted subtree counts once, as its reference
+        forest = [(root, False) for root in roots] + [(definition, True) for definition in definitions]
+        counts: Dict[int, int] = {}
+        for root, is_definition in forest:
+            nodes = [root]
+            while nodes:
+                node = nodes.pop()
+                counts[id(node)] = counts.get(id(node), 0) + 1
+                if id(node) not in names or (is_definition and node is root):
+                    nodes.extend(node.children())
+        # Take the largest repeated subtrees, top-down
+        chosen: List[ASTNode] = []
+        for root, is_definition in forest:
+            nodes = [root]
+            while nodes:
+                node = nodes.pop()
+                if id(node) in names and not (is_definition and node is root):
+                    continue
+                if id(node) not in names and counts[id(node)] > 1 \
+                        and sizes[id(node)] >= min_nodes and hoistable[id(node)]:
+                    names[id(node)] = f"_cse{len(names) + 1}"
+                    chosen.append(node)
+                    continue
+                nodes.extend(reversed(node.children()))
+        if not chosen:
+            break
+        definitions.extend(chosen)
+
+    if not names:
+        return Hoisting(roots, [])
+
+    # Rebuild each tree with references in place of hoisted subtrees; a
+    # definition keeps its own root
+    def rebuild(root: ASTNode, keep_root: bool) -> ASTNode:
+        stack: List[Tuple[ASTNode, bool]] = [(root, False)]
+        done: Dict[int, ASTNode] = {}
+        while stack:
+            node, visited = stack.pop()
+            if id(node) in done:
+                continue
+            if id(node) in names and not (keep_root and node is root):
+                done[id(node)] = Subexpression(names[id(node)])
+            elif visited:
+                children = node.children()
+                replaced = [done[id(child)] for child in children]
+                changed = any(new is not old for new, old in zip(replaced, children))
+                done[id(node)] = node.with_children(replaced) if changed else node
+            else:
+                stack.append((node, True))
+                stack.extend((child, False) for child in node.children())
+        return done[id(root)]
+
+    # A definition's level is one past the deepest definition it refers to
+    references: Dict[int, List[int]] = {}
+    for definition in definitions:
+        refs = []
+        nodes = list(definition.children())
+        while nodes:
+            node = nodes.pop()
+            if id(node) in names:
+                refs.append(id(node))
+            else:
+                nodes.extend(node.children())
+        references[id(definition)] = refs
+    levels = dict.fromkeys(references, 0)
+    changed = True
+    while changed:
+        changed = False
+        for key, refs in references.items():
+            level = max((levels[ref] + 1 for ref in refs), default=0)
+            if level != levels[key]:
+                levels[key] = level
+                changed = True
+
+    by_level: List[List[Tuple[str, ASTNode]]] = [[] for _ in range(max(levels.values()) + 1)]
+    for definition in definitions:
+        by_level[levels[id(definition)]].append((names[id(definition)], rebuild(definition, True)))
+    return Hoisting([rebuild(root, False) for root in roots], by_level)
+
+
+# SQL spelling of each binary operator
+sql_operators: Dict[TokenType, str] = {
+    TokenType.PLUS: "+",
+    TokenType.MINUS: "-",
+    TokenType.MUL: "*",
+    TokenType.DIV: "/",
+    TokenType.EQ: "=",
+    TokenType.NE: "!=",
+    TokenType.LT: "<",
+    TokenType.LE: "<=",
+    TokenType.GT: ">",
+    TokenType.GE: ">=",
+    TokenType.AMPERSAND: "||",
+    TokenType.DOT: ".",
+    TokenType.AND: "AND",
+    TokenType.OR: "OR",
+}
 
 
 class Transpiler:
@@ -9,62 +214,233 @@ class Transpiler:
     arithmetic_ops = [TokenType.PLUS, TokenType.MINUS, TokenType.MUL, TokenType.DIV]
     
     
-    def __init__(self) -> None:
-        self.output = ""
-        self.indent = 0
-        self.indent_str = "  "
-        
-    def write(self, text: str, indent=False, nl=False) -> None:
-        self.output += ("\n" if nl else "") + self.indent_str * (self.indent if indent else 0) + text
-
-    def writeln(self, text: str, indent=True,nl=False) -> None:
-        self.write(text + "\n", indent=indent,nl=nl)
+    def __init__(self, indent_str: str = "  ", cse: bool = True, cse_min_nodes: int = 2,
+                 schema: Optional[Mapping[str, Union[ValueType, str]]] = None,
+                 dialect: Union[str, Dialect, None] = None) -> None:
+        """
+        Args:
+            indent_str (str): One level of indentation in the output
+            cse (bool): Whether to compute repeated subexpressions once, in
+                derived tables, instead of at each occurrence
+            cse_min_nodes (int): The smallest subtree, in AST nodes, that is
+                worth computing once; single fields and literals never are
+            schema (Mapping[str, ValueType | str] | None): The type of each
+                field, for `typecheck.TypeChecker`; typed formulas get tighter
+                SQL, e.g. `+` on text becomes CONCAT and fields are tested
+                for truth with a single comparison
+            dialect (str | Dialect | None): The default SQL dialect, e.g.
+                "sqlite"; see `dialects.get_dialect`
+        """
+        # Configuration only: all per-call state lives in the SQLWriter, so one
+        # Transpiler can be shared between threads
+        self.indent_str = indent_str
+        self.cse = cse
+        self.cse_min_nodes = max(cse_min_nodes, 2)
+        self.schema = dict(schema or {})
+        self.dialect = get_dialect(dialect)
 
-    def transpile(self, node: ASTNode, table_name: str, result_name: str) -> str:
+    def transpile(self, node: ASTNode, table_name: str, result_name: str,
+                  stream: Optional[TextIO] = None, dialect: Union[str, Dialect, None] = None,
+                  params: Optional[List[Any]] = None) -> Optional[str]:
         """Transpile an AST to SQL
 
         Args:
             node (ASTNode): The root node of the AST
+            table_name (str): The table the formula's fields belong to
+            result_name (str): The name of the result column
+            stream (TextIO | None): If given, the SQL is written to this stream
+                as it is generated instead of being returned
+            dialect (str | Dialect | None): The SQL dialect, if not the
+                transpiler's default
+            params (list | None): If given, literals are not written into the
+                SQL: their values are appended to this list, in the order of
+                their placeholders, so formulas that differ only in constants
+                give the same SQL
+
+        Raises:
+            Exception: When the node is invalid, or the dialect is unknown or
+                cannot express it
+
+        Returns:
+            str | None: The transpiled SQL, or None if it was written to `stream`
+        """
+        out = SQLWriter(stream, self.indent_str)
+        self.write_select([(column_name(result_name), node)], table_name, out, dialect, params)
+        return None if stream is not None else out.getvalue()
+
+    def transpile_many(self, formulas: Union[Mapping[str, ASTNode], Iterable[Tuple[str, ASTNode]]],
+                       table_name: str, stream: Optional[TextIO] = None,
+                       dialect: Union[str, Dialect, None] = None,
+                       params: Optional[List[Any]] = None) -> BatchTranspilation:
+        """Transpile several formulas over the same table into one SELECT
+
+        Each formula becomes one aliased column of a single query, so the
+        database reads the table once instead of once per formula.
+
+        Args:
+            formulas (Mapping[str, ASTNode] | Iterable[tuple[str, ASTNode]]): result column name to AST
+            table_name (str): The table all the formulas' fields belong to
+            stream (TextIO | None): If given, the SQL is written to this stream
+                instead of being returned in the result
+            dialect (str | Dialect | None): The SQL dialect, if not the
+                transpiler's default
+            params (list | None): If given, literals are passed as parameters,
+                as in `transpile`
+
+        Raises:
+            Exception: When no formulas are given or two share a column name
+
+        Returns:
+            BatchTranspilation: The SQL, its column count, and how many table
+                scans it saves over transpiling each formula separately
+        """
+        items = list(formulas.items() if isinstance(formulas, Mapping) else formulas)
+        if not items:
+            raise Exception("No formulas to transpile")
+        names = [column_name(name) for name, _ in items]
+        if len(set(names)) != len(names):
+            raise Exception(f"Duplicate result column names in {names}")
+
+        out = SQLWriter(stream, self.indent_str)
+        self.write_select([(name, node) for name, (_, node) in zip(names, items)], table_name, out, dialect, params)
+        sql = None if stream is not None else out.getvalue()
+        return BatchTranspilation(sql, len(items), len(items) - 1)
+
+    def transpile_filter(self, node: ASTNode, table_name: str, stream: Optional[TextIO] = None,
+                         dialect: Union[str, Dialect, None] = None,
+                         columns: Optional[Sequence[str]] = None,
+                         params: Optional[List[Any]] = None) -> Optional[str]:
+        """Transpile a formula used as a record filter to a SELECT with a WHERE clause
+
+        The query returns the records the formula is truthy for, as Airtable's
+        filterByFormula does. Instead of computing the formula's value for
+        every record, the condition is rewritten into predicates an index can
+        serve: top-level ANDs become separate conjuncts, IFs with constant
+        branches become their condition, NOT is pushed down into inverted
+        comparisons, IS_BLANK becomes IS NULL, and IS_BEFORE/IS_AFTER with a
+        literal date become range tests on the field. Repeated subexpressions
+        are not hoisted, which would hide the fields from the index.
+
+        Args:
+            node (ASTNode): The root node of the AST
+            table_name (str): The table to filter
+            stream (TextIO | None): If given, the SQL is written to this stream
+                as it is generated instead of being returned
+            dialect (str | Dialect | None): The SQL dialect, if not the
+                transpiler's default
+            columns (Sequence[str] | None): The columns to select; every column if None
+            params (list | None): If given, literals are passed as parameters,
+                as in `transpile`
+
+        Raises:
+            Exception: When the node is invalid, or the dialect is unknown or
+                cannot express it
 
         Returns:
-            str: The transpiled SQL
+            str | None: The transpiled SQL, or None if it was written to `stream`
+        """
+        out = SQLWriter(stream, self.indent_str)
+        ctx = {"types": TypeChecker(self.schema),
+               "dialect": get_dialect(dialect) if dialect is not None else self.dialect, "params": params}
+        selected = ", ".join(ctx["dialect"].identifier(column_name(name)) for name in columns) if columns else "*"
+        out.writeln(f"SELECT {selected}")
+        out.writeln(f"FROM {table_name}")
+        conjuncts = logical_operands(node, "AND")
+        for i, conjunct in enumerate(conjuncts):
+            out.write("WHERE " if i == 0 else "AND ", indent=True)
+            out.indent += 1
+            self.visit(Condition(conjunct), ctx, out)
+            out.indent -= 1
+            out.writeln(";" if i == len(conjuncts) - 1 else "", indent=False)
+        return None if stream is not None else out.getvalue()
+
+    def write_select(self, columns: List[Tuple[str, ASTNode]], table_name: str, out: SQLWriter,
+                     dialect: Union[str, Dialect, None] = None, params: Optional[List[Any]] = None) -> None:
+        """Write one SELECT statement computing `columns` over `table_name`
+
+        With CSE enabled, repeated subexpressions are selected as extra
+        columns of nested derived tables, innermost first, and referenced by
+        name from the outer queries.
         """
-        self.writeln("SELECT")
-        self.indent += 1
-        self.visit(node, {})
-        self.writeln(" AS result", indent=False)
-        self.indent -= 1
-        self.writeln(f"FROM {table_name};")
-        return self.output
-
-    def visit(self, node: ASTNode, ctx: dict[any, any]) -> None:
+        nodes = [node for _, node in columns]
+        if self.cse:
+            hoisting = hoist_common_subexpressions(nodes, self.cse_min_nodes)
+        else:
+            hoisting = Hoisting(nodes, [])
+        # Nodes are typed as the visitors ask about them; hoisted definitions
+        # are typed first, so references to them get their types
+        types = TypeChecker(self.schema)
+        for level in hoisting.levels:
+            for name, node in level:
+                types.schema[name] = types.infer(node)
+        ctx = {"types": types, "dialect": get_dialect(dialect) if dialect is not None else self.dialect,
+               "params": params}
+        alias = ctx["dialect"].identifier
+
+        out.writeln("SELECT")
+        out.indent += 1
+        for i, ((name, _), node) in enumerate(zip(columns, hoisting.roots)):
+            indent = out.indent
+            self.visit(node, ctx, out)
+            # Visiting an IF does not always leave the indentation where it found it
+            out.indent = indent
+            out.writeln(f" AS {alias(name)}" + ("," if i < len(columns) - 1 else ""), indent=False)
+        out.indent -= 1
+        if not hoisting.levels:
+            out.writeln(f"FROM {table_name};")
+            return
+
+        for level in reversed(hoisting.levels):
+            out.writeln("FROM (")
+            out.indent += 1
+            out.writeln("SELECT *,")
+            out.indent += 1
+            for i, (name, node) in enumerate(level):
+                indent = out.indent
+                out.write("", indent=True)
+                self.visit(node, ctx, out)
+                out.indent = indent
+                out.writeln(f" AS {name}" + ("," if i < len(level) - 1 else ""), indent=False)
+            out.indent -= 1
+        out.writeln(f"FROM {table_name}")
+        for depth in range(1, len(hoisting.levels) + 1):
+            out.indent -= 1
+            out.writeln(f") AS _cse_level{depth}" + (";" if depth == len(hoisting.levels) else ""))
+
+    def visit(self, node: ASTNode, ctx: dict[any, any], out: SQLWriter) -> None:
         """Transpile a node to SQL
 
+        Nodes are expanded with an explicit work stack rather than recursion,
+        so arbitrarily deep formulas are emitted in linear time. Each
+        `visit_*` method returns the node's output as a list of parts: text
+        to write, `(child, ctx)` pairs to transpile in its place, or callables
+        that adjust the writer (newlines, indentation).
+
         Args:
             node (ASTNode): The node to transpile
             ctx (dict[any, any]): The context
+            out (SQLWriter): Where the SQL is written
 
         Raises:
             Exception: When the node is invalid
         """
-        if isinstance(node, BinOp):
-            self.visit_binop(node, ctx)
-        elif isinstance(node, UnOp):
-            self.visit_unop(node, ctx)
-        elif isinstance(node, Number):
-            self.visit_number(node, ctx)
-        elif isinstance(node, String):
-            self.visit_string(node, ctx)
-        elif isinstance(node, FunctionCall):
-            self.visit_function_call(node, ctx)
-        elif isinstance(node, Variable):
-            self.visit_variable(node, ctx)
-        elif isinstance(node, Array):
-            self.visit_array(node, ctx)
-        else:
+        stack: List[Part] = [(node, ctx)]
+        while stack:
+            part = stack.pop()
+            if isinstance(part, str):
+                out.write(part)
+            elif isinstance(part, tuple):
+                stack.extend(reversed(self.expand(*part)))
+            else:
+                part(out)
+
+    def expand(self, node: ASTNode, ctx: dict[any, any]) -> List[Part]:
+        visitor = self.visitors.get(type(node))
+        if visitor is None:
             raise Exception(f"Invalid node {node}")
+        return visitor(self, node, ctx)
 
-    def visit_binop(self, node: BinOp, ctx: dict[any, any]) -> None:
+    def visit_binop(self, node: BinOp, ctx: dict[any, any]) -> List[Part]:
         """Transpile a binary operation node to SQL
         
         Args:
@@ -72,203 +448,82 @@ class Transpiler:
             ctx (dict[any, any]): the context
         """
         
+        dialect = ctx.get("dialect", generic)
         if node.op == TokenType.AMPERSAND:
-            #print("AMPERSAND")
-            self.write("CONCAT(")
-            self.visit(node.left, ctx)
-            self.write(", ")
-            self.visit(node.right, ctx)
-            self.write(")")
-            return
-        def get_operator_equivalent(operator: TokenType):
-            match operator:
-                case TokenType.PLUS:
-                    return "+"
-                case TokenType.MINUS:
-                    return "-"
-                case TokenType.MUL:
-                    return "*"
-                case TokenType.DIV:
-                    return "/"
-                case TokenType.EQ:
-                    return "="
-                case TokenType.NE:
-                    return "!="
-                case TokenType.LT:
-                    return "<"
-                case TokenType.LE:
-                    return "<="
-                case TokenType.GT:
-                    return ">"
-                case TokenType.GE:
-                    return ">="
-                case TokenType.AMPERSAND:
-                    return "||"
-                case TokenType.DOT:
-                    return "."
-                case TokenType.AND:
-                    return "AND"
-                case TokenType.OR:
-                    return "OR"
-                case _:
-                    raise Exception(f"Invalid operator {operator}")
-        self.write("(")
-        
-        if node.op in self.logical_ops and isinstance(node.left, Variable) and ctx.get("in_logic_exp", False):
-            self.write("(")
-            self.visit(node.left, ctx)
-            self.write(" IS NOT NULL)")
-        else:
-            self.visit(node.left, ctx)
-        self.write(f" {get_operator_equivalent(node.op)} ")
-        
-        if node.op in self.logical_ops and isinstance(node.right, Variable) and ctx.get("in_logic_exp", False):
-            self.write("(")
-            self.visit(node.right, ctx)
-            self.write(" IS NOT NULL)")
-        else:
-            self.visit(node.right, ctx)
-        self.write(")")
-    
-    def create_chained_binop_node(self, args: list[ASTNode], operator: TokenType) -> BinOp:
-        if len(args) == 1:
-            return args[0]
-        return BinOp(args[0], operator, self.create_chained_binop_node(args[1:], operator))
+            return dialect.concat((node.left, node.right), ctx)
+        types = ctx.get("types")
+        if node.op == TokenType.PLUS and types is not None and types.type_of(node) is STRING:
+            # Text added to text is joined, not summed
+            return dialect.add_text(node, ctx)
+        emit = dialect.binops.get(node.op)
+        if emit is not None:
+            return emit(node, ctx)
+        operator = sql_operators.get(node.op)
+        if operator is None:
+            raise Exception(f"Invalid operator {node.op}")
+        if node.op in self.logical_ops:
+            return (["("] + logical_operand(node.left, ctx) + [f" {operator} "]
+                    + logical_operand(node.right, ctx) + [")"])
+        return ["(", (node.left, ctx), f" {operator} ", (node.right, ctx), ")"]
     
-    def visit_function_call(self, node: FunctionCall, ctx: dict[any, any]) -> None:
-        ctx = ctx.copy()
+    def visit_function_call(self, node: FunctionCall, ctx: dict[any, any]) -> List[Part]:
         """Transpile a function call node to SQL
 
+        The function is looked up in `functions.library`, and emitted the way
+        the dialect spells it if the dialect has its own form; functions the
+        library does not know are passed through as SQL calls of the same name.
+
         Args:
             node (FunctionCall): the function call node
             ctx (dict[any, any]): the context
+
+        Raises:
+            Exception: When a known function gets the wrong number of arguments
         """
-        def visit_chained_operator(args: list[ASTNode], operator: str):
-            self.write("(")
-            self.visit(args[0], ctx)
-            for i in range(1, len(args)):
-                self.write(f" {operator} ") 
-                self.visit(args[i], ctx)
-            self.write(")")
-            
-        if node.name == "IF":
-            # Transpile to SQL
-            if not ctx.get("in_if", False):
-                self.write("CASE")
-                self.indent += 1
-                self.write("WHEN ",nl=True,indent=True)
-            else:
-                self.write("WHEN ",nl=True,indent=True)
-            
-            ctx["in_logic_exp"] = True
-            self.visit(node.args[0], ctx)
-            del ctx["in_logic_exp"]
-            
-            self.write(" THEN ",indent=False)
-            self.indent += 1
-            self.visit(node.args[1], ctx)
-            self.indent -= 1
-            if isinstance(node.args[2], FunctionCall):
-                if node.args[2].name == "IF":
-                    # Nested IF, should be transpiled to a nested CASE WHEN
-                    self.visit(node.args[2], {"in_if": True})
-            else:
-                self.write("ELSE ",nl=True, indent=True)
-
-                self.visit(node.args[2], ctx)
-                self.indent -= 1
-            if not ctx.get("in_if", False):
-                self.indent -= 1
-                self.write("END",nl=True,indent=True)
-        elif node.name == "ADD":
-            visit_chained_operator(node.args, "+")
-        elif node.name == "AND":
-            ctx["in_logic_exp"] = True
-            self.visit(self.create_chained_binop_node(node.args, TokenType.AND), ctx)
-        elif node.name == "OR":
-            ctx["in_logic_exp"] = True
-            self.visit(self.create_chained_binop_node(node.args, TokenType.OR), ctx)
-        elif node.name == "XOR":
-            visit_chained_operator(node.args, "XOR")
-        elif node.name == "NOT":
-            self.write("(")
-            self.visit(node.args[0], ctx)
-            self.write(" = 0)")
-        elif node.name == "TRUE":
-            self.write("1")
-        elif node.name == "FALSE":
-            self.write("0")
-        elif node.name == "LEN":
-            self.write("LENGTH(")
-            self.visit(node.args[0], ctx)
-            self.write(")")
-        elif node.name == "FIND":
-            self.write("INSTR(")
-            self.visit(node.args[1], ctx)
-            self.write(", ")
-            self.visit(node.args[0], ctx)
-            self.write(")")
-        elif node.name == "CONCATENATE":
-            self.write("CONCAT(")
-            self.visit(node.args[0], ctx)
-            self.write(", ")
-            self.visit(node.args[1], ctx)
-            self.write(")")
-        elif node.name == "SUBSTITUTE":
-            self.write("REPLACE(")
-            self.visit(node.args[0], ctx)
-            self.write(", ")
-            self.visit(node.args[1], ctx)
-            self.write(", ")
-            self.visit(node.args[2], ctx)
-            self.write(")")
-        elif node.name == "DATETIME_DIFF":
-            self.write("DATEDIFF(")
-            self.visit(node.args[0], ctx)
-            self.write(", ")
-            self.visit(node.args[1], ctx)
-            self.write(")")
-        elif node.name == "TODAY":
-            self.write("CURRENT_DATE")
-        elif node.name == "IS_BEFORE":
-            self.write("(")
-            self.visit(node.args[0], ctx)
-            self.write(" < ")
-            self.visit(node.args[1], ctx)
-            self.write(")")
-        elif node.name == "IS_BLANK":
-            self.write("(")
-            self.visit(node.args[0], ctx)
-            self.write(" IS NULL)")
-        else:
-            self.write(f"{node.name}(")
-            for i, arg in enumerate(node.args):
-                self.visit(arg, ctx)
-                if i < len(node.args) - 1:
-                    self.write(", ")
-            self.write(")")
-
-    def visit_unop(self, node: UnOp, ctx: dict[any, any]) -> None:
-        self.write(f"{node.op.value}")
-        self.visit(node.right)
-
-    def visit_number(self, node: Number, ctx: dict[any, any]) -> None:
-        if int(node.value) == node.value:
-            self.write(str(int(node.value)))
-            return 
-        self.write(str(node.value))
-
-    def visit_string(self, node: String, ctx: dict[any, any]) -> None:
-        self.write(f'"{node.value}"')
-
-    def visit_array(self, node: Array, ctx: dict[any, any]) -> None:
-        self.write("[")
-        for i, item in enumerate(node.items):
-            self.visit(item)
-            if i < len(node.items) - 1:
-                self.write(", ")
-        self.write("]")
-
-    def visit_variable(self, node: Variable, ctx: dict[any, any]) -> None:
-        new_name = node.name.replace(" ", "_")
-        self.write(new_name)
\ No newline at end of file
+        definition = library.get(node.name)
+        if definition is None:
+            return sql_call(node.name)(node, ctx)
+        definition.check_arity(len(node.args))
+        emit = ctx.get("dialect", generic).functions.get(node.name, definition.emit)
+        return emit(node, ctx)
+
+    def visit_unop(self, node: UnOp, ctx: dict[any, any]) -> List[Part]:
+        if node.op != TokenType.MINUS:
+            raise Exception(f"Invalid operator {node.op}")
+        return ["-"] + ctx.get("dialect", generic).number(node.right, ctx)
+
+    def visit_number(self, node: Number, ctx: dict[any, any]) -> List[Part]:
+        if node.value is None:
+            return ["NULL"]
+        # Whole numbers are integers, in the SQL text and as parameters alike
+        value = int(node.value) if int(node.value) == node.value else node.value
+        params = ctx.get("params")
+        if params is not None:
+            return [ctx.get("dialect", generic).parameter(value, params)]
+        return [str(value)]
+
+    def visit_string(self, node: String, ctx: dict[any, any]) -> List[Part]:
+        dialect = ctx.get("dialect", generic)
+        params = ctx.get("params")
+        if params is not None:
+            return [dialect.parameter(dialect.text(node.value), params)]
+        return [dialect.string(node.value)]
+
+    def visit_array(self, node: Array, ctx: dict[any, any]) -> List[Part]:
+        return ctx.get("dialect", generic).array(node, ctx)
+
+    def visit_variable(self, node: Variable, ctx: dict[any, any]) -> List[Part]:
+        return [ctx.get("dialect", generic).identifier(column_name(node.name))]
+
+    # Node type to visitor, looked up once per node
+    visitors = {
+        BinOp: visit_binop,
+        UnOp: visit_unop,
+        Number: visit_number,
+        String: visit_string,
+        FunctionCall: visit_function_call,
+        Variable: visit_variable,
+        Array: visit_array,
+        Subexpression: lambda self, node, ctx: [node.name],
+        Condition: lambda self, node, ctx: condition_sql(node, ctx),
+    }
@@ -0,0 +1,172 @@
+from typing import Any, Callable, Dict, List, Mapping, NamedTuple, Optional, Tuple, Union
+
+from lexer import TokenType
+from parse import ASTNode, Array, BinOp, FunctionCall, Number, String, UnOp, Variable
+from functions import library
+from valuetypes import (ANY, ARRAY, BOOLEAN, DATE, NULL, NUMBER, STRING, Signature, ValueType, accepts, numeric,
+                        unify, value_type)
+
+
+comparison_ops = frozenset((TokenType.EQ, TokenType.NE, TokenType.LT, TokenType.LE, TokenType.GT, TokenType.GE))
+ordering_ops = frozenset((TokenType.LT, TokenType.LE, TokenType.GT, TokenType.GE))
+
+
+class Mismatch(NamedTuple):
+    """An operand or argument whose type the operation does not accept
+
+    Attributes:
+        node (ASTNode): The operation or call
+        expected (ValueType): The type it needs
+        found (ValueType): The operand's type
+        message (str): A readable description
+    """
+    node: ASTNode
+    expected: ValueType
+    found: ValueType
+    message: str
+
+
+class TypeChecker:
+    """Infers the type of every node of a tree
+
+    Each node is typed once, after its children, with an explicit stack, so
+    a tree of any depth is typed in linear time; interned subtrees shared by
+    several parents are typed once. Types are kept per node, for `type_of`,
+    and operands the operation cannot use are collected in `mismatches`.
+    One checker may type several trees against the same schema.
+
+    Args:
+        schema (Mapping[str, ValueType | str] | None): Field name to type, as
+            a `ValueType` or its value, e.g. "number"; fields missing from it
+            are ANY
+    """
+    def __init__(self, schema: Optional[Mapping[str, Union[ValueType, str]]] = None) -> None:
+        self.schema: Dict[str, ValueType] = {name: ValueType(kind) for name, kind in (schema or {}).items()}
+        # id(node) to (node, type); the node is kept so that its id stays unique
+        self.types: Dict[int, Tuple[ASTNode, ValueType]] = {}
+        self.mismatches: List[Mismatch] = []
+
+    def infer(self, root: ASTNode) -> ValueType:
+        """Type `root` and every node below it
+
+        Returns:
+            ValueType: The type of `root`
+        """
+        types = self.types
+        stack: List[Tuple[ASTNode, bool]] = [(root, False)]
+        while stack:
+            node, visited = stack.pop()
+            if id(node) in types:
+                continue
+            if visited:
+                rule = self.rules.get(type(node))
+                kind = rule(self, node, [types[id(child)][1] for child in node.children()]) if rule else ANY
+                types[id(node)] = (node, kind)
+            else:
+                stack.append((node, True))
+                stack.extend((child, False) for child in node.children())
+        return types[id(root)][1]
+
+    def type_of(self, node: ASTNode) -> ValueType:
+        """The type of `node`, typing it and its subtree first if needed, so
+        that a caller asking about a few nodes only pays for those subtrees"""
+        typed = self.types.get(id(node))
+        return typed[1] if typed is not None else self.infer(node)
+
+    def mismatch(self, node: ASTNode, expected: ValueType, found: ValueType, what: str) -> ValueType:
+        self.mismatches.append(Mismatch(node, expected, found, f"{what} expects {expected.value}, got {found.value}"))
+        return ANY
+
+    def infer_literal(self, node: Union[Number, String], children: List[ValueType]) -> ValueType:
+        return value_type(node.value)
+
+    def infer_variable(self, node: Variable, children: List[ValueType]) -> ValueType:
+        return self.schema.get(node.name, ANY)
+
+    def infer_array(self, node: Array, children: List[ValueType]) -> ValueType:
+        return ARRAY
+
+    def infer_unop(self, node: UnOp, children: List[ValueType]) -> ValueType:
+        right = children[0]
+        if right in numeric:
+            return NUMBER
+        if right is NULL or right is ANY:
+            return right
+        return self.mismatch(node, NUMBER, right, "Negation")
+
+    def infer_binop(self, node: BinOp, children: List[ValueType]) -> ValueType:
+        op = node.op
+        left, right = children
+        if op == TokenType.AMPERSAND:
+            return STRING
+        if op == TokenType.AND or op == TokenType.OR:
+            return BOOLEAN
+        if op in comparison_ops:
+            if op in ordering_ops and not (accepts(left, right) or accepts(right, left)):
+                self.mismatch(node, left, right, f"Comparison with {left.value}")
+            return BOOLEAN
+        if op == TokenType.DOT:
+            return ANY
+        if left is ANY or right is ANY:
+            return ANY
+        if left is NULL or right is NULL:
+            return NULL
+        if left in numeric and right in numeric:
+            return NUMBER
+        if op == TokenType.PLUS:
+            # Text added to text is joined, as the evaluator does
+            if left is STRING and right is STRING:
+                return STRING
+            if (left is DATE and right in numeric) or (left in numeric and right is DATE):
+                return DATE
+        elif op == TokenType.MINUS and left is DATE:
+            if right is DATE:
+                return NUMBER
+            if right in numeric:
+                return DATE
+        found = left if left not in numeric else right
+        return self.mismatch(node, NUMBER, found, "Arithmetic")
+
+    def infer_function_call(self, node: FunctionCall, children: List[ValueType]) -> ValueType:
+        if node.name == "IF":
+            if len(children) < 2:
+                return ANY
+            return unify(children[1], children[2] if len(children) > 2 else NULL)
+        definition = library.get(node.name)
+        signature = definition.signature if definition is not None else None
+        if signature is None:
+            return ANY
+        params = signature.params
+        for i, found in enumerate(children):
+            if not params:
+                break
+            expected = params[min(i, len(params) - 1)]
+            if not accepts(expected, found):
+                self.mismatch(node, expected, found, f"{node.name} argument {i + 1}")
+        return signature.returns
+
+    # Node type to inference rule; node types missing here are ANY
+    rules: Dict[type, Callable[["TypeChecker", Any, List[ValueType]], ValueType]] = {
+        Number: infer_literal,
+        String: infer_literal,
+        Variable: infer_variable,
+        Array: infer_array,
+        UnOp: infer_unop,
+        BinOp: infer_binop,
+        FunctionCall: infer_function_call,
+    }
+
+
+def infer_types(root: ASTNode, schema: Optional[Mapping[str, Union[ValueType, str]]] = None) -> TypeChecker:
+    """Type every node of `root` with a fresh `TypeChecker`
+
+    Args:
+        root (ASTNode): The tree to type
+        schema (Mapping[str, ValueType | str] | None): Field name to type
+
+    Returns:
+        TypeChecker: The checker, holding each node's type and the mismatches
+    """
+    checker = TypeChecker(schema)
+    checker.infer(root)
+    return checker
@@ -0,0 +1,252 @@
+from typing import Any, Dict, Iterable, List, NamedTuple, Optional, Set, Tuple
+
+from lexer import TokenStream, TokenType, group_codes, kinds_by_code, master_pattern
+from parse import precedences
+from functions import library
+
+
+class Diagnostic(NamedTuple):
+    """One problem found in a formula
+
+    Attributes:
+        code (str): What kind of problem: "invalid-character",
+            "unterminated-string", "unterminated-field", "unexpected-token"
+            or "arity"
+        message (str): A readable description
+        start (int): Source offset where the problem starts
+        end (int): Source offset where it ends
+        expected (str | None): What the grammar allowed there, if it applies
+        found (str | None): The token kind found instead, "EOF" at the end
+    """
+    code: str
+    message: str
+    start: int
+    end: int
+    expected: Optional[str] = None
+    found: Optional[str] = None
+
+    def as_dict(self) -> Dict[str, Any]:
+        return self._asdict()
+
+
+SKIP = TokenType.SKIP.value
+EOF = TokenType.EOF.value
+NUMBER, STRING, NULL = TokenType.NUMBER.value, TokenType.STRING.value, TokenType.NULL.value
+VARIABLE_NAME, ID, MINUS = TokenType.VARIABLE_NAME.value, TokenType.ID.value, TokenType.MINUS.value
+LPAREN, RPAREN = TokenType.LPAREN.value, TokenType.RPAREN.value
+LBRACK, RBRACK = TokenType.LBRACK.value, TokenType.RBRACK.value
+COMMA, LBRACE = TokenType.COMMA.value, TokenType.LBRACE.value
+operator_codes = frozenset(kind.value for kind in precedences)
+operand_codes = frozenset((NUMBER, STRING, NULL, VARIABLE_NAME, ID, MINUS, LPAREN, LBRACK))
+
+# Open brackets, as [kind, closing code, start offset, function name, items]
+CALL, ARRAY, PAREN = range(3)
+
+
+def scan(code: str, diagnostics: List[Diagnostic], reported: Set[int]) -> TokenStream:
+    """Lex `code`, reporting each run of characters no token matches and
+    carrying on after it
+
+    The index of the token after each such run is added to `reported`: a
+    syntax error there is most likely the same problem.
+    """
+    stream = TokenStream(code)
+    kinds, starts, ends = stream.kinds, stream.starts, stream.ends
+    match_at = master_pattern.match
+    pos, end = 0, len(code)
+    while pos < end:
+        match = match_at(code, pos)
+        if match is None:
+            bad = pos
+            while pos < end and match_at(code, pos) is None:
+                pos += 1
+            if code[bad] in "\"'":
+                # Everything after the quote is the string's; stand a string
+                # token in for it
+                diagnostics.append(Diagnostic("unterminated-string", "Unterminated string literal", bad, end))
+                kinds.append(STRING)
+                starts.append(bad)
+                ends.append(end)
+                reported.add(len(kinds))
+                break
+            diagnostics.append(Diagnostic("invalid-character", f"Invalid character {code[bad:pos]!r}", bad, pos))
+            reported.add(len(kinds))
+            continue
+        kind_code = group_codes[match.lastindex]
+        start, pos = match.span()
+        if kind_code != SKIP:
+            kinds.append(kind_code)
+            starts.append(start)
+            ends.append(pos)
+    return stream
+
+def kind_name(kind_code: int) -> str:
+    return kinds_by_code[kind_code].name if kind_code != EOF else "EOF"
+
+def check_syntax(stream: TokenStream, diagnostics: List[Diagnostic], max_errors: int,
+                 reported: Set[int] = frozenset()) -> None:
+    """Check `stream` against the grammar of `parse.Parser`, recovering after
+    each error at the next comma or closing bracket of an open call or array
+
+    Errors at the token indexes in `reported` (the token count for the end)
+    are recovered from without adding a diagnostic.
+    """
+    kinds, starts, ends = stream.kinds, stream.starts, stream.ends
+    count = len(kinds)
+    if count == 0:
+        return
+    end_offset = len(stream.source)
+    kind_at = lambda i: kinds[i] if i < count else EOF
+    brackets: List[List[Any]] = []
+    pos = 0
+    expect_operand = True
+    errors = 0
+
+    def close(bracket: List[Any], at: int) -> None:
+        nonlocal errors
+        if bracket[0] == CALL:
+            definition = library.get(bracket[3])
+            error = definition.arity_error(bracket[4]) if definition is not None else None
+            if error is not None:
+                diagnostics.append(Diagnostic("arity", error, bracket[2], ends[at]))
+                errors += 1
+
+    while True:
+        kind = kind_at(pos)
+        if expect_operand:
+            if kind in operand_codes:
+                if kind == MINUS:
+                    pos += 1
+                    continue
+                expect_operand = False
+                if kind == ID and kind_at(pos + 1) == LPAREN:
+                    name = stream.source[starts[pos]:ends[pos]].upper()
+                    if kind_at(pos + 2) == RPAREN:
+                        close([CALL, RPAREN, starts[pos], name, 0], pos + 2)
+                        pos += 3
+                    else:
+                        brackets.append([CALL, RPAREN, starts[pos], name, 1])
+                        pos += 2
+                        expect_operand = True
+                elif kind == LPAREN:
+                    brackets.append([PAREN, RPAREN, starts[pos], None, 0])
+                    pos += 1
+                    expect_operand = True
+                elif kind == LBRACK:
+                    if kind_at(pos + 1) == RBRACK:
+                        pos += 2
+                    else:
+                        brackets.append([ARRAY, RBRACK, starts[pos], None, 1])
+                        pos += 1
+                        expect_operand = True
+                else:
+                    pos += 1
+                continue
+            expected = "an operand"
+        else:
+            if kind in operator_codes:
+                pos += 1
+                expect_operand = True
+                continue
+            if not brackets:
+                if kind == EOF:
+                    return
+                expected = "an operator or the end of the formula"
+            else:
+                bracket = brackets[-1]
+                if bracket[0] != PAREN:
+                    # Commas between items are optional, as in the parser
+                    if kind == COMMA:
+                        pos += 1
+                    if kind_at(pos) == bracket[1]:
+                        close(bracket, pos)
+                        brackets.pop()
+                        pos += 1
+                    else:
+                        bracket[4] += 1
+                        expect_operand = True
+                    continue
+                if kind == RPAREN:
+                    brackets.pop()
+                    pos += 1
+                    continue
+                expected = "')'"
+
+        # An error at `pos`: report it, then skip to where parsing can resume
+        if pos not in reported:
+            if kind == LBRACE:
+                diagnostics.append(Diagnostic("unterminated-field", "Unterminated field reference",
+                                              starts[pos], end_offset, expected, kind_name(kind)))
+            else:
+                found = "end of formula" if kind == EOF else repr(stream.source[starts[pos]:ends[pos]])
+                diagnostics.append(Diagnostic("unexpected-token", f"Unexpected {found}, expected {expected}",
+                                              starts[pos] if kind != EOF else end_offset,
+                                              ends[pos] if kind != EOF else end_offset, expected, kind_name(kind)))
+            errors += 1
+            if errors >= max_errors:
+                return
+        while True:
+            kind = kind_at(pos)
+            if kind == EOF:
+                return
+            if not brackets:
+                if kind in operand_codes:
+                    expect_operand = True
+                    break
+            elif kind == COMMA and brackets[-1][0] != PAREN:
+                # The item is abandoned; resume with the next one
+                pos += 1
+                if kind_at(pos) == brackets[-1][1]:
+                    brackets.pop()
+                    pos += 1
+                    expect_operand = False
+                else:
+                    brackets[-1][4] += 1
+                    expect_operand = True
+                break
+            else:
+                closed = next((depth for depth in range(len(brackets) - 1, -1, -1)
+                               if brackets[depth][1] == kind), None)
+                if closed is not None:
+                    del brackets[closed:]
+                    pos += 1
+                    expect_operand = False
+                    break
+            pos += 1
+
+def validate(code: str, max_errors: int = 10) -> List[Diagnostic]:
+    """Every problem found in `code`, without raising or printing
+
+    Lexing and parsing carry on after an error, so one pass reports several
+    problems, up to `max_errors`. Unlike a parse, no tree is built. A formula
+    the parser accepts gets no diagnostics other than "arity", for a known
+    function called with the wrong number of arguments, which the transpiler
+    rejects.
+
+    Args:
+        code (str): The formula source
+        max_errors (int): Stop after this many diagnostics
+
+    Returns:
+        list[Diagnostic]: The problems, in source order; empty if there are none
+    """
+    diagnostics: List[Diagnostic] = []
+    reported: Set[int] = set()
+    stream = scan(code, diagnostics, reported)
+    if len(diagnostics) < max_errors:
+        check_syntax(stream, diagnostics, max_errors - len(diagnostics), reported)
+    diagnostics.sort(key=lambda diagnostic: diagnostic.start)
+    return diagnostics[:max_errors]
+
+def validate_many(formulas: Iterable[str], max_errors: int = 10) -> List[Optional[List[Tuple[str, int, int, str]]]]:
+    """Validate many formulas, with compact results
+
+    Returns:
+        list: For each formula, in order, None if it is valid, or else its
+            diagnostics as (code, start, end, message) tuples
+    """
+    results: List[Optional[List[Tuple[str, int, int, str]]]] = []
+    for code in formulas:
+        diagnostics = validate(code, max_errors)
+        results.append([(d.code, d.start, d.end, d.message) for d in diagnostics] if diagnostics else None)
+    return results
@@ -0,0 +1,64 @@
+from enum import Enum
+from typing import Any, NamedTuple, Tuple
+
+
+class ValueType(Enum):
+    """The static type of a formula value
+
+    ANY is an unknown type, e.g. a field with no schema entry or a function
+    the library does not know; it is compatible with every other type.
+    """
+    NUMBER = "number"
+    STRING = "string"
+    BOOLEAN = "boolean"
+    DATE = "date"
+    NULL = "null"
+    ARRAY = "array"
+    ANY = "any"
+
+NUMBER, STRING, BOOLEAN = ValueType.NUMBER, ValueType.STRING, ValueType.BOOLEAN
+DATE, NULL, ARRAY, ANY = ValueType.DATE, ValueType.NULL, ValueType.ARRAY, ValueType.ANY
+
+# Types that behave as numbers in arithmetic: booleans are 1 and 0
+numeric = frozenset((NUMBER, BOOLEAN))
+
+# (expected, found) pairs accepted without a conversion the user should know about
+coercions = frozenset(((NUMBER, BOOLEAN), (BOOLEAN, NUMBER), (DATE, STRING)))
+
+def value_type(value: Any) -> ValueType:
+    """The type of a literal or evaluated value"""
+    if value is None:
+        return NULL
+    if isinstance(value, bool):
+        return BOOLEAN
+    if isinstance(value, (int, float)):
+        return NUMBER
+    if isinstance(value, str):
+        return STRING
+    return ANY
+
+def accepts(expected: ValueType, found: ValueType) -> bool:
+    """Whether a value of type `found` may be used where `expected` is"""
+    return expected is found or expected is ANY or found is ANY or found is NULL or (expected, found) in coercions
+
+def unify(first: ValueType, second: ValueType) -> ValueType:
+    """The type of a value that is either `first` or `second`, e.g. an IF"""
+    if first is second or second is NULL:
+        return first
+    if first is NULL:
+        return second
+    if first in numeric and second in numeric:
+        return NUMBER
+    return ANY
+
+
+class Signature(NamedTuple):
+    """The types a function takes and returns
+
+    Attributes:
+        params (tuple[ValueType, ...]): The expected type of each argument;
+            the last one applies to any further arguments
+        returns (ValueType): The result type
+    """
+    params: Tuple[ValueType, ...]
+    returns: ValueType
@@ -0,0 +1,284 @@
+from typing import Any, Callable, Dict, List, Mapping, Optional, Tuple
+
+import numpy as np
+
+from lexer import TokenType
+from parse import ASTNode, BinOp, UnOp, Number, String, FunctionCall, Variable, Array
+from evaluator import binary_ops, call, functions, interpret, to_text, truthy
+
+# A column is a pair of arrays: the values, and a boolean mask that is True
+# where the value is blank. Either may be 0-d, which broadcasts like a scalar.
+# Values under the mask are meaningless and must never be relied on.
+Column = Tuple[np.ndarray, np.ndarray]
+
+NO_NULLS = np.bool_(False)
+
+
+def is_numeric(values: np.ndarray) -> bool:
+    return values.dtype.kind in "biuf"
+
+def as_number(values: np.ndarray) -> np.ndarray:
+    """Booleans as 0.0 and 1.0, as Python treats them in arithmetic; NumPy
+    would keep bool results and has no boolean subtraction or negation"""
+    return values.astype(float) if values.dtype.kind == "b" else values
+
+def is_text(values: np.ndarray) -> bool:
+    return values.dtype.kind == "U"
+
+def to_column(data: Any) -> Column:
+    """Convert one input array into a column
+
+    Blanks come from the mask of a masked array, None entries of an object
+    array, or NaN entries of a float array. Object arrays holding only text or
+    only numbers are converted to the matching native dtype.
+    """
+    if isinstance(data, np.ma.MaskedArray):
+        null = np.ma.getmaskarray(data)
+        data = data.data
+    else:
+        data = np.asarray(data)
+        null = np.zeros(data.shape, dtype=bool)
+    if data.dtype.kind == "f":
+        null = null | np.isnan(data)
+    elif data.dtype.kind == "O":
+        null = null | np.equal(data, None)
+        present = data[~null]
+        if all(isinstance(value, str) for value in present):
+            data = np.where(null, "", data).astype(str)
+        elif all(isinstance(value, (int, float)) and not isinstance(value, bool) for value in present):
+            data = np.where(null, 0.0, data).astype(float)
+    elif data.dtype.kind in "iu":
+        data = data.astype(float)
+    return data, null
+
+def literal(value: Any) -> Column:
+    if value is None:
+        return np.asarray(0.0), np.bool_(True)
+    return np.asarray(value), NO_NULLS
+
+def to_python(column: Column, length: int) -> List[Any]:
+    values, null = column
+    values = np.broadcast_to(values, (length,)).tolist()
+    null = np.broadcast_to(null, (length,))
+    return [None if blank else value for value, blank in zip(values, null)]
+
+def from_python(results: List[Any]) -> Column:
+    null = np.fromiter((value is None for value in results), dtype=bool, count=len(results))
+    present = [value for value in results if value is not None]
+    if all(isinstance(value, str) for value in present):
+        values = np.array(["" if value is None else value for value in results], dtype=str)
+    elif all(isinstance(value, (bool, int, float)) for value in present):
+        values = np.array([0.0 if value is None else value for value in results], dtype=float)
+    else:
+        values = np.empty(len(results), dtype=object)
+        for index, value in enumerate(results):
+            values[index] = value
+    return values, null
+
+
+def column_truthy(column: Column) -> np.ndarray:
+    values, null = column
+    if is_text(values):
+        result = values != ""
+    elif values.dtype.kind == "f":
+        result = (values != 0) & ~np.isnan(values)
+    elif is_numeric(values):
+        result = values != 0
+    elif values.dtype.kind == "O":
+        result = np.asarray(np.frompyfunc(truthy, 1, 1)(values)).astype(bool)
+    else:
+        result = np.ones(values.shape, dtype=bool)
+    return result & ~null
+
+def column_text(column: Column) -> np.ndarray:
+    """The text form of a column, with blanks as empty strings"""
+    values, null = column
+    if not is_text(values):
+        values = np.asarray(np.frompyfunc(to_text, 1, 1)(values)).astype(str)
+    return np.where(null, "", values)
+
+def unify(first: np.ndarray, second: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Make two value arrays safe to combine with `np.where`"""
+    if (is_numeric(first) and is_numeric(second)) or (is_text(first) and is_text(second)):
+        return first, second
+    return first.astype(object), second.astype(object)
+
+
+arithmetic_ufuncs: Dict[TokenType, Callable[..., np.ndarray]] = {
+    TokenType.PLUS: np.add,
+    TokenType.MINUS: np.subtract,
+    TokenType.MUL: np.multiply,
+    TokenType.DIV: np.divide,
+}
+comparison_ufuncs: Dict[TokenType, Callable[..., np.ndarray]] = {
+    TokenType.EQ: np.equal,
+    TokenType.NE: np.not_equal,
+    TokenType.LT: np.less,
+    TokenType.LE: np.less_equal,
+    TokenType.GT: np.greater,
+    TokenType.GE: np.greater_equal,
+}
+
+
+class VectorEvaluator:
+    """Evaluates an AST over a whole batch of records at once
+
+    Args:
+        columns (Mapping[str, np.ndarray]): field name to column of values;
+            fields the formula references but the batch lacks are all blank
+        length (int): the number of records in the batch
+    """
+    def __init__(self, columns: Mapping[str, Any], length: int) -> None:
+        self.columns = columns
+        self.length = length
+        self.converted: Dict[str, Column] = {}
+
+    def visit(self, node: ASTNode) -> Column:
+        if isinstance(node, (Number, String)):
+            return literal(node.value)
+        elif isinstance(node, Variable):
+            return self.visit_variable(node)
+        elif isinstance(node, BinOp):
+            return self.visit_binop(node)
+        elif isinstance(node, UnOp):
+            values, null = self.visit(node.right)
+            if not is_numeric(values):
+                return values, np.ones(values.shape, dtype=bool)
+            return -as_number(values), null
+        elif isinstance(node, FunctionCall):
+            return self.visit_function_call(node)
+        elif isinstance(node, Array):
+            return self.row_wise(lambda *elements: list(elements), node.elements)
+        raise Exception(f"Invalid node {node}")
+
+    def visit_variable(self, node: Variable) -> Column:
+        column = self.converted.get(node.name)
+        if column is None:
+            if node.name in self.columns:
+                column = to_column(self.columns[node.name])
+            else:
+                column = literal(None)
+            self.converted[node.name] = column
+        return column
+
+    def visit_binop(self, node: BinOp) -> Column:
+        if node.op == TokenType.AMPERSAND:
+            return np.char.add(column_text(self.visit(node.left)), column_text(self.visit(node.right))), NO_NULLS
+        if node.op in (TokenType.AND, TokenType.OR):
+            left, right = column_truthy(self.visit(node.left)), column_truthy(self.visit(node.right))
+            return (left & right if node.op == TokenType.AND else left | right), NO_NULLS
+
+        (left, left_null), (right, right_null) = self.visit(node.left), self.visit(node.right)
+        null = left_null | right_null
+        numeric = is_numeric(left) and is_numeric(right)
+        text = is_text(left) and is_text(right)
+        if numeric:
+            left, right = as_number(left), as_number(right)
+        if node.op in arithmetic_ufuncs:
+            if numeric:
+                with np.errstate(divide="ignore", invalid="ignore"):
+                    values = arithmetic_ufuncs[node.op](left, right)
+                if node.op == TokenType.DIV:
+                    null = null | (right == 0)
+                return values, null
+            if text and node.op == TokenType.PLUS:
+                return np.char.add(left, right), null
+        elif node.op in comparison_ufuncs:
+            if numeric or text or left.dtype.kind == right.dtype.kind == "M":
+                return comparison_ufuncs[node.op](left, right), null
+            # Numbers and text are never equal and have no order
+            if (is_numeric(left) and is_text(right)) or (is_text(left) and is_numeric(right)):
+                shape = np.broadcast_shapes(left.shape, right.shape)
+                if node.op in (TokenType.EQ, TokenType.NE):
+                    return np.full(shape, node.op == TokenType.NE), null
+                return np.zeros(shape, dtype=bool), np.ones(shape, dtype=bool)
+        else:
+            raise Exception(f"Invalid operator {node.op}")
+        return self.row_wise_op(node)
+
+    def visit_function_call(self, node: FunctionCall) -> Column:
+        name, args = node.name, node.args
+        if name == "IF" and len(args) in (2, 3):
+            condition = column_truthy(self.visit(args[0]))
+            then, then_null = self.visit(args[1])
+            otherwise, otherwise_null = self.visit(args[2]) if len(args) == 3 else literal(None)
+            then, otherwise = unify(then, otherwise)
+            return np.where(condition, then, otherwise), np.where(condition, then_null, otherwise_null)
+        elif name in ("AND", "OR"):
+            result = np.bool_(name == "AND")
+            for arg in args:
+                result = (result & column_truthy(self.visit(arg))) if name == "AND" else (result | column_truthy(self.visit(arg)))
+            return result, NO_NULLS
+        elif name == "NOT" and len(args) == 1:
+            return ~column_truthy(self.visit(args[0])), NO_NULLS
+        elif name in ("TRUE", "FALSE") and not args:
+            return np.bool_(name == "TRUE"), NO_NULLS
+        elif name == "IS_BLANK" and len(args) == 1:
+            values, null = self.visit(args[0])
+            return (null | (values == "") if is_text(values) else null), NO_NULLS
+        elif name == "LEN" and len(args) == 1:
+            values, null = self.visit(args[0])
+            return np.char.str_len(column_text((values, null))).astype(float), null
+        elif name in ("UPPER", "LOWER", "TRIM") and len(args) == 1:
+            values, null = self.visit(args[0])
+            text = column_text((values, null))
+            op = {"UPPER": np.char.upper, "LOWER": np.char.lower, "TRIM": np.char.strip}[name]
+            return op(text), null
+        elif name == "ABS" and len(args) == 1:
+            values, null = self.visit(args[0])
+            if is_numeric(values):
+                return np.abs(as_number(values)), null
+        elif name == "CONCATENATE":
+            result = np.asarray("")
+            for arg in args:
+                result = np.char.add(result, column_text(self.visit(arg)))
+            return result, NO_NULLS
+        if name not in functions:
+            raise Exception(f"Unknown function {name}")
+        return self.row_wise(functions[name], args)
+
+    def row_wise(self, function: Callable[..., Any], args: Tuple[ASTNode, ...]) -> Column:
+        """Fallback for one node: evaluate its arguments as columns, then
+        apply the scalar `function` record by record"""
+        columns = [self.visit(arg) for arg in args]
+        if all(values.ndim == 0 and np.ndim(null) == 0 for values, null in columns):
+            # Constant arguments (including none at all): call the function once
+            values, null = from_python([call(function, [None if null else values.item() for values, null in columns])])
+            return values.reshape(()), null.reshape(())
+        rows = [to_python(column, self.length) for column in columns]
+        return from_python([call(function, values) for values in zip(*rows)])
+
+    def row_wise_op(self, node: BinOp) -> Column:
+        return self.row_wise(binary_ops[node.op], (node.left, node.right))
+
+
+def evaluate_columns(node: ASTNode, columns: Mapping[str, Any], length: Optional[int] = None) -> np.ma.MaskedArray:
+    """Evaluate an AST over a columnar batch of records
+
+    Arithmetic, comparisons, `&`, IF, AND/OR, NOT, LEN, IS_BLANK and a few text
+    functions run as whole-array NumPy operations; any other function is
+    applied row by row with the scalar implementation from `evaluator`, for
+    that node only. Results agree with `evaluator.interpret` applied per record;
+    formulas too deeply nested to visit recursively are evaluated with it.
+
+    Args:
+        node (ASTNode): The root node of the AST
+        columns (Mapping[str, np.ndarray]): field name to column of values
+        length (int | None): the number of records, if no column is given
+
+    Returns:
+        np.ma.MaskedArray: One result per record, masked where the result is blank
+    """
+    if length is None:
+        length = len(next(iter(columns.values()))) if columns else 1
+    try:
+        values, null = VectorEvaluator(columns, length).visit(node)
+    except RecursionError:
+        # Too deeply nested to visit recursively; evaluate record by record
+        # with `interpret`, which walks the tree without recursion
+        fields = {name: to_python(to_column(data), length) for name, data in columns.items()}
+        records = ({name: data[index] for name, data in fields.items()} for index in range(length))
+        values, null = from_python([interpret(node, record) for record in records])
+    values = np.broadcast_to(values, (length,)).copy()
+    null = np.broadcast_to(null, (length,)).copy()
+    return np.ma.MaskedArray(values, mask=null)
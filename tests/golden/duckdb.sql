@@ -0,0 +1,179 @@
+-- TRUE() + 1
+SELECT
+(1 + 1) AS "result"
+FROM r;
+
+-- FALSE() * {a}
+SELECT
+(0 * "a") AS "result"
+FROM r;
+
+-- -TRUE()
+SELECT
+-1 AS "result"
+FROM r;
+
+-- {flag} + 1
+SELECT
+(CAST("flag" AS INTEGER) + 1) AS "result"
+FROM r;
+
+-- TRUE() / 2
+SELECT
+(1 * 1.0 / 2) AS "result"
+FROM r;
+
+-- TRUE() = 1
+SELECT
+(1 = 1) AS "result"
+FROM r;
+
+-- {flag} > 0
+SELECT
+(CAST("flag" AS INTEGER) > 0) AS "result"
+FROM r;
+
+-- {a} = {flag}
+SELECT
+("a" = CAST("flag" AS INTEGER)) AS "result"
+FROM r;
+
+-- {flag} = TRUE()
+SELECT
+("flag" = TRUE) AS "result"
+FROM r;
+
+-- SUM(TRUE(), {flag}, 1)
+SELECT
+(COALESCE(1, 0) + COALESCE(CAST("flag" AS INTEGER), 0) + COALESCE(1, 0)) AS "result"
+FROM r;
+
+-- AVERAGE(TRUE(), 0)
+SELECT
+((COALESCE(1, 0) + COALESCE(0, 0)) * 1.0 / NULLIF((CASE WHEN TRUE IS NULL THEN 0 ELSE 1 END) + (CASE WHEN 0 IS NULL THEN 0 ELSE 1 END), 0)) AS "result"
+FROM r;
+
+-- MIN({a}, {flag})
+SELECT
+LEAST("a", CAST("flag" AS INTEGER)) AS "result"
+FROM r;
+
+-- MAX(TRUE(), 0)
+SELECT
+GREATEST(1, 0) AS "result"
+FROM r;
+
+-- ABS(-{flag})
+SELECT
+ABS(-CAST("flag" AS INTEGER)) AS "result"
+FROM r;
+
+-- ROUND(TRUE())
+SELECT
+ROUND(1) AS "result"
+FROM r;
+
+-- ROUND({a})
+SELECT
+ROUND("a") AS "result"
+FROM r;
+
+-- ROUND({a}, 1)
+SELECT
+ROUND("a", 1) AS "result"
+FROM r;
+
+-- IF({a}, TRUE(), 2)
+SELECT
+CASE
+    WHEN (COALESCE("a", 0) <> 0) THEN 1
+    ELSE 2
+END AS "result"
+FROM r;
+
+-- IF({a}, TRUE(), FALSE())
+SELECT
+CASE
+    WHEN (COALESCE("a", 0) <> 0) THEN TRUE
+    ELSE FALSE
+END AS "result"
+FROM r;
+
+-- {flag} & "x"
+SELECT
+CONCAT(CAST(CAST("flag" AS INTEGER) AS TEXT), 'x') AS "result"
+FROM r;
+
+-- NOT({a})
+SELECT
+(NOT (COALESCE("a", 0) <> 0)) AS "result"
+FROM r;
+
+-- NOT({s})
+SELECT
+(NOT (COALESCE("s", '') <> '')) AS "result"
+FROM r;
+
+-- NOT({flag})
+SELECT
+(NOT ("flag" IS TRUE)) AS "result"
+FROM r;
+
+-- NOT({d})
+SELECT
+(NOT ("d" IS NOT NULL)) AS "result"
+FROM r;
+
+-- NOT({u} + 0)
+SELECT
+(NOT (LTRIM(COALESCE(CAST(("u" + 0) AS TEXT), ''), '-0.') NOT IN ('', 'false', 'NaN', 'nan'))) AS "result"
+FROM r;
+
+-- XOR({a}, {s}, {u})
+SELECT
+(((CASE WHEN (COALESCE("a", 0) <> 0) THEN 1 ELSE 0 END) + (CASE WHEN (COALESCE("s", '') <> '') THEN 1 ELSE 0 END) + (CASE WHEN (LTRIM(COALESCE(CAST("u" AS TEXT), ''), '-0.') NOT IN ('', 'false', 'NaN', 'nan')) THEN 1 ELSE 0 END)) % 2 = 1) AS "result"
+FROM r;
+
+-- AND({flag}, TRUE())
+SELECT
+(("flag" IS TRUE) AND TRUE) AS "result"
+FROM r;
+
+-- IF({s}, 1, 0)
+SELECT
+CASE
+    WHEN (COALESCE("s", '') <> '') THEN 1
+    ELSE 0
+END AS "result"
+FROM r;
+
+-- AND({s}, 1)
+SELECT
+((COALESCE("s", '') <> '') AND (COALESCE(1, 0) <> 0)) AS "result"
+FROM r;
+
+-- OR({u}, 0)
+SELECT
+((LTRIM(COALESCE(CAST("u" AS TEXT), ''), '-0.') NOT IN ('', 'false', 'NaN', 'nan')) OR (COALESCE(0, 0) <> 0)) AS "result"
+FROM r;
+
+-- {a} & "x"
+SELECT
+CONCAT((CASE WHEN "a" = TRUNC("a") THEN CAST(CAST("a" AS BIGINT) AS TEXT) ELSE CAST("a" AS TEXT) END), 'x') AS "result"
+FROM r;
+
+-- LEN({a})
+SELECT
+LENGTH((CASE WHEN "a" = TRUNC("a") THEN CAST(CAST("a" AS BIGINT) AS TEXT) ELSE CAST("a" AS TEXT) END)) AS "result"
+FROM r;
+
+-- CONCATENATE({a}, {n}, {s})
+SELECT
+CONCAT((CASE WHEN "a" = TRUNC("a") THEN CAST(CAST("a" AS BIGINT) AS TEXT) ELSE CAST("a" AS TEXT) END), (CASE WHEN "n" = TRUNC("n") THEN CAST(CAST("n" AS BIGINT) AS TEXT) ELSE CAST("n" AS TEXT) END), "s") AS "result"
+FROM r;
+
+-- UPPER({a} / 4)
+SELECT
+UPPER((CASE WHEN ("a" * 1.0 / 4) = TRUNC(("a" * 1.0 / 4)) THEN CAST(CAST(("a" * 1.0 / 4) AS BIGINT) AS TEXT) ELSE CAST(("a" * 1.0 / 4) AS TEXT) END)) AS "result"
+FROM r;
+
@@ -0,0 +1,179 @@
+-- TRUE() + 1
+SELECT
+(1 + 1) AS "result"
+FROM r;
+
+-- FALSE() * {a}
+SELECT
+(0 * "a") AS "result"
+FROM r;
+
+-- -TRUE()
+SELECT
+-1 AS "result"
+FROM r;
+
+-- {flag} + 1
+SELECT
+("flag" + 1) AS "result"
+FROM r;
+
+-- TRUE() / 2
+SELECT
+(1 * 1.0 / 2) AS "result"
+FROM r;
+
+-- TRUE() = 1
+SELECT
+(1 = 1) AS "result"
+FROM r;
+
+-- {flag} > 0
+SELECT
+("flag" > 0) AS "result"
+FROM r;
+
+-- {a} = {flag}
+SELECT
+("a" = "flag") AS "result"
+FROM r;
+
+-- {flag} = TRUE()
+SELECT
+("flag" = 1) AS "result"
+FROM r;
+
+-- SUM(TRUE(), {flag}, 1)
+SELECT
+(COALESCE(1, 0) + COALESCE("flag", 0) + COALESCE(1, 0)) AS "result"
+FROM r;
+
+-- AVERAGE(TRUE(), 0)
+SELECT
+((COALESCE(1, 0) + COALESCE(0, 0)) * 1.0 / NULLIF((CASE WHEN 1 IS NULL THEN 0 ELSE 1 END) + (CASE WHEN 0 IS NULL THEN 0 ELSE 1 END), 0)) AS "result"
+FROM r;
+
+-- MIN({a}, {flag})
+SELECT
+MIN(COALESCE("a", "flag"), COALESCE("flag", "a")) AS "result"
+FROM r;
+
+-- MAX(TRUE(), 0)
+SELECT
+MAX(COALESCE(1, 0), COALESCE(0, 1)) AS "result"
+FROM r;
+
+-- ABS(-{flag})
+SELECT
+ABS(-"flag") AS "result"
+FROM r;
+
+-- ROUND(TRUE())
+SELECT
+ROUND(1) AS "result"
+FROM r;
+
+-- ROUND({a})
+SELECT
+ROUND("a") AS "result"
+FROM r;
+
+-- ROUND({a}, 1)
+SELECT
+ROUND("a", 1) AS "result"
+FROM r;
+
+-- IF({a}, TRUE(), 2)
+SELECT
+CASE
+    WHEN (COALESCE("a", 0) <> 0) THEN 1
+    ELSE 2
+END AS "result"
+FROM r;
+
+-- IF({a}, TRUE(), FALSE())
+SELECT
+CASE
+    WHEN (COALESCE("a", 0) <> 0) THEN 1
+    ELSE 0
+END AS "result"
+FROM r;
+
+-- {flag} & "x"
+SELECT
+(IFNULL("flag", '') || 'x') AS "result"
+FROM r;
+
+-- NOT({a})
+SELECT
+(NOT (COALESCE("a", 0) <> 0)) AS "result"
+FROM r;
+
+-- NOT({s})
+SELECT
+(NOT (COALESCE("s", '') <> '')) AS "result"
+FROM r;
+
+-- NOT({flag})
+SELECT
+(NOT ("flag" IS TRUE)) AS "result"
+FROM r;
+
+-- NOT({d})
+SELECT
+(NOT ("d" IS NOT NULL)) AS "result"
+FROM r;
+
+-- NOT({u} + 0)
+SELECT
+(NOT (CASE typeof(("u" + 0)) WHEN 'text' THEN ("u" + 0) <> '' WHEN 'null' THEN 0 ELSE ("u" + 0) <> 0 END)) AS "result"
+FROM r;
+
+-- XOR({a}, {s}, {u})
+SELECT
+(((CASE WHEN (COALESCE("a", 0) <> 0) THEN 1 ELSE 0 END) + (CASE WHEN (COALESCE("s", '') <> '') THEN 1 ELSE 0 END) + (CASE WHEN (CASE typeof("u") WHEN 'text' THEN "u" <> '' WHEN 'null' THEN 0 ELSE "u" <> 0 END) THEN 1 ELSE 0 END)) % 2 = 1) AS "result"
+FROM r;
+
+-- AND({flag}, TRUE())
+SELECT
+(("flag" IS TRUE) AND 1) AS "result"
+FROM r;
+
+-- IF({s}, 1, 0)
+SELECT
+CASE
+    WHEN (COALESCE("s", '') <> '') THEN 1
+    ELSE 0
+END AS "result"
+FROM r;
+
+-- AND({s}, 1)
+SELECT
+((COALESCE("s", '') <> '') AND (COALESCE(1, 0) <> 0)) AS "result"
+FROM r;
+
+-- OR({u}, 0)
+SELECT
+((CASE typeof("u") WHEN 'text' THEN "u" <> '' WHEN 'null' THEN 0 ELSE "u" <> 0 END) OR (COALESCE(0, 0) <> 0)) AS "result"
+FROM r;
+
+-- {a} & "x"
+SELECT
+(IFNULL((CASE WHEN typeof("a") = 'real' AND "a" = CAST("a" AS INTEGER) THEN CAST(CAST("a" AS INTEGER) AS TEXT) ELSE "a" END), '') || 'x') AS "result"
+FROM r;
+
+-- LEN({a})
+SELECT
+LENGTH((CASE WHEN typeof("a") = 'real' AND "a" = CAST("a" AS INTEGER) THEN CAST(CAST("a" AS INTEGER) AS TEXT) ELSE "a" END)) AS "result"
+FROM r;
+
+-- CONCATENATE({a}, {n}, {s})
+SELECT
+(IFNULL((CASE WHEN typeof("a") = 'real' AND "a" = CAST("a" AS INTEGER) THEN CAST(CAST("a" AS INTEGER) AS TEXT) ELSE "a" END), '') || IFNULL((CASE WHEN typeof("n") = 'real' AND "n" = CAST("n" AS INTEGER) THEN CAST(CAST("n" AS INTEGER) AS TEXT) ELSE "n" END), '') || IFNULL("s", '')) AS "result"
+FROM r;
+
+-- UPPER({a} / 4)
+SELECT
+UPPER((CASE WHEN typeof(("a" * 1.0 / 4)) = 'real' AND ("a" * 1.0 / 4) = CAST(("a" * 1.0 / 4) AS INTEGER) THEN CAST(CAST(("a" * 1.0 / 4) AS INTEGER) AS TEXT) ELSE ("a" * 1.0 / 4) END)) AS "result"
+FROM r;
+
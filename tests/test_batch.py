@@ -0,0 +1,23 @@
+import io
+import json
+
+from batch import read_formulas, run_batch
+
+
+def test_unreadable_lines_get_error_results():
+    lines = ['"1 + 2"', "{not json", "42", '{"formula": "LEN({a})", "id": 7}', '"(1"', ""]
+    out = io.StringIO()
+    stats = run_batch(lines, out, jsonl=True, workers=1, chunk_size=2)
+    results = [json.loads(line) for line in out.getvalue().splitlines()]
+    assert [result["line"] for result in results] == [1, 2, 3, 4, 5]
+    assert [("error" in result) for result in results] == [False, True, True, False, True]
+    assert results[1]["error"].startswith("Invalid JSON")
+    assert results[3]["id"] == 7 and "LENGTH(a)" in results[3]["sql"]
+    assert (stats.formulas, stats.errors) == (5, 3)
+
+
+def test_plain_lines_are_formulas():
+    assert list(read_formulas(["{a} + 1\n", "\n", "{not json\n"])) == [
+        (1, None, "{a} + 1", None),
+        (3, None, "{not json", None),
+    ]
@@ -0,0 +1,52 @@
+import random
+
+import pytest
+
+from cache import ParseCache, canonicalize
+from lexer import lex_spans
+from parse import Parser
+
+FORMULAS = [
+    'IF({Score} > 50, LEN({Name}) * 2, CONCATENATE({Tag}, "x  y"))',
+    'len({a}) + Len({b}) & "  "',
+    'SUM(1, 2.5, [3, {a b}], AND({b}, OR({c}, NOT({d}))), -(4 - 5) / 6)',
+    '{First Name} & " " & UPPER({Last Name})',
+    "1.5+2*-3<=4",
+]
+
+
+def parse(code):
+    return Parser().parse(lex_spans(code))
+
+
+def respaced(rng, code):
+    """`code` with random whitespace between its tokens"""
+    stream = lex_spans(code)
+    spaces = ["", " ", "  ", "\t", "\n "]
+    return "".join(rng.choice(spaces) + code[start:end] for start, end in zip(stream.starts, stream.ends))
+
+
+@pytest.mark.parametrize("code", FORMULAS)
+def test_canonical_source_parses_the_same(code):
+    rng = random.Random(code)
+    key = canonicalize(code)
+    assert canonicalize(key) == key
+    assert parse(key) == parse(code)
+    for _ in range(20):
+        assert canonicalize(respaced(rng, code)) == key
+
+
+def test_cache_agrees_with_an_uncached_parse():
+    cache = ParseCache()
+    for code in FORMULAS:
+        assert cache.get(code) == parse(code)
+        assert cache.get(" " + code + " ") is cache.get(code)
+    assert cache.stats()["entries"] == len(FORMULAS)
+
+
+def test_function_name_case_is_ignored():
+    cache = ParseCache()
+    assert canonicalize("len({a})") == canonicalize("LEN({a})")
+    assert cache.get("len({a})") is cache.get("LEN({a})")
+    assert cache.get("Len({a})").name == "LEN" == parse("len({a})").name
+    assert cache.stats()["entries"] == 1
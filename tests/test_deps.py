@@ -0,0 +1,56 @@
+import pytest
+
+from deps import FieldIndex, scan_dependencies, tree_dependencies
+from lexer import lex_spans
+from optimize import optimize
+from parse import Parser
+
+FORMULAS = [
+    'IF({Score} > 50, len({Name}) * 2, CONCATENATE({Tag}, "{not a field}"))',
+    'SUM(1, 2.5, [3, {a b}], AND(b, OR({c}, NOT({d}))), -(4 - 5) / 6)',
+    '{First Name} & " " & UPPER({Last Name}) & IF(IS_BLANK({Title}), "", ", " & {Title})',
+    'ROUND(AVERAGE({x}, {y}, MAX({z}, 10)), 2) >= 3.14',
+    'TODAY()',
+    '{a} * 0 + IF(TRUE(), 1, {b})',
+]
+
+
+@pytest.mark.parametrize("code", FORMULAS)
+def test_scan_matches_the_parsed_tree(code):
+    ast = Parser().parse(lex_spans(code))
+    assert scan_dependencies(code) == tree_dependencies(ast)
+    # Optimizing may drop field references, never add them; it may turn
+    # joins into CONCATENATE calls
+    assert tree_dependencies(optimize(ast)).fields <= scan_dependencies(code).fields
+
+
+def test_scan_reads_formulas_that_fail_to_parse():
+    assert scan_dependencies("IF({a}, LEN(b") == ({"a", "b"}, {"IF", "LEN"})
+    assert tree_dependencies(None) == (frozenset(), frozenset())
+    with pytest.raises(Exception):
+        scan_dependencies('{a} & "unterminated')
+
+
+def test_adding_under_an_existing_id_replaces_the_entry():
+    index = FieldIndex.build([(1, "{a} + {b}"), (2, "LEN({b})"), (3, '"bad')])
+    assert len(index) == 2 and 3 not in index
+    assert index.using_field("b") == {1, 2} and index.calling("len") == {2}
+    index.add(2, "UPPER({c})")
+    assert index.dependencies(2) == ({"c"}, {"UPPER"})
+    assert index.using_field("b") == {1} and index.calling("LEN") == frozenset()
+    assert "LEN" not in index.functions and index.using_fields(["a", "c", "x"]) == {1, 2}
+    # A formula that fails to lex leaves the old entry in place
+    with pytest.raises(Exception):
+        index.add(1, '{c} & "bad')
+    assert index.dependencies(1) == ({"a", "b"}, frozenset())
+
+
+def test_removing_drops_empty_postings():
+    index = FieldIndex.build([(1, "{a} + MIN({b})"), (2, "{a}")])
+    index.remove(1)
+    index.remove(1)
+    assert list(index) == [2] and index.fields == {"a": {2}} and index.functions == {}
+    with pytest.raises(KeyError):
+        index.dependencies(1)
+    index.remove(2)
+    assert len(index) == 0 and index.fields == {} and index.using_field("a") == frozenset()
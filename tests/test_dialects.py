@@ -0,0 +1,101 @@
+import math
+import sqlite3
+from pathlib import Path
+
+import pytest
+
+from evaluator import compile_formula, truthy
+from formula import Formula
+from transpiler import Transpiler
+
+GOLDEN = Path(__file__).parent / "golden"
+SCHEMA = {"a": "number", "n": "number", "s": "string", "flag": "boolean", "d": "date"}
+# Formulas whose SQL the engines are picky about: booleans in arithmetic,
+# comparisons and aggregates, numbers as text, and truth tests of every
+# type; {u} is untyped
+FORMULAS = [
+    "TRUE() + 1", "FALSE() * {a}", "-TRUE()", "{flag} + 1", "TRUE() / 2", "TRUE() = 1", "{flag} > 0",
+    "{a} = {flag}", "{flag} = TRUE()", "SUM(TRUE(), {flag}, 1)", "AVERAGE(TRUE(), 0)", "MIN({a}, {flag})",
+    "MAX(TRUE(), 0)", "ABS(-{flag})", "ROUND(TRUE())", "ROUND({a})", "ROUND({a}, 1)", "IF({a}, TRUE(), 2)",
+    "IF({a}, TRUE(), FALSE())", "{flag} & \"x\"", "NOT({a})", "NOT({s})", "NOT({flag})", "NOT({d})",
+    "NOT({u} + 0)", "XOR({a}, {s}, {u})", "AND({flag}, TRUE())", "IF({s}, 1, 0)", "AND({s}, 1)", "OR({u}, 0)",
+    "{a} & \"x\"", "LEN({a})", "CONCATENATE({a}, {n}, {s})", "UPPER({a} / 4)",
+]
+
+
+def render(dialect):
+    transpiler = Transpiler(schema=SCHEMA, dialect=dialect)
+    return "".join(f"-- {code}\n{transpiler.transpile(Formula(code).ast, 'r', 'result')}\n" for code in FORMULAS)
+
+
+@pytest.mark.parametrize("dialect", ["sqlite", "postgres", "duckdb"])
+def test_sql_matches_golden_file(dialect):
+    assert render(dialect) == (GOLDEN / f"{dialect}.sql").read_text()
+
+
+def test_postgres_writes_booleans_as_numbers_in_arithmetic():
+    sql = Transpiler(schema=SCHEMA, dialect="postgres").transpile(Formula("TRUE() + {flag}").ast, "r", "result")
+    assert "(1 + CAST(\"flag\" AS INTEGER))" in sql
+
+
+def test_postgres_tests_untyped_values_through_text():
+    # `IS TRUE` only accepts booleans on PostgreSQL
+    sql = Transpiler(dialect="postgres").transpile(Formula("NOT({u})").ast, "r", "result")
+    assert "IS TRUE" not in sql and "CAST(\"u\" AS TEXT)" in sql
+
+
+def same(expected, found):
+    if expected is None or found is None:
+        return expected is found
+    if isinstance(expected, bool) or isinstance(found, bool):
+        return truthy(expected) == truthy(found)
+    if isinstance(expected, str) or isinstance(found, str):
+        return expected == found
+    return math.isclose(expected, float(found))
+
+
+ROWS = [(1, 0.0, 0, "", False, None), (2, 2.0, 3, "x", True, "2024-01-01 00:00:00"),
+        (3, None, None, None, None, None), (4, -1.5, -2, "0", False, "2024-03-01 00:00:00"),
+        (5, 0.5, 1, "abc", True, None)]
+
+
+def check_engine(db, dialect):
+    """Run every formula, as a projection and as a filter, on the table `r`
+    holding `ROWS`, with {u} a copy of {a}, and compare with the evaluator"""
+    records = [dict(zip(("id", "a", "n", "s", "flag", "d", "u"), row + (row[1],))) for row in ROWS]
+    transpiler = Transpiler(schema=SCHEMA, dialect=dialect)
+    for code in FORMULAS:
+        ast = Formula(code).ast
+        evaluate = compile_formula(ast)
+        sql = transpiler.transpile_many([("id", Formula("{id}").ast), ("result", ast)], "r").sql
+        found = dict(db.execute(sql).fetchall())
+        for record in records:
+            assert same(evaluate(record), found[record["id"]]), (code, record, sql)
+        selected = {row[0] for row in db.execute(transpiler.transpile_filter(ast, "r", columns=["id"])).fetchall()}
+        assert selected == {record["id"] for record in records if truthy(evaluate(record))}, code
+
+
+def test_sqlite_agrees_with_the_evaluator():
+    db = sqlite3.connect(":memory:")
+    db.execute("CREATE TABLE r (id INTEGER, a REAL, n INTEGER, s TEXT, flag INTEGER, d TEXT, u)")
+    db.executemany("INSERT INTO r VALUES (?, ?, ?, ?, ?, ?, ?)", [row + (row[1],) for row in ROWS])
+    check_engine(db, "sqlite")
+
+
+def test_duckdb_agrees_with_the_evaluator():
+    duckdb = pytest.importorskip("duckdb")
+    db = duckdb.connect()
+    db.execute("CREATE TABLE r (id INTEGER, a DOUBLE, n INTEGER, s TEXT, flag BOOLEAN, d TIMESTAMP, u DOUBLE)")
+    db.executemany("INSERT INTO r VALUES (?, ?, ?, ?, ?, ?, ?)", [row + (row[1],) for row in ROWS])
+    check_engine(db, "duckdb")
+
+
+@pytest.mark.parametrize("code", ['FIND("b", {s})', 'FIND("b", {s}, 3)', 'FIND("b", {s}, {n})', 'FIND("b", {s}, 0)'])
+def test_generic_find_keeps_its_start_position(code):
+    db = sqlite3.connect(":memory:")
+    db.create_function("GREATEST", 2, max)
+    records = [{"s": "abcabc", "n": n} for n in (-1, 1, 2, 3, 5, 6)]
+    ast = Formula(code).ast
+    sql = Transpiler().transpile(ast, "r", "result").replace("FROM r", "FROM (SELECT ? AS s, ? AS n)")
+    for record in records:
+        assert db.execute(sql, (record["s"], record["n"])).fetchone()[0] == compile_formula(ast)(record), record
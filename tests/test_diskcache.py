@@ -0,0 +1,64 @@
+import os
+
+import pytest
+
+from cache import ParseCache
+from diskcache import DiskCache, build_cache
+from formula import Formula
+from parse import NodeTable
+
+FORMULAS = [
+    'IF({Score} > 50, LEN({Name}) * 2, CONCATENATE({Tag}, "x"))',
+    '{First Name} & " " & UPPER({Last Name})',
+    'SUM(1, 2.5, [3, {a}])',
+    'ROUND({x}, 2) >= 3.14',
+]
+
+
+@pytest.fixture
+def path(tmp_path):
+    return str(tmp_path / "formulas.cache")
+
+
+def test_lookups_give_the_parsed_formulas(path):
+    assert build_cache(path, FORMULAS + [FORMULAS[0], "SUM(1,", "   "]) == (len(FORMULAS), 1)
+    with DiskCache(path) as cache:
+        assert len(cache) == len(FORMULAS)
+        for code in FORMULAS:
+            assert code in cache
+            assert cache.get(code) == Formula(code).ast
+        # Sources are matched exactly
+        assert cache.get(FORMULAS[0] + " ") is None and "SUM(1," not in cache
+        assert (cache.hits, cache.misses) == (len(FORMULAS), 1)
+        table = NodeTable()
+        assert cache.get(FORMULAS[1], table) is cache.get(FORMULAS[1], table)
+
+
+def test_parse_cache_reads_from_disk(path):
+    build_cache(path, FORMULAS)
+    with DiskCache(path) as disk:
+        cache = ParseCache(disk=disk)
+        assert cache.get(FORMULAS[2]) == Formula(FORMULAS[2]).ast
+        assert cache.stats()["disk_hits"] == 1
+
+
+def test_rebuilding_replaces_the_file(path):
+    build_cache(path, FORMULAS[:1])
+    build_cache(path, FORMULAS[1:])
+    with DiskCache(path) as cache:
+        assert FORMULAS[0] not in cache and FORMULAS[1] in cache
+    assert os.listdir(os.path.dirname(path)) == ["formulas.cache"]
+
+
+@pytest.mark.parametrize("data", [b"", b"FCACHE0", b"not a formula cache at all", None])
+def test_other_files_are_rejected(path, data):
+    if data is None:
+        # A cache cut short: its index lies past the end of the file
+        build_cache(path, FORMULAS)
+        with open(path, "rb") as file:
+            data = file.read()[:-1]
+    with open(path, "wb") as file:
+        file.write(data)
+    with pytest.raises(Exception, match="is not a formula cache") as error:
+        DiskCache(path)
+    assert type(error.value) is Exception
@@ -0,0 +1,72 @@
+import sqlite3
+
+import pytest
+
+from evaluator import compile_formula, interpret
+from formula import Formula
+from transpiler import Transpiler
+
+
+def evaluate(code, record=None):
+    ast = Formula(code).ast
+    result = interpret(ast, record or {})
+    assert compile_formula(ast)(record or {}) == result
+    return result
+
+
+@pytest.mark.parametrize("code, expected", [
+    ("ROUND(0.5)", 1.0),
+    ("ROUND(1.5)", 2.0),
+    ("ROUND(2.5)", 3.0),
+    ("ROUND(-2.5)", -3.0),
+    ("ROUND(0.125, 2)", 0.13),
+    ("ROUND(0.375, 2)", 0.38),
+    ("ROUND(-0.125, 2)", -0.13),
+    ("ROUND(2.675, 2)", 2.68),
+    ("ROUND(2.4)", 2.0),
+    ("ROUND(BLANK())", None),
+])
+def test_round_halves_away_from_zero(code, expected):
+    assert evaluate(code) == expected
+
+
+def test_round_matches_sqlite():
+    db = sqlite3.connect(":memory:")
+    db.execute("CREATE TABLE t (a)")
+    db.executemany("INSERT INTO t VALUES (?)", [(value / 8,) for value in range(-40, 41)])
+    for code in ("ROUND({a})", "ROUND({a}, 2)", "ROUND({a} / 2)"):
+        sql = Transpiler(dialect="sqlite").transpile(Formula(code).ast, "t", "result")
+        values = [a for a, in db.execute("SELECT a FROM t")]
+        assert [row[0] for row in db.execute(sql)] == [evaluate(code, {"a": a}) for a in values]
+
+
+def test_short_circuit():
+    assert evaluate("AND({a}, 1 / 0 > 1)", {"a": 0}) is False
+    assert evaluate("OR({a}, {b})", {"a": 1}) is True
+    assert evaluate("AND()") is True
+    assert evaluate("OR()") is False
+    assert evaluate("IF({a}, 1)", {"a": 0}) is None
+
+
+def test_deeply_nested():
+    code = "{a}"
+    for depth in range(2000):
+        code = f"IF({{a}} > {depth}, {code}, {depth})"
+    ast = Formula(code).ast
+    assert interpret(ast, {"a": 5}) == 1999
+    assert compile_formula(ast)({"a": 5}) == 1999
+    assert compile_formula(ast)({"a": 5000}) == 5000
+
+
+@pytest.mark.parametrize("code, record", [
+    ("ABS({a})", {"a": "x"}),
+    ("SUM({a}, 1)", {"a": "x"}),
+    ("ROUND({a}, {b})", {"a": 1.5}),
+    ("-{s}", {"s": "x"}),
+    ('DATETIME_DIFF({d}, "2024-01-01")', {"d": "not a date"}),
+    ('DATETIME_DIFF({d}, "2024-01-01", {unit})', {"d": "2024-01-02", "unit": "fortnights"}),
+    ('IS_BEFORE({d}, "2024-01-01")', {"d": "not a date"}),
+])
+def test_values_of_the_wrong_type_give_blank(code, record):
+    assert evaluate(code, record) is None
+    assert evaluate(f"IF({code}, 1, 2)", record) == 2
@@ -0,0 +1,97 @@
+import random
+import sqlite3
+
+import pytest
+
+from evaluator import compile_formula, truthy
+from formula import Formula
+from transpiler import Transpiler
+from typecheck import infer_types
+
+SCHEMA = {"a": "number", "b": "number", "s": "string", "t": "string", "d": "date", "flag": "boolean"}
+ATOMS = [
+    "{a} > 1", "{a} = 0", "{b} <= {a}", '{s} = "abc"', "{s} != {t}", "{a}", "{s}", "{t}", "{flag}",
+    "IS_BLANK({s})", "IS_BLANK({a})", 'IS_BEFORE({d}, "2024-03-01")', 'IS_AFTER({d}, "2024-03-01")',
+    'IS_BEFORE("2024-03-01", {d})', "TRUE()", "FALSE()", "BLANK()", "1", "0", '""', '"x"',
+    "LEN({s}) > 1", "{a} + {b}", "XOR({a}, {flag})",
+]
+
+
+def make_rows(rng, count=80):
+    return [{
+        "id": i,
+        "a": rng.choice([None, 0, 1, 2.5, -3, 7]),
+        "b": rng.choice([None, 0, 2, -1.5]),
+        "s": rng.choice([None, "", "abc", "x"]),
+        "t": rng.choice([None, "", "x"]),
+        "d": rng.choice([None, "2024-01-01 00:00:00", "2024-03-01 00:00:00", "2024-03-05 12:30:00"]),
+        "flag": rng.choice([0, 1, None]),
+    } for i in range(count)]
+
+
+def make_filter(rng, depth=3):
+    if depth == 0 or rng.random() < 0.3:
+        return rng.choice(ATOMS)
+    sub = lambda: make_filter(rng, depth - 1)
+    return rng.choice([
+        lambda: f"AND({sub()}, {sub()})",
+        lambda: f"OR({sub()}, {sub()}, {sub()})",
+        lambda: f"NOT({sub()})",
+        lambda: f"IF({sub()}, {sub()}, {sub()})",
+        lambda: f"IF({sub()}, {rng.choice(['TRUE()', 'FALSE()', '1', '0'])})",
+        lambda: f"{sub()} & {sub()}",
+    ])()
+
+
+@pytest.mark.parametrize("seed", range(5))
+@pytest.mark.parametrize("parameterized", [False, True])
+@pytest.mark.parametrize("schema", [SCHEMA, None])
+def test_filters_select_the_truthy_records(seed, parameterized, schema):
+    rng = random.Random(seed)
+    rows = make_rows(rng)
+    db = sqlite3.connect(":memory:")
+    db.execute("CREATE TABLE r (id INTEGER PRIMARY KEY, a, b, s, t, d, flag)")
+    db.executemany("INSERT INTO r VALUES (:id, :a, :b, :s, :t, :d, :flag)", rows)
+    transpiler = Transpiler(schema=schema, dialect="sqlite")
+    checked = 0
+    while checked < 100:
+        code = make_filter(rng)
+        ast = Formula(code).ast
+        if infer_types(ast, SCHEMA).mismatches:
+            # SQLite converts text in arithmetic where the evaluator gives blank
+            continue
+        evaluate = compile_formula(ast)
+        expected = {row["id"] for row in rows if truthy(evaluate(row))}
+        projection = transpiler.transpile_many([("id", Formula("{id}").ast), ("result", ast)], "r").sql
+        if {i for i, value in db.execute(projection) if truthy(value)} != expected:
+            # The formula's SQL value already differs from the evaluator's,
+            # e.g. SQLite reads text in AND as a number; not the filter's doing
+            continue
+        checked += 1
+        # A filter and its negation split the records between them, blanks included
+        for negated, wanted in ((code, expected), (f"NOT({code})", {row["id"] for row in rows} - expected)):
+            params = [] if parameterized else None
+            sql = transpiler.transpile_filter(Formula(negated).ast, "r", columns=["id"], params=params)
+            assert {row[0] for row in db.execute(sql, params or ())} == wanted, (negated, sql)
+
+
+@pytest.mark.parametrize("dialect", [None, "sqlite"])
+def test_untyped_fields_are_tested_for_truth(dialect):
+    # Without a schema, as on the command line: empty text and zero are false
+    rows = [(1, "abc", 2), (2, "", 0), (3, "0", None), (4, None, -1.5)]
+    db = sqlite3.connect(":memory:")
+    db.execute("CREATE TABLE r (id, s, a)")
+    db.executemany("INSERT INTO r VALUES (?, ?, ?)", rows)
+    records = [dict(zip(("id", "s", "a"), row)) for row in rows]
+    transpiler = Transpiler(dialect=dialect)
+    for code in ["{s}", "{a}", "NOT({s})", "NOT({a})", "AND({s}, {a})", "OR({s}, {a})", "IF({s}, {a}, 0)"]:
+        ast = Formula(code).ast
+        evaluate = compile_formula(ast)
+        sql = transpiler.transpile_filter(ast, "r", columns=["id"])
+        assert {row[0] for row in db.execute(sql)} == {record["id"] for record in records if truthy(evaluate(record))}, code
+
+
+def test_indexed_comparison_keeps_the_field_bare():
+    transpiler = Transpiler(schema=SCHEMA, dialect="sqlite")
+    sql = transpiler.transpile_filter(Formula('AND({a} > 1, IS_BEFORE({d}, "2024-03-01"))').ast, "r")
+    assert """("a" > 1)""" in sql and """("d" < '2024-03-01 00:00:00')""" in sql
@@ -0,0 +1,85 @@
+import random
+import time
+
+import pytest
+
+from incremental import edit, parse_full
+from lexer import lex_spans
+from parse import Parser
+
+SEEDS = [
+    'IF({Score} > 50, LEN({Name}) * 2, CONCATENATE({Tag}, "x"))',
+    'SUM(1, 2.5, [3, {a}], AND({b}, OR({c}, NOT({d}))), -(4 - 5) / 6)',
+    '{First Name} & " " & UPPER({Last Name}) & IF(IS_BLANK({Title}), "", ", " & {Title})',
+    'ROUND(AVERAGE({x}, {y}, MAX({z}, 10)), 2) >= 3.14',
+]
+# Characters an edit may insert, weighted towards those that change the
+# token and bracket structure
+ALPHABET = '(),[]{}"+-*/&<>=! .0123456789abcXYZ_' + "()[]{}," * 3
+
+
+def reparse(source):
+    try:
+        return Parser().parse(lex_spans(source))
+    except Exception:
+        return None
+
+
+def random_edit(rng, source):
+    offset = rng.randint(0, len(source))
+    deleted = rng.choice([0, 0, 1, 1, 2, rng.randint(0, 12)])
+    deleted = min(deleted, len(source) - offset)
+    inserted = "".join(rng.choice(ALPHABET) for _ in range(rng.choice([0, 1, 1, 1, 2, 5])))
+    if rng.random() < 0.2:
+        # Paste back a span of the formula, as copy and paste would
+        start = rng.randint(0, len(source))
+        inserted = source[start:start + rng.randint(1, 20)]
+    return offset, deleted, inserted
+
+
+@pytest.mark.parametrize("seed", range(len(SEEDS) * 15))
+def test_edits_match_full_reparse(seed):
+    rng = random.Random(seed)
+    result = parse_full(SEEDS[seed % len(SEEDS)])
+    for _ in range(300):
+        offset, deleted, inserted = random_edit(rng, result.source)
+        try:
+            updated = edit(result, offset, deleted, inserted)
+        except Exception:
+            # The edited text fails to lex; so must a full lex
+            source = result.source[:offset] + inserted + result.source[offset + deleted:]
+            with pytest.raises(Exception):
+                lex_spans(source)
+            continue
+        expected = lex_spans(updated.source)
+        assert list(updated.stream.kinds) == list(expected.kinds)
+        assert list(updated.stream.starts) == list(expected.starts)
+        assert list(updated.stream.ends) == list(expected.ends)
+        assert updated.ast == reparse(updated.source), updated.source
+        assert (updated.error is None) == (updated.ast is not None or not updated.source.strip())
+        # Valid results keep the session going; invalid ones often do too,
+        # as users type through broken states
+        if updated.ast is not None or rng.random() < 0.7:
+            result = updated
+
+
+def best_time(function, *args):
+    times = []
+    for _ in range(3):
+        start = time.perf_counter()
+        function(*args)
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+@pytest.mark.parametrize("code, ratio", [
+    # Only the edited argument is parsed again
+    ("CONCATENATE(" + ", ".join(f"{{f{i}}}" for i in range(20000)) + ")", 0.2),
+    # Operator chains are parsed again in full, but no slower than from scratch
+    (" & ".join(f"{{f{i}}}" for i in range(20000)), 2),
+])
+def test_edit_latency(code, ratio):
+    result = parse_full(code)
+    offset = code.index("{f10000}") + 2
+    assert edit(result, offset, 1, "x").ast == reparse(code.replace("{f10000}", "{fx0000}"))
+    assert best_time(edit, result, offset, 1, "x") < ratio * best_time(parse_full, code)
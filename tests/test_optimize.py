@@ -0,0 +1,65 @@
+import sqlite3
+
+import pytest
+
+from formula import Formula
+from optimize import Optimizer
+from parse import Variable
+from transpiler import Transpiler
+
+SCHEMA = {"n": "number", "s": "string"}
+ROWS = [(2.5, "5", "3"), (-1.5, " 7 ", 4), (None, None, None), (0.0, "", "")]
+
+
+def run(db, ast):
+    sql = Transpiler(schema=SCHEMA, dialect="sqlite").transpile(ast, "t", "result")
+    return [row[0] for row in db.execute(sql)]
+
+
+@pytest.fixture
+def db():
+    db = sqlite3.connect(":memory:")
+    db.execute("CREATE TABLE t (n, s, u)")
+    db.executemany("INSERT INTO t VALUES (?, ?, ?)", ROWS)
+    return db
+
+
+@pytest.mark.parametrize("code", [
+    "ROUND(2.5)",
+    "ROUND(-2.5)",
+    "ROUND(0.125, 2)",
+    "ROUND(1234.5, -2)",
+    'TRIM("  x ")',
+    'UPPER("é")',
+    'SUBSTITUTE("abc", "b", BLANK())',
+    'FIND("", "abc")',
+    "{s} + 0",
+    "{s} * 1",
+    "0 + {u}",
+    "({n} > 0) + 0",
+    "{n} + 0",
+    "ROUND({n}) * 1",
+])
+def test_optimized_sql_gives_the_same_results(db, code):
+    ast = Formula(code).ast
+    optimized = Optimizer(SCHEMA).optimize(ast)
+    assert run(db, optimized) == run(db, ast)
+
+
+def test_identity_needs_a_number():
+    optimizer = Optimizer(SCHEMA)
+    assert optimizer.optimize(Formula("{n} + 0").ast) == Variable("n")
+    assert optimizer.optimize(Formula("1 * {n}").ast) == Variable("n")
+    for code in ("{s} + 0", "{u} * 1", "({n} > 0) + 0"):
+        ast = Formula(code).ast
+        assert optimizer.optimize(ast) == ast
+
+
+def test_long_join_is_flattened_once():
+    # Flattening at every level of a left-nested chain would be quadratic
+    count = 20000
+    ast = Formula(" & ".join(f"{{f{i}}}" for i in range(count))).ast
+    optimizer = Optimizer()
+    result = optimizer.optimize(ast)
+    assert result.name == "CONCATENATE" and result.args == tuple(Variable(f"f{i}") for i in range(count))
+    assert optimizer.counts["flatten_concat"] == 1
@@ -0,0 +1,51 @@
+import random
+
+import pytest
+
+from recompute import CycleError, DependencyGraph
+
+FORMULAS = {
+    "total": "{qty} * {price}",
+    "big": "{total} > 10",
+    "score": "IF({big}, 1, 0) + {bonus}",
+    "flagged": "{score} = 1",
+    "label": "{name} & \" \" & {score}",
+    "free": "{price} = 0",
+}
+
+
+def test_recompute_matches_a_full_evaluate():
+    graph = DependencyGraph(FORMULAS)
+    rng = random.Random(0)
+    values = {"qty": [0, 1, 2, 5, None], "price": [0, 0.0, 1, 3.5, None], "bonus": [0, 1, 0.0, True, False],
+              "name": ["", "a", "bc", None]}
+    record = {name: choices[0] for name, choices in values.items()}
+    graph.evaluate(record)
+    for _ in range(500):
+        changed = rng.sample(sorted(values), rng.randint(1, 2))
+        for name in changed:
+            record[name] = rng.choice(values[name])
+        before = dict(record)
+        updates = graph.recompute(record, changed)
+        expected = dict(record)
+        graph.evaluate(expected)
+        for field in FORMULAS:
+            assert type(record[field]) is type(expected[field]) and record[field] == expected[field], field
+        assert updates == {field: record[field] for field in FORMULAS
+                           if type(record[field]) is not type(before[field]) or record[field] != before[field]}
+
+
+def test_boolean_replacing_an_equal_number_is_an_update():
+    graph = DependencyGraph({"copy": "{x}", "text": "{copy} & \"\""})
+    record = {"x": 1}
+    graph.evaluate(record)
+    record["x"] = True
+    assert graph.recompute(record, ["x"]) == {"copy": True}
+    assert record["copy"] is True
+
+
+def test_cycles_are_reported():
+    with pytest.raises(CycleError) as error:
+        DependencyGraph({"a": "{b} + 1", "b": "{c} + 1", "c": "{a} + 1", "d": "{a}"})
+    cycle = error.value.cycle
+    assert cycle[0] == cycle[-1] and sorted(cycle[:-1]) == ["a", "b", "c"]
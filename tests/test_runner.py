@@ -0,0 +1,56 @@
+import pytest
+
+from formula import Formula
+from parse import Variable
+from runner import SQLiteRunner
+from transpiler import Transpiler
+
+SCHEMA = {"a": "number", "s": "string", "flag": "boolean"}
+ROWS = [(1, 0.0, "", 0), (2, 2.5, "x", 1), (3, None, None, None), (4, -1.0, "abc", 0), (5, 7.0, "0", 1)]
+FORMULAS = ['{a} > 1', '{a} * 2 + 1', 'IF({flag}, {s} & "!", "no")', 'LEN({s}) = 1', 'AND({a}, {s})',
+            'ROUND({a} / 3, 2)', '{s} = "x"', 'OR({flag}, {a} < 0)']
+
+
+@pytest.fixture
+def runner():
+    runner = SQLiteRunner(schema=SCHEMA, max_statements=3)
+    runner.connection.execute("CREATE TABLE r (id INTEGER, a REAL, s TEXT, flag INTEGER)")
+    runner.connection.executemany("INSERT INTO r VALUES (?, ?, ?, ?)", ROWS)
+    yield runner
+    runner.close()
+
+
+def test_formulas_differing_in_constants_share_a_statement(runner):
+    first, second = runner.statement('{a} > 1', "r"), runner.statement('{a} > 2.5', "r")
+    assert first.sql == second.sql and first.params != second.params
+    assert runner.evaluate('{a} > 1', "r", ["id"]) != runner.evaluate('{a} > 2.5', "r", ["id"])
+    assert runner.stats()["statement_misses"] == 1 and runner.stats()["statement_hits"] == 1
+    runner.evaluate('{a} > 1', "r", ["id"])
+    assert runner.stats()["formula_hits"] == 1 and runner.stats()["statement_hits"] == 2
+
+
+def test_statement_lru_follows_the_connection_cache(runner):
+    texts = []
+    for code in ['{a} + 1', 'LEN({s})', 'UPPER({s})', '{a} * 1']:
+        texts.append(runner.statement(code, "r").sql)
+        runner.evaluate(code, "r")
+    assert list(runner.prepared) == texts[1:]
+    # 'LEN({s})' is the least recently used, so a fresh formula evicts it
+    runner.evaluate('LEN({s}) + 0', "r")
+    runner.evaluate('UPPER({s})', "r")
+    assert list(runner.prepared) == [texts[3], runner.statement('LEN({s}) + 0', "r").sql, texts[2]]
+    assert runner.stats()["statements"] == runner.max_statements
+    runner.evaluate('{a} + 7', "r")
+    assert runner.stats()["statement_misses"] == 6 and runner.stats()["statement_hits"] == 1
+
+
+@pytest.mark.parametrize("code", FORMULAS)
+def test_results_match_inline_sql(runner, code):
+    transpiler = Transpiler(schema=SCHEMA, dialect="sqlite")
+    ast = Formula(code).ast
+    inline = transpiler.transpile_many([("id", Variable("id")), ("result", ast)], "r").sql
+    assert runner.evaluate(code, "r", ["id"]) == runner.connection.execute(inline).fetchall()
+    inline = transpiler.transpile_filter(ast, "r", columns=["id"])
+    assert runner.filter(code, "r", ["id"]) == runner.connection.execute(inline).fetchall()
+    inline = transpiler.transpile_filter(ast, "r")
+    assert runner.filter(code, "r") == runner.connection.execute(inline).fetchall()
@@ -0,0 +1,57 @@
+import pytest
+
+from formula import Formula
+from lexer import TokenType
+from parse import BinOp, FunctionCall, NodeTable, Number, String
+from serialize import decode, encode
+
+FORMULAS = [
+    'IF({Score} > 50, LEN({Name}) * 2, CONCATENATE({Tag}, "x  y"))',
+    'SUM(1, 2.5, [3, {a b}], AND({b}, OR({c}, NOT({d}))), -(4 - 5) / 6)',
+    '{First Name} & " " & UPPER({Last Name}) & "é€😀"',
+    'IF({a} > 1, {a} > 1, TODAY())',
+    '[]',
+    '"" & -1e300',
+]
+
+
+@pytest.mark.parametrize("code", FORMULAS)
+def test_round_trip(code):
+    ast = Formula(code).ast
+    assert decode(encode(ast)) == ast
+    assert decode(memoryview(encode(ast))) == ast
+
+
+def test_round_trip_of_constants_and_empty_trees():
+    ast = FunctionCall("IF", [Number(True), Number(None), BinOp(Number(False), TokenType.PLUS, String(""))])
+    assert decode(encode(ast)) == ast
+    assert decode(encode(None)) is None
+
+
+def test_shared_subtrees_stay_shared():
+    ast = decode(encode(Formula('IF({a} > 1, {a} > 1, {b})').ast))
+    assert ast.args[0] is ast.args[1]
+    table = NodeTable()
+    first, second = decode(encode(Formula('{a} > 1').ast), table), decode(encode(Formula('{a} > 1').ast), table)
+    assert first is second
+
+
+def test_truncated_data_is_rejected():
+    data = encode(Formula(FORMULAS[2]).ast)
+    for length in range(len(data)):
+        with pytest.raises(Exception, match="serialized AST") as error:
+            decode(data[:length])
+        assert type(error.value) is Exception
+
+
+@pytest.mark.parametrize("corrupt, message", [
+    (lambda data: b"XAST" + data[4:], "Not a serialized AST"),
+    (lambda data: data[:-1] + b"\xff", "Corrupt serialized AST"),
+    (lambda data: data[:16] + b"\x0f\x00\x00\x00" + data[20:], "Unknown opcode"),
+    (lambda data: data + b"x", "Corrupt serialized AST"),
+])
+def test_corrupt_data_is_rejected(corrupt, message):
+    # {a} & "é": no numbers, so the code starts right after the header
+    data = encode(Formula('{a} & "é"').ast)
+    with pytest.raises(Exception, match=message):
+        decode(corrupt(data))
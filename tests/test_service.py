@@ -0,0 +1,78 @@
+import asyncio
+import time
+
+import pytest
+
+import service
+from service import FORMULA_ERROR, INVALID_PARAMS, FormulaService, RPCError
+
+
+def run(coroutine):
+    return asyncio.run(coroutine)
+
+
+def test_dialect_names_are_case_insensitive():
+    async def main():
+        async with FormulaService(workers=0) as formulas:
+            lower = await formulas.call("transpile", {"formula": "{a} & {b}", "dialect": "sqlite"})
+            mixed = await formulas.call("transpile", {"formula": "{a} & {b}", "dialect": "SQLite"})
+            assert mixed == lower
+            assert formulas.counters["result_hits"] == 1
+            with pytest.raises(RPCError) as error:
+                await formulas.call("transpile", {"formula": "1", "dialect": "oracle"})
+            assert error.value.code == INVALID_PARAMS
+    run(main())
+
+
+def test_formula_errors_are_cached():
+    async def main():
+        async with FormulaService(workers=0) as formulas:
+            for _ in range(2):
+                with pytest.raises(RPCError) as error:
+                    await formulas.call("transpile", {"formula": "(1"})
+                assert error.value.code == FORMULA_ERROR
+            assert formulas.counters["result_hits"] == 1
+    run(main())
+
+
+def test_worker_failures_are_not_cached(monkeypatch):
+    run_calls = service.run_calls
+    calls = []
+
+    def flaky(batch):
+        calls.append(batch)
+        if len(calls) == 1:
+            raise MemoryError("worker ran out of memory")
+        return run_calls(batch)
+
+    async def main():
+        async with FormulaService(workers=0) as formulas:
+            monkeypatch.setattr(service, "run_calls", flaky)
+            with pytest.raises(RPCError) as error:
+                await formulas.call("parse", {"formula": "1 + 2"})
+            assert "Worker failed" in str(error.value)
+            result = await formulas.call("parse", {"formula": "1 + 2"})
+            assert result == {"ast": {"root": "Number", "nodes": 1}}
+            assert len(calls) == 2 and formulas.counters["result_hits"] == 0
+    run(main())
+
+
+def test_start_does_not_block_the_event_loop(monkeypatch):
+    ticks = []
+
+    def slow_start(self):
+        time.sleep(0.2)
+        self.executor = service.ThreadPoolExecutor(max_workers=1)
+
+    async def tick():
+        for _ in range(5):
+            ticks.append(1)
+            await asyncio.sleep(0.02)
+
+    async def main():
+        monkeypatch.setattr(FormulaService, "start", slow_start)
+        ticker = asyncio.ensure_future(tick())
+        async with FormulaService(workers=0):
+            assert len(ticks) >= 3
+        await ticker
+    run(main())
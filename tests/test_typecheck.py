@@ -0,0 +1,94 @@
+import time
+
+import pytest
+
+import evaluator
+import functions
+from formula import Formula
+from functions import register_function, sql_call
+from lexer import TokenType
+from parse import BinOp, Number, UnOp, Variable
+from typecheck import ANY, ARRAY, BOOLEAN, DATE, NULL, NUMBER, STRING, Signature, infer_types
+
+SCHEMA = {"n": "number", "s": "string", "b": "boolean", "d": "date"}
+
+
+@pytest.mark.parametrize("code, expected", [
+    ("1", NUMBER), ('"x"', STRING), ("TRUE()", BOOLEAN), ("BLANK()", NULL), ("[1, 2]", ARRAY),
+    ("{n}", NUMBER), ("{u}", ANY), ("-{b}", NUMBER), ("-{u}", ANY), ("{n} + {b}", NUMBER),
+    ("{s} + {s}", STRING), ("{d} + 1", DATE), ("{d} - {d}", NUMBER), ("{d} - 1", DATE), ("{n} + {u}", ANY),
+    ("{n} + BLANK()", NULL), ("{n} & 1", STRING), ("{n} > 1", BOOLEAN), ("AND({n}, {s})", BOOLEAN),
+    ("IF({b}, 1, 2)", NUMBER), ("IF({b}, 1)", NUMBER), ("IF({b}, 1, TRUE())", NUMBER), ("IF({b}, 1, \"x\")", ANY),
+    ("LEN({s})", NUMBER), ("UPPER({n})", STRING), ("TODAY()", DATE), ("IS_BEFORE({d}, TODAY())", BOOLEAN),
+    ("NO_SUCH_FUNCTION(1)", ANY),
+])
+def test_inferred_types(code, expected):
+    ast = Formula(code).ast
+    checker = infer_types(ast, SCHEMA)
+    assert checker.type_of(ast) is expected
+    assert not checker.mismatches
+
+
+@pytest.mark.parametrize("code, message", [
+    ("-{s}", "Negation expects number, got string"),
+    ("{s} * 2", "Arithmetic expects number, got string"),
+    ("{d} + {s}", "Arithmetic expects number, got date"),
+    ("{n} < {s}", "Comparison with number expects number, got string"),
+    ("ABS({s})", "ABS argument 1 expects number, got string"),
+    ("ROUND({n}, {d})", "ROUND argument 2 expects number, got date"),
+    ("DATETIME_DIFF({d}, {n})", "DATETIME_DIFF argument 2 expects date, got number"),
+])
+def test_mismatches_against_the_schema(code, message):
+    checker = infer_types(Formula(code).ast, SCHEMA)
+    assert [mismatch.message for mismatch in checker.mismatches] == [message]
+    # The same formula over untyped fields is accepted
+    assert not infer_types(Formula(code).ast).mismatches
+
+
+@pytest.fixture
+def registered():
+    names = []
+    def register(name, *args, **kwargs):
+        names.append(name)
+        return register_function(name, sql_call(name), *args, **kwargs)
+    yield register
+    for name in names:
+        functions.library.pop(name, None)
+        evaluator.functions.pop(name, None)
+
+
+def test_registered_functions_are_typed_by_their_signature(registered):
+    registered("DOUBLE", lambda x: x * 2, 1, 1, signature=Signature((NUMBER,), NUMBER))
+    registered("UNTYPED", lambda x: x, 1, 1)
+    ast = Formula("double({s}) + UNTYPED(1)").ast
+    checker = infer_types(ast, SCHEMA)
+    assert checker.type_of(ast.left) is NUMBER and checker.type_of(ast.right) is ANY
+    assert [mismatch.message for mismatch in checker.mismatches] == ["DOUBLE argument 1 expects number, got string"]
+
+
+def deep_tree(depth):
+    node = Variable("n")
+    for i in range(depth):
+        node = BinOp(node, TokenType.PLUS, Number(float(i))) if i % 2 else UnOp(TokenType.MINUS, node)
+    return node
+
+
+def test_deep_trees_are_typed_in_linear_time():
+    def best_time(depth):
+        tree = deep_tree(depth)
+        times = []
+        for _ in range(3):
+            start = time.perf_counter()
+            assert infer_types(tree, SCHEMA).type_of(tree) is NUMBER
+            times.append(time.perf_counter() - start)
+        return min(times)
+    assert best_time(80000) < 8 * best_time(20000)
+
+
+def test_shared_subtrees_are_typed_once():
+    # 2 ** 100 paths from the root, but only 101 distinct nodes
+    node = Variable("n")
+    for _ in range(100):
+        node = BinOp(node, TokenType.PLUS, node)
+    checker = infer_types(node, SCHEMA)
+    assert checker.type_of(node) is NUMBER and len(checker.types) == 101
@@ -0,0 +1,71 @@
+import random
+
+import pytest
+
+from lexer import lex_spans
+from parse import Parser
+from transpiler import Transpiler
+from validate import validate, validate_many
+
+SEEDS = [
+    'IF({Score} > 50, LEN({Name}) * 2, CONCATENATE({Tag}, "x"))',
+    'SUM(1, 2.5, [3, {a}], AND({b}, OR({c}, NOT({d}))), -(4 - 5) / 6)',
+    '{First Name} & " " & UPPER({Last Name}) & IF(IS_BLANK({Title}), "", ", " & {Title})',
+    'ROUND(AVERAGE({x}, {y}, MAX({z}, 10)), 2) >= 3.14',
+]
+ALPHABET = '(),[]{}"+-*/&<>=! .0123456789abcXYZ_#'
+
+
+def parses(code):
+    try:
+        Parser().parse(lex_spans(code))
+    except Exception:
+        return False
+    return True
+
+
+def mutate(rng, code):
+    for _ in range(rng.randint(1, 3)):
+        offset = rng.randint(0, len(code))
+        deleted = rng.choice([0, 1, 1, 2])
+        inserted = rng.choice(["", rng.choice(ALPHABET), rng.choice(ALPHABET) * 2])
+        code = code[:offset] + inserted + code[offset + deleted:]
+    return code
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_agrees_with_the_parser(seed):
+    rng = random.Random(seed)
+    for _ in range(200):
+        code = mutate(rng, rng.choice(SEEDS))
+        diagnostics = validate(code)
+        syntax = [d for d in diagnostics if d.code != "arity"]
+        assert (not syntax) == parses(code), (code, diagnostics)
+        for diagnostic in diagnostics:
+            assert 0 <= diagnostic.start <= diagnostic.end <= len(code)
+        if syntax or not parses(code):
+            continue
+        if diagnostics:
+            # Every arity problem is one the transpiler rejects
+            with pytest.raises(Exception):
+                Transpiler().transpile(Parser().parse(lex_spans(code)), "t", "result")
+
+
+@pytest.mark.parametrize("code, expected", [
+    ("1 + 2", []),
+    ('"abc', ["unterminated-string"]),
+    ("{abc", ["unterminated-field"]),
+    ("1 # 2", ["invalid-character"]),
+    ("(1", ["unexpected-token"]),
+    ("1 +", ["unexpected-token"]),
+    ("LEN(1, 2)", ["arity"]),
+    ("LEN(1, 2) + (3", ["arity", "unexpected-token"]),
+])
+def test_diagnostic_codes(code, expected):
+    assert [diagnostic.code for diagnostic in validate(code)] == expected
+
+
+def test_validate_many():
+    results = validate_many(["1", "LEN()"])
+    assert results[0] is None
+    assert [result[0] for result in results[1]] == ["arity"]
@@ -0,0 +1,70 @@
+import numpy as np
+import pytest
+
+from evaluator import interpret
+from formula import Formula
+from vectorized import evaluate_columns
+
+COLUMNS = {
+    "a": np.array([1.0, 1.0, 0.0, np.nan, -2.0]),
+    "b": np.array([1.0, 0.0, 0.0, 3.0, np.nan]),
+    "s": np.array(["x", "", "yy", "z", ""]),
+}
+
+
+def records():
+    for index in range(5):
+        yield {name: None if isinstance(values[index], float) and np.isnan(values[index]) else values[index].item()
+               for name, values in COLUMNS.items()}
+
+
+@pytest.mark.parametrize("code", [
+    "({a} > 0) + ({b} > 0)",
+    "({a} > 0) - ({b} > 0)",
+    "-({a} > 0)",
+    "({a} > 0) * 3 / ({b} > 0)",
+    "ABS(-({a} > 0))",
+    "({a} > 0) = 1",
+    "({a} > 0) < ({b} > 0)",
+    "({a} > 0) + {b}",
+    "IF({s}, {a} > 0, {b}) + 1",
+    "AND({a}, {b}) - OR({a}, {b})",
+    "NOT({a}) * 2 + IS_BLANK({s})",
+])
+def test_booleans_in_arithmetic_match_interpret(code):
+    ast = Formula(code).ast
+    expected = [interpret(ast, record) for record in records()]
+    found = evaluate_columns(ast, COLUMNS).tolist()
+    assert found == expected
+
+
+def test_deeply_nested():
+    code = "{a}"
+    for depth in range(2000):
+        code = f"IF({{a}} > {depth}, {code}, {depth})"
+    ast = Formula(code).ast
+    columns = {"a": np.array([5.0, 3000.0, np.nan])}
+    assert evaluate_columns(ast, columns).tolist() == [1999.0, 3000.0, 1999.0]
+
+
+@pytest.mark.parametrize("code", [
+    "{a} & 1",
+    "{s} & 1.5",
+    "LEN(12)",
+    "UPPER(TRUE())",
+    "CONCATENATE({a}, 2)",
+    "LOWER(BLANK()) & {s}",
+    '"n" & (1 + 2)',
+])
+def test_literals_as_text_match_interpret(code):
+    # Constant operands are 0-d columns, which text conversion must keep as arrays
+    ast = Formula(code).ast
+    expected = [interpret(ast, record) for record in records()]
+    assert evaluate_columns(ast, COLUMNS).tolist() == expected
+
+
+def test_functions_given_the_wrong_type_give_blank():
+    columns = {"a": np.array(["x", 2.0, None], dtype=object)}
+    for code in ("ABS({a})", "ROUND({a}, {b})", "SUM({a}, 1)"):
+        assert evaluate_columns(Formula(code).ast, columns).tolist() == [
+            interpret(Formula(code).ast, {"a": a}) for a in ["x", 2.0, None]]